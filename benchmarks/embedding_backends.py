@@ -0,0 +1,118 @@
+"""
+Compare the embedding backends of mcp_clickzetta_server on this machine.
+
+For every backend the model is loaded in a fresh process, so resident memory is measured in
+isolation. The script reports load time, single-query and batch latency, peak RSS and the cosine
+agreement of each backend with the reference torch model.
+
+Usage:
+    python benchmarks/embedding_backends.py [--backends torch onnx int8] [--repeat 20] [--timeout 1800]
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+import numpy as np
+
+SAMPLE_TEXTS = [
+    "自定义函数",
+    "如何写自定义函数",
+    "常用DDL语句",
+    "数据导入导出",
+    "如何创建和构建向量索引",
+    "How to analyze a slow query in Lakehouse",
+    "云器Lakehouse的SQL是和Spark SQL、Snowflake高度兼容的",
+    "Zettapark is compatible with pySpark and Snowflake Snowpark",
+    "分区表和聚簇表的使用建议",
+    "How to create an external volume on Alibaba Cloud OSS",
+    "虚拟计算集群的自动扩缩容配置",
+    "information_schema 中的 job_history 可以用来分析慢查询",
+]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_backend(backend: str, repeat: int, queue) -> None:
+    from mcp_clickzetta_server.embeddings import EmbeddingModelRegistry
+    from mcp_clickzetta_server.util import embedding_model_name
+
+    registry = EmbeddingModelRegistry(default_backend=backend)
+    baseline_rss = _peak_rss_mb()
+    started = time.perf_counter()
+    model = registry.get(embedding_model_name)
+    load_seconds = time.perf_counter() - started
+
+    # One untimed pass so lazy initialization is not counted as latency
+    model.encode(SAMPLE_TEXTS[:2], normalize_embeddings=True)
+
+    single = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        model.encode([SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]], normalize_embeddings=True)
+        single.append(time.perf_counter() - started)
+
+    batch = []
+    for _ in range(max(repeat // 4, 1)):
+        started = time.perf_counter()
+        vectors = model.encode(SAMPLE_TEXTS, normalize_embeddings=True)
+        batch.append(time.perf_counter() - started)
+
+    queue.put(
+        {
+            "backend": backend,
+            "load_s": load_seconds,
+            "single_p50_ms": statistics.median(single) * 1000,
+            "single_p95_ms": sorted(single)[int(len(single) * 0.95) - 1] * 1000,
+            "batch_ms": statistics.median(batch) * 1000,
+            "rss_mb": _peak_rss_mb() - baseline_rss,
+            "vectors": np.asarray(vectors, dtype=np.float32),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "int8"])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--timeout", type=int, default=1800, help="Seconds to wait for one backend")
+    args = parser.parse_args()
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend in backends:
+        queue = context.Queue()
+        process = context.Process(target=_run_backend, args=(backend, args.repeat, queue))
+        process.start()
+        try:
+            results.append(queue.get(timeout=args.timeout))
+        except Exception as e:
+            print(f"{backend}: failed ({e})")
+        process.join(timeout=60)
+        if process.exitcode:
+            print(f"{backend}: exited with code {process.exitcode}")
+
+    reference = next((r["vectors"] for r in results if r["backend"] == "torch"), None)
+    print(f"{'backend':<8} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'batch ms':>9} {'RSS MB':>8} {'cos mean':>9} {'cos min':>8}")
+    for r in results:
+        if reference is not None:
+            # Vectors are normalized, so the row-wise dot product is the cosine similarity
+            cosine = np.sum(r["vectors"] * reference, axis=1)
+            cos_mean, cos_min = f"{cosine.mean():.5f}", f"{cosine.min():.5f}"
+        else:
+            cos_mean = cos_min = "n/a"
+        print(
+            f"{r['backend']:<8} {r['load_s']:>8.2f} {r['single_p50_ms']:>8.1f} {r['single_p95_ms']:>8.1f} "
+            f"{r['batch_ms']:>9.1f} {r['rss_mb']:>8.0f} {cos_mean:>9} {cos_min:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measure how quickly mcp_clickzetta_server becomes usable for an MCP client.
+
+Two numbers are reported:
+  - the slowest imports of `import mcp_clickzetta_server`, taken from `python -X importtime`
+  - the time from process start to the response of the first `initialize` request over stdio,
+    which is what MCP clients wait for before they time out
+
+The server is started with --no-prefetch and placeholder connection arguments, so no warehouse
+connection is made.
+
+Usage:
+    python benchmarks/startup_time.py [--runs 5] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SERVER_COMMAND = [
+    sys.executable,
+    "-c",
+    "from mcp_clickzetta_server import main; main()",
+    "--no-prefetch",
+    "--workspace",
+    "benchmark",
+    "--schema",
+    "benchmark",
+]
+
+INITIALIZE_REQUEST = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {},
+        "clientInfo": {"name": "startup-benchmark", "version": "0"},
+    },
+}
+
+
+def slowest_imports(top: int) -> list[tuple[int, str]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import mcp_clickzetta_server"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        imports.append((int(cumulative), name))
+    return sorted(imports, reverse=True)[:top]
+
+
+def time_to_initialize(timeout: float) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        SERVER_COMMAND,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+    )
+    try:
+        process.stdin.write(json.dumps(INITIALIZE_REQUEST) + "\n")
+        process.stdin.flush()
+        while time.perf_counter() - started < timeout:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Server exited with code {process.poll()} before answering initialize")
+            if json.loads(line).get("id") == INITIALIZE_REQUEST["id"]:
+                return time.perf_counter() - started
+        raise TimeoutError(f"No initialize response within {timeout}s")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    print("Slowest imports (cumulative ms):")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"  {cumulative / 1000:>9.1f}  {name}")
+
+    timings = [time_to_initialize(args.timeout) for _ in range(args.runs)]
+    print(
+        f"Time to first initialize response over {args.runs} runs: "
+        f"median {statistics.median(timings) * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure the SQL text cost of writing a query embedding into vector_search.
+
+Compares the previous encoding (str(list) of the float32 values, written twice) with the current one
+(fixed precision, written once in a CTE): SQL size, client-side formatting time, sqlparse parse time as
+a proxy for statement parsing, and the cosine error introduced by rounding.
+
+Usage:
+    python benchmarks/vector_literal.py [--dim 1024] [--precision 6] [--repeat 200]
+"""
+import argparse
+import time
+
+import numpy as np
+import sqlparse
+
+from mcp_clickzetta_server.util import format_vector_literal
+
+PREVIOUS_QUERY = """
+    SELECT text, COSINE_DISTANCE(embeddings, CAST("{vector}" as VECTOR({dim}))) AS distance
+    FROM knowledge
+    WHERE COSINE_DISTANCE(embeddings, CAST("{vector}" as VECTOR({dim}))) < 0.8
+    ORDER BY 2
+    LIMIT 5;
+"""
+
+CURRENT_QUERY = """
+    WITH query_embedding AS (
+        SELECT CAST('{vector}' AS VECTOR({dim})) AS query_vector
+    )
+    SELECT text, COSINE_DISTANCE(embeddings, query_embedding.query_vector) AS distance
+    FROM knowledge, query_embedding
+    WHERE COSINE_DISTANCE(embeddings, query_embedding.query_vector) < 0.8
+    ORDER BY 2
+    LIMIT 5;
+"""
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--precision", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vector = rng.normal(size=args.dim).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+
+    encodings = {
+        "str(list) x2": lambda: PREVIOUS_QUERY.format(vector=vector.tolist(), dim=args.dim),
+        "fixed precision + CTE": lambda: CURRENT_QUERY.format(vector=format_vector_literal(vector, args.precision), dim=args.dim),
+    }
+    print(f"{'encoding':<24} {'SQL bytes':>10} {'format ms':>10} {'parse ms':>9}")
+    for name, build in encodings.items():
+        format_seconds, sql = timed(build, args.repeat)
+        parse_seconds, _ = timed(lambda: sqlparse.parse(sql), max(args.repeat // 10, 1))
+        print(f"{name:<24} {len(sql.encode()):>10} {format_seconds * 1000:>10.3f} {parse_seconds * 1000:>9.2f}")
+
+    rounded = np.array([float(x) for x in format_vector_literal(vector, args.precision)[1:-1].split(",")], dtype=np.float32)
+    other = rng.normal(size=(1000, args.dim)).astype(np.float32)
+    other /= np.linalg.norm(other, axis=1, keepdims=True)
+    error = np.abs(other @ vector - other @ rounded).max()
+    print(f"Max cosine distance error from rounding to {args.precision} significant digits: {error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
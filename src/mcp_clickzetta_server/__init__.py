@@ -3,7 +3,6 @@ import asyncio
 import os
 
 import dotenv
-from clickzetta import connect
 
 from . import server
 
@@ -37,6 +36,69 @@ def parse_args():
         nargs="+",
         help="List of tools to exclude",
     )
+    parser.add_argument(
+        "--preload_embedding_model",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Load the embedding model at startup instead of on the first knowledge lookup",
+    )
+    parser.add_argument(
+        "--embedding_idle_timeout",
+        required=False,
+        default=0,
+        type=int,
+        help="Unload the embedding model after this many idle seconds (0 keeps it loaded)",
+    )
+    parser.add_argument(
+        "--embedding_batch_size",
+        required=False,
+        default=32,
+        type=int,
+        help="Maximum number of texts encoded together by the embedding scheduler",
+    )
+    parser.add_argument(
+        "--embedding_batch_wait_ms",
+        required=False,
+        default=5,
+        type=float,
+        help="How long the embedding scheduler waits for more texts before encoding a batch",
+    )
+    parser.add_argument(
+        "--embedding_executor",
+        required=False,
+        default="thread",
+        choices=["thread", "process"],
+        help="Run embedding inference in a thread pool or in a process pool with the model preloaded in each worker",
+    )
+    parser.add_argument(
+        "--embedding_workers",
+        required=False,
+        default=1,
+        type=int,
+        help="Number of embedding worker threads or processes",
+    )
+    parser.add_argument(
+        "--embedding_backend",
+        required=False,
+        default=None,
+        choices=["torch", "onnx", "int8"],
+        help="Embedding backend: torch (reference), onnx (ONNX Runtime) or int8 (dynamic int8 quantization). Defaults to CLICKZETTA_EMBEDDING_BACKEND or torch",
+    )
+    parser.add_argument(
+        "--local_vector_index",
+        required=False,
+        default=False,
+        action="store_true",
+        help="Mirror the Similar_table_name knowledge table locally and answer vector_search from the mirror",
+    )
+    parser.add_argument(
+        "--local_vector_index_refresh",
+        required=False,
+        default=300,
+        type=int,
+        help="Seconds between incremental refreshes of the local vector index",
+    )
 
     # First, get all the arguments we don't know about
     args, unknown = parser.parse_known_args()
@@ -64,6 +126,15 @@ def parse_args():
         "log_level": args.log_level,
         "prefetch": args.prefetch,
         "exclude_tools": args.exclude_tools,
+        "preload_embedding_model": args.preload_embedding_model,
+        "embedding_idle_timeout": args.embedding_idle_timeout,
+        "embedding_batch_size": args.embedding_batch_size,
+        "embedding_batch_wait_ms": args.embedding_batch_wait_ms,
+        "embedding_executor": args.embedding_executor,
+        "embedding_workers": args.embedding_workers,
+        "embedding_backend": args.embedding_backend,
+        "local_vector_index": args.local_vector_index,
+        "local_vector_index_refresh": args.local_vector_index_refresh,
     }
 
     return server_args, connection_args
@@ -114,6 +185,15 @@ def main():
             prefetch=server_args["prefetch"],
             log_level=server_args["log_level"],
             exclude_tools=server_args["exclude_tools"],
+            preload_embedding_model=server_args["preload_embedding_model"],
+            embedding_idle_timeout=server_args["embedding_idle_timeout"],
+            embedding_batch_size=server_args["embedding_batch_size"],
+            embedding_batch_wait_ms=server_args["embedding_batch_wait_ms"],
+            embedding_executor=server_args["embedding_executor"],
+            embedding_workers=server_args["embedding_workers"],
+            embedding_backend=server_args["embedding_backend"],
+            local_vector_index=server_args["local_vector_index"],
+            local_vector_index_refresh=server_args["local_vector_index_refresh"],
         )
     )
 
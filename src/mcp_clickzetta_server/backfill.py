@@ -0,0 +1,275 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable
+
+from .result_cache import table_tag
+from .util import format_vector_literal, sql_string_literal
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mcp_clickzetta_server", "backfill")
+DEFAULT_BACKFILL_PAGE_SIZE = 500
+DEFAULT_BACKFILL_BATCH_SIZE = 64
+# "missing" embeds rows without a vector, "all" re-embeds every row processed before the job started
+BACKFILL_MODES = ["missing", "all"]
+BACKFILL_ACTIONS = ["start", "status", "cancel"]
+
+
+def default_backfill_job_id(table_name: str, embedding_column_name: str) -> str:
+    """Job id of a backfill, stable across restarts so starting it again resumes from its checkpoint"""
+    return re.sub(r"\W+", "_", f"{table_tag(table_name)}_{embedding_column_name.strip('`')}").lower()
+
+
+def build_backfill_page_sql(
+    table_name: str,
+    content_column_name: str,
+    embedding_column_name: str,
+    page_size: int,
+    after_id: str | None = None,
+    stale_before: str | None = None,
+    scope: str | None = None,
+) -> str:
+    """
+    Next page of rows whose embedding is missing or, with stale_before, older than that timestamp.
+
+    Pages are read in id order starting after after_id (keyset pagination), so every page is an index
+    range instead of an ever growing OFFSET.
+    """
+    stale = f"{embedding_column_name} IS NULL"
+    if stale_before:
+        stale = f"({stale} OR date_processed IS NULL OR date_processed < CAST({sql_string_literal(stale_before)} AS TIMESTAMP))"
+    conditions = [stale]
+    if after_id is not None:
+        conditions.append(f"CAST(id AS STRING) > {sql_string_literal(after_id)}")
+    if scope:
+        conditions.append(f"({scope})")
+    return f"""
+        SELECT CAST(id AS STRING) AS id, {content_column_name} AS content
+        FROM {table_name}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY CAST(id AS STRING)
+        LIMIT {int(page_size)}
+    """
+
+
+def build_backfill_merge_sql(table_name: str, embedding_column_name: str, rows: list[tuple[str, Any]], dim: int) -> str:
+    """
+    One MERGE writing the embeddings of many rows.
+
+    date_modified is refreshed as well so local vector index mirrors pull the new vectors, and
+    date_processed marks the rows as done for a re-embed.
+    """
+    values = ",\n                ".join(
+        f"({sql_string_literal(row_id)}, CAST('{format_vector_literal(vector)}' AS VECTOR({dim})))" for row_id, vector in rows
+    )
+    return f"""
+        MERGE INTO {table_name} AS target
+        USING (
+            SELECT * FROM VALUES
+                {values}
+            AS t(id, embedding)
+        ) AS source
+        ON CAST(target.id AS STRING) = source.id
+        WHEN MATCHED THEN UPDATE SET
+            {embedding_column_name} = source.embedding,
+            date_modified = CURRENT_TIMESTAMP,
+            date_processed = CURRENT_TIMESTAMP
+    """
+
+
+class BackfillJob:
+    """
+    Resumable job computing the embeddings of a table's rows in the background.
+
+    Rows are read page by page in id order, embedded in batches and written back with one MERGE per
+    page. After every page the last id and counters are saved to a checkpoint file, so a job that was
+    cancelled or interrupted by a restart continues after the last written page. Rows are selected by
+    their embedding state as well, so a page written just before an interruption is never embedded twice.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        table_name: str,
+        model_name: str,
+        dim: int,
+        embedding_column_name: str = "embeddings",
+        content_column_name: str = "text",
+        mode: str = "missing",
+        scope: str | None = None,
+        page_size: int = DEFAULT_BACKFILL_PAGE_SIZE,
+        batch_size: int = DEFAULT_BACKFILL_BATCH_SIZE,
+        checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR,
+    ):
+        if mode not in BACKFILL_MODES:
+            raise ValueError(f"mode must be one of {', '.join(BACKFILL_MODES)}")
+        self.job_id = job_id
+        self.table_name = table_name
+        self.model_name = model_name
+        self.dim = dim
+        self.embedding_column_name = embedding_column_name
+        self.content_column_name = content_column_name
+        self.mode = mode
+        self.scope = scope
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.checkpoint_path = os.path.join(checkpoint_dir, f"{job_id}.json")
+        self.status = "pending"
+        self.after_id: str | None = None
+        # Rows processed before the first run started are stale in "all" mode; kept across resumes
+        self.stale_before: str | None = None
+        self.rows_embedded = 0
+        self._rows_at_start = 0
+        self.pages = 0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    def _signature(self) -> dict[str, Any]:
+        return {
+            "table_name": self.table_name,
+            "model_name": self.model_name,
+            "dim": self.dim,
+            "embedding_column_name": self.embedding_column_name,
+            "content_column_name": self.content_column_name,
+            "mode": self.mode,
+            "scope": self.scope,
+        }
+
+    def load_checkpoint(self) -> bool:
+        """
+        Continue from the saved checkpoint of the same job.
+
+        Returns:
+            bool: Whether a checkpoint was loaded.
+
+        Raises:
+            ValueError: If the checkpoint belongs to a job with other parameters, e.g. another model.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("status") == "completed":
+            return False
+        if checkpoint["signature"] != self._signature():
+            raise ValueError(f"Checkpoint of backfill {self.job_id} was written with other parameters {checkpoint['signature']}; start it with restart=true")
+        self.after_id = checkpoint["after_id"]
+        self.stale_before = checkpoint["stale_before"]
+        self.rows_embedded = checkpoint["rows_embedded"]
+        self.pages = checkpoint["pages"]
+        return True
+
+    def save_checkpoint(self) -> None:
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        checkpoint = {
+            "signature": self._signature(),
+            "status": self.status,
+            "after_id": self.after_id,
+            "stale_before": self.stale_before,
+            "rows_embedded": self.rows_embedded,
+            "pages": self.pages,
+        }
+        # Write then rename so an interruption never leaves a truncated checkpoint
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(
+        self,
+        execute_query: Callable[[str], Awaitable[list[dict[str, Any]]]],
+        embed_many: Callable[[list[str]], Awaitable[list[Any]]],
+        on_page: Callable[[], None] | None = None,
+    ) -> asyncio.Task:
+        """Run the job as a task on the current event loop"""
+        self._task = asyncio.get_running_loop().create_task(self.run(execute_query, embed_many, on_page))
+        return self._task
+
+    def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self._task.cancel()
+        return True
+
+    async def run(
+        self,
+        execute_query: Callable[[str], Awaitable[list[dict[str, Any]]]],
+        embed_many: Callable[[list[str]], Awaitable[list[Any]]],
+        on_page: Callable[[], None] | None = None,
+    ) -> None:
+        """
+        Embed and write pages until no stale row is left.
+
+        Args:
+            execute_query (Callable): Runs a SQL query and returns rows as dictionaries, e.g. on the
+                server's bounded query pool so the job shares its limits with tool calls.
+            embed_many (Callable): Embeds a list of texts.
+            on_page (Callable): Called after every written page, e.g. to invalidate cached results.
+        """
+        self.status = "running"
+        self.started_at = time.time()
+        self._rows_at_start = self.rows_embedded
+        self.error = None
+        try:
+            if self.mode == "all" and self.stale_before is None:
+                # Warehouse time, so the cutoff compares with date_processed in the same clock and zone
+                now = await execute_query("SELECT CAST(CURRENT_TIMESTAMP AS STRING) AS now")
+                self.stale_before = str(next(iter(now[0].values())))
+            while True:
+                query = build_backfill_page_sql(
+                    self.table_name, self.content_column_name, self.embedding_column_name, self.page_size, self.after_id, self.stale_before, self.scope
+                )
+                rows = await execute_query(query)
+                if not rows:
+                    break
+                rows = [{str(k).lower(): v for k, v in row.items()} for row in rows]
+                embedded = []
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start : start + self.batch_size]
+                    vectors = await embed_many([str(row["content"] or "") for row in batch])
+                    embedded.extend((str(row["id"]), vector) for row, vector in zip(batch, vectors))
+                await execute_query(build_backfill_merge_sql(self.table_name, self.embedding_column_name, embedded, self.dim))
+                self.after_id = str(rows[-1]["id"])
+                self.rows_embedded += len(embedded)
+                self.pages += 1
+                self.save_checkpoint()
+                if on_page is not None:
+                    on_page()
+                if len(rows) < self.page_size:
+                    break
+            self.status = "completed"
+            logger.info(f"Backfill {self.job_id} completed: {self.rows_embedded} rows embedded in {self.pages} pages")
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            logger.info(f"Backfill {self.job_id} cancelled after {self.rows_embedded} rows")
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error(f"Backfill {self.job_id} failed after {self.rows_embedded} rows: {e}")
+        finally:
+            self.finished_at = time.time()
+            self.save_checkpoint()
+
+    def stats(self) -> dict[str, Any]:
+        elapsed = ((self.finished_at if not self.running and self.finished_at else time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            **self._signature(),
+            "rows_embedded": self.rows_embedded,
+            "pages": self.pages,
+            "last_id": self.after_id,
+            "elapsed_seconds": round(elapsed, 1),
+            "rows_per_second": round((self.rows_embedded - self._rows_at_start) / elapsed, 1) if elapsed else 0.0,
+            "error": self.error,
+        }
@@ -0,0 +1,152 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+DEFAULT_CHUNK_TOKENS = 512
+DEFAULT_OVERLAP_TOKENS = 64
+
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+_WORD = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+# A sentence ends with CJK or latin terminal punctuation, or a newline; a period only counts before
+# whitespace, so decimals and dotted names such as 3.14 or schema.table stay in one sentence
+_SENTENCE = re.compile(r"(?:[^。！？!?；;.\n]|\.(?!\s|$))*(?:(?:[。！？!?；;]|\.(?=\s|$))+[ \t]*|\n|$)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count used when the model tokenizer is unavailable: one per CJK character, ~4 characters per latin word piece"""
+    cjk = len(_CJK.findall(text))
+    other = _CJK.sub(" ", text)
+    return cjk + sum((len(word) + 3) // 4 for word in _WORD.findall(other))
+
+
+@lru_cache(maxsize=4)
+def get_token_counter(model_name: str) -> Callable[[str], int]:
+    """Return a token counter backed by the model's own tokenizer, falling back to estimate_tokens"""
+    try:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    except Exception as e:
+        logger.warning(f"Tokenizer for {model_name} unavailable, estimating token counts: {e}")
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def iter_paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    """Group lines into paragraphs separated by blank lines; markdown headings always start a new paragraph"""
+    paragraph: list[str] = []
+    for line in lines:
+        if not line.strip() or line.lstrip().startswith("#"):
+            if paragraph:
+                yield "".join(paragraph)
+                paragraph = []
+            if not line.strip():
+                continue
+        paragraph.append(line if line.endswith("\n") else line + "\n")
+    if paragraph:
+        yield "".join(paragraph)
+
+
+def _split_oversized(unit: str, max_tokens: int, count_tokens: Callable[[str], int]) -> Iterator[tuple[str, int]]:
+    """Cut a single sentence that exceeds max_tokens into windows of at most max_tokens"""
+    start = 0
+    while start < len(unit):
+        # Guess the window from the average characters per token, then shrink until it fits
+        remaining = unit[start:]
+        tokens = count_tokens(remaining)
+        if tokens <= max_tokens:
+            yield remaining, tokens
+            return
+        end = max(int(len(remaining) * max_tokens / tokens), 1)
+        while end > 1 and count_tokens(remaining[:end]) > max_tokens:
+            end = max(int(end * 0.9), 1)
+        # Cut after the last space of the window rather than inside a word, when the window has one
+        space = max(remaining.rfind(" ", 0, end), remaining.rfind("\t", 0, end))
+        if space > 0:
+            end = space + 1
+        piece = remaining[:end]
+        yield piece, count_tokens(piece)
+        start += end
+
+
+def _iter_units(paragraphs: Iterable[str], max_tokens: int, count_tokens: Callable[[str], int]) -> Iterator[tuple[str, int]]:
+    """Yield (text, tokens) units no longer than max_tokens: whole paragraphs when they fit, otherwise sentences"""
+    for paragraph in paragraphs:
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            yield paragraph, tokens
+            continue
+        for sentence in _SENTENCE.findall(paragraph):
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                yield sentence, tokens
+            else:
+                yield from _split_oversized(sentence, max_tokens, count_tokens)
+
+
+def iter_text_chunks(
+    paragraphs: Iterable[str],
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[str]:
+    """
+    Split a stream of paragraphs into token-bounded, overlapping chunks.
+
+    Paragraphs are packed together until the next one would exceed max_tokens; paragraphs that are
+    too long on their own are split at sentence boundaries. Each chunk starts with the trailing units
+    of the previous chunk, up to overlap_tokens, so context is not lost at chunk borders. Only the
+    current chunk is held in memory.
+
+    Args:
+        paragraphs (Iterable[str]): Paragraph stream, e.g. from iter_paragraphs.
+        max_tokens (int): Upper bound of tokens per chunk.
+        overlap_tokens (int): Tokens repeated from the end of one chunk at the start of the next.
+        count_tokens (Callable[[str], int]): Token counter, e.g. from get_token_counter.
+
+    Yields:
+        str: The chunk texts.
+    """
+    if max_tokens < 1:
+        raise ValueError("max_tokens must be a positive integer")
+    overlap_tokens = max(min(overlap_tokens, max_tokens // 2), 0)
+
+    units: list[tuple[str, int]] = []
+    size = 0
+    has_new = False
+    for unit, tokens in _iter_units(paragraphs, max_tokens, count_tokens):
+        if units and size + tokens > max_tokens:
+            if has_new:
+                yield "".join(text for text, _ in units).strip()
+            # Keep the tail of the emitted chunk as the overlap of the next one
+            tail: list[tuple[str, int]] = []
+            tail_size = 0
+            for text, n in reversed(units):
+                if tail_size + n > overlap_tokens or tail_size + n + tokens > max_tokens:
+                    break
+                tail.insert(0, (text, n))
+                tail_size += n
+            units, size, has_new = tail, tail_size, False
+        units.append((unit, tokens))
+        size += tokens
+        has_new = True
+    if units and has_new:
+        chunk = "".join(text for text, _ in units).strip()
+        if chunk:
+            yield chunk
+
+
+def iter_file_chunks(path: str, **kwargs) -> Iterator[str]:
+    """Stream a text or markdown file through iter_text_chunks without reading it fully into memory"""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_text_chunks(iter_paragraphs(f), **kwargs)
+
+
+def iter_string_chunks(text: str, **kwargs) -> Iterator[str]:
+    """Chunk an in-memory string the same way iter_file_chunks chunks a file"""
+    return iter_text_chunks(iter_paragraphs(text.splitlines(keepends=True)), **kwargs)
@@ -0,0 +1,99 @@
+from typing import Any
+
+DEDUP_MODES = ["skip", "merge", "off"]
+DEFAULT_DEDUP_MODE = "skip"
+# Cosine similarity from which two knowledge rows count as the same fact
+DEFAULT_DEDUP_THRESHOLD = 0.95
+DEFAULT_MAX_DUPLICATE_PAIRS = 1000
+
+
+def build_near_duplicate_pairs_sql(
+    table_name: str,
+    threshold: float,
+    scope: str | None = None,
+    max_pairs: int = DEFAULT_MAX_DUPLICATE_PAIRS,
+    embedding_column_name: str = "embeddings",
+    content_column_name: str = "text",
+) -> str:
+    """
+    Self-join of a knowledge table returning row pairs whose cosine similarity reaches threshold.
+
+    Each pair is listed once (id_a < id_b), most similar first, with the text length and creation
+    time of both rows so a keeper can be chosen without another query.
+    """
+    where = f"WHERE {scope}" if scope else ""
+    rows = f"""(
+            SELECT CAST(id AS STRING) AS id, {embedding_column_name} AS embedding, LENGTH({content_column_name}) AS text_length,
+                   CAST(date_created AS STRING) AS date_created
+            FROM {table_name}
+            {where}
+        )"""
+    return f"""
+        SELECT a.id AS id_a, b.id AS id_b,
+               1 - COSINE_DISTANCE(a.embedding, b.embedding) AS similarity,
+               a.text_length AS length_a, b.text_length AS length_b,
+               a.date_created AS created_a, b.date_created AS created_b
+        FROM {rows} a
+        JOIN {rows} b ON a.id < b.id
+        WHERE COSINE_DISTANCE(a.embedding, b.embedding) < {1 - threshold}
+        ORDER BY similarity DESC
+        LIMIT {int(max_pairs)};
+    """
+
+
+def group_near_duplicates(pairs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Group near-duplicate pairs into clusters and choose the rows each cluster keeps and removes.
+
+    Rows connected through any chain of pairs form one cluster (union-find). The keeper is the
+    longest text, then the earliest created row, so the most complete version of a fact survives.
+    Only rows paired with the keeper itself are removed: a chain A~B~C does not make A and C
+    duplicates, so members linked to the keeper only through others are kept and listed in
+    `chained`. Running the collapse again handles duplicates among the kept rows.
+
+    Args:
+        pairs (list[dict]): Rows of build_near_duplicate_pairs_sql.
+
+    Returns:
+        list[dict]: Clusters with `keep`, `remove`, `chained` (ids) and the lowest similarity of a
+        removed row to the keeper as `min_similarity`, most removals first.
+    """
+    parent: dict[str, str] = {}
+    info: dict[str, tuple[int, str]] = {}
+    similarity: dict[frozenset[str], float] = {}
+
+    def find(row_id: str) -> str:
+        parent.setdefault(row_id, row_id)
+        while parent[row_id] != row_id:
+            parent[row_id] = parent[parent[row_id]]
+            row_id = parent[row_id]
+        return row_id
+
+    for pair in pairs:
+        pair = {str(k).lower(): v for k, v in pair.items()}
+        for side in ("a", "b"):
+            info[str(pair[f"id_{side}"])] = (int(pair[f"length_{side}"] or 0), str(pair[f"created_{side}"] or ""))
+        id_a, id_b = str(pair["id_a"]), str(pair["id_b"])
+        similarity[frozenset((id_a, id_b))] = float(pair["similarity"])
+        root_a, root_b = find(id_a), find(id_b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    members: dict[str, list[str]] = {}
+    for row_id in parent:
+        members.setdefault(find(row_id), []).append(row_id)
+
+    clusters = []
+    for ids in members.values():
+        ordered = sorted(ids, key=lambda row_id: (-info[row_id][0], info[row_id][1], row_id))
+        keep = ordered[0]
+        remove = [row_id for row_id in ordered[1:] if frozenset((keep, row_id)) in similarity]
+        clusters.append(
+            {
+                "keep": keep,
+                "remove": remove,
+                "chained": [row_id for row_id in ordered[1:] if row_id not in remove],
+                "min_similarity": round(min(similarity[frozenset((keep, row_id))] for row_id in remove), 4),
+            }
+        )
+    return sorted(clusters, key=lambda cluster: len(cluster["remove"]), reverse=True)
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mcp_clickzetta_server", "embeddings")
+DEFAULT_MEMORY_SIZE = 2048
+# Upper bound of the disk tier, e.g. about 260,000 vectors of 1024 dimensions
+DEFAULT_DISK_MAX_BYTES = 1024**3
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so that trivially different spellings of a question share one cache entry"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class _VectorSegment:
+    """
+    Append-only file of float32 vectors.
+
+    Vectors live in a flat vectors file that is read through a memory map, and an index file maps
+    each key to its row.
+    """
+
+    def __init__(self, vectors_path: str, index_path: str, dim: int):
+        self.dim = dim
+        self.vectors_path = vectors_path
+        self.index_path = index_path
+        self._index: dict[str, int] = {}
+        self._rows = 0
+        self._mmap = None
+        self._load_index()
+
+    def _load_index(self):
+        row_bytes = 4 * self.dim
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        stored_rows = size // row_bytes
+        if size != stored_rows * row_bytes:
+            # A write interrupted mid-row; drop the partial bytes so the next vector starts on a row boundary
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(stored_rows * row_bytes)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    key, _, row = line.rstrip("\n").partition("\t")
+                    # Ignore index lines whose vector was never fully written
+                    if row.isdigit() and int(row) < stored_rows:
+                        self._index[key] = int(row)
+        self._rows = stored_rows
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    def get(self, key: str) -> np.ndarray | None:
+        row = self._index.get(key)
+        if row is None:
+            return None
+        import numpy as np
+
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return np.array(self._mmap[row])
+
+    def append(self, key: str, vector: np.ndarray) -> None:
+        with open(self.vectors_path, "ab") as f:
+            f.write(vector.tobytes())
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(f"{key}\t{self._rows}\n")
+        self._index[key] = self._rows
+        self._rows += 1
+
+    def close(self) -> None:
+        self._mmap = None
+
+
+class _DiskVectorStore:
+    """
+    On-disk store of float32 vectors bounded to max_rows.
+
+    Vectors are appended to a current segment. When it holds half of max_rows it becomes the
+    previous segment, replacing the one before, and a new current segment is started. A vector read
+    from the previous segment is copied into the current one, so vectors in use survive rotations
+    while the others are dropped with their segment. Only one process should write to a given directory.
+    """
+
+    def __init__(self, directory: str, dim: int, max_rows: int | None = None):
+        self.dim = dim
+        self.max_rows = max_rows
+        os.makedirs(directory, exist_ok=True)
+        self._current_paths = (os.path.join(directory, "vectors.f32"), os.path.join(directory, "index.tsv"))
+        self._previous_paths = (os.path.join(directory, "vectors.previous.f32"), os.path.join(directory, "index.previous.tsv"))
+        self._current = _VectorSegment(*self._current_paths, dim)
+        self._previous = _VectorSegment(*self._previous_paths, dim)
+        self.rotations = 0
+
+    def __len__(self) -> int:
+        return len(self._current) + sum(key not in self._current for key in self._previous._index)
+
+    def get(self, key: str) -> np.ndarray | None:
+        vector = self._current.get(key)
+        if vector is None:
+            vector = self._previous.get(key)
+            if vector is not None:
+                self.put(key, vector)
+        return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if key in self._current:
+            return
+        import numpy as np
+
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected a vector of dimension {self.dim}, got {vector.shape[0]}")
+        if self.max_rows is not None and self._current.rows >= max(self.max_rows // 2, 1):
+            self._rotate()
+        self._current.append(key, vector)
+
+    def _rotate(self) -> None:
+        self._current.close()
+        self._previous.close()
+        for current_path, previous_path in zip(self._current_paths, self._previous_paths):
+            if os.path.exists(current_path):
+                os.replace(current_path, previous_path)
+            elif os.path.exists(previous_path):
+                os.remove(previous_path)
+        self._previous = _VectorSegment(*self._previous_paths, self.dim)
+        self._current = _VectorSegment(*self._current_paths, self.dim)
+        self.rotations += 1
+        logger.info(f"Rotated embedding disk cache, {len(self._previous)} vectors kept in the previous segment")
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache for one model: an in-memory LRU in front of an on-disk vector store.
+
+    Entries are keyed by model name, embedding dimension and normalized text, so the disk tier
+    survives restarts and is never shared between models. The disk tier holds at most
+    disk_max_bytes of vectors.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        dim: int,
+        cache_dir: str | None = DEFAULT_CACHE_DIR,
+        memory_size: int = DEFAULT_MEMORY_SIZE,
+        disk_max_bytes: int | None = DEFAULT_DISK_MAX_BYTES,
+    ):
+        self.model_name = model_name
+        self.dim = dim
+        self.memory_size = memory_size
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if cache_dir:
+            directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name), str(dim))
+            try:
+                self._disk = _DiskVectorStore(directory, dim, max_rows=disk_max_bytes // (4 * dim) if disk_max_bytes else None)
+            except OSError as e:
+                logger.warning(f"Embedding disk cache disabled, cannot use {directory}: {e}")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        raw = f"{self.model_name}\x1f{self.dim}\x1f{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> np.ndarray | None:
+        key = self._key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            vector = None
+            if self._disk is not None:
+                try:
+                    vector = self._disk.get(key)
+                except (OSError, ValueError) as e:
+                    # A disk tier that cannot be read or promoted into is a miss, never a failed request
+                    logger.warning(f"Failed to read embedding from disk cache: {e}")
+            if vector is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, vector)
+            return vector
+
+    def put(self, text: str, vector: np.ndarray, persist: bool = True) -> None:
+        """
+        Args:
+            persist (bool): Also write the vector to the disk tier. One-off texts such as bulk ingested
+                documents are kept in memory only, so they do not push reused vectors off the disk.
+        """
+        import numpy as np
+
+        key = self._key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if persist and self._disk is not None:
+                try:
+                    self._disk.put(key, vector)
+                except OSError as e:
+                    logger.warning(f"Failed to persist embedding to disk cache: {e}")
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "model_name": self.model_name,
+                "embedding_dim": self.dim,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk) if self._disk is not None else 0,
+                "disk_max_entries": self._disk.max_rows if self._disk is not None else 0,
+                "disk_rotations": self._disk.rotations if self._disk is not None else 0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_caches: dict[tuple[str, int], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, dim: int) -> EmbeddingCache:
+    """
+    Return the process-wide cache for a model.
+
+    The disk location, memory size and disk bound come from CLICKZETTA_EMBEDDING_CACHE_DIR,
+    CLICKZETTA_EMBEDDING_CACHE_SIZE and CLICKZETTA_EMBEDDING_CACHE_MAX_BYTES (0 for no bound); set
+    CLICKZETTA_EMBEDDING_CACHE_DIR to an empty string to keep the cache in memory only.
+    """
+    with _caches_lock:
+        cache = _caches.get((model_name, dim))
+        if cache is None:
+            cache = EmbeddingCache(
+                model_name,
+                dim,
+                cache_dir=os.getenv("CLICKZETTA_EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR),
+                memory_size=int(os.getenv("CLICKZETTA_EMBEDDING_CACHE_SIZE", DEFAULT_MEMORY_SIZE)),
+                disk_max_bytes=int(os.getenv("CLICKZETTA_EMBEDDING_CACHE_MAX_BYTES", DEFAULT_DISK_MAX_BYTES)),
+            )
+            _caches[(model_name, dim)] = cache
+        return cache
+
+
+def embedding_cache_stats() -> list[dict[str, Any]]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [cache.stats() for cache in caches]
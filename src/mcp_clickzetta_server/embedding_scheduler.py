@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from .embeddings import model_registry
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+EMBEDDING_EXECUTOR_KINDS = ["thread", "process"]
+
+
+def _init_embedding_worker(model_name: str, backend: str) -> None:
+    """Load the embedding model once in each worker process before it takes any work"""
+    model_registry.default_backend = backend
+    model_registry.warmup(model_name)
+
+
+def _worker_ready() -> bool:
+    return True
+
+
+def create_embedding_executor(kind: str, max_workers: int, model_name: str, backend: str | None = None) -> Executor:
+    """
+    Create the executor that runs embedding inference off the asyncio event loop.
+
+    Args:
+        kind (str): "thread" shares the process-wide model between worker threads, "process" loads a
+            copy of the model in every worker process.
+        max_workers (int): Number of worker threads or processes.
+        model_name (str): Model to preload in each worker process.
+        backend (str): Embedding backend of the worker processes, defaults to the registry's backend.
+
+    Returns:
+        Executor: The executor to hand to EmbeddingBatcher.
+    """
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embedding")
+    if kind == "process":
+        # spawn avoids forking a process that already holds torch and event loop threads
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_embedding_worker,
+            initargs=(model_name, backend or model_registry.default_backend),
+        )
+    raise ValueError(f"Unsupported embedding executor '{kind}'. Supported executors are: {', '.join(EMBEDDING_EXECUTOR_KINDS)}")
+
+
+def warmup_embedding_executor(executor: Executor, max_workers: int, model_name: str) -> list:
+    """Start the executor's workers so the model is loaded before the first request"""
+    if isinstance(executor, ProcessPoolExecutor):
+        return [executor.submit(_worker_ready) for _ in range(max_workers)]
+    return [executor.submit(model_registry.warmup, model_name)]
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching scheduler for embedding requests.
+
+    Texts submitted by concurrent tool calls are gathered for up to max_wait_ms, or until
+    max_batch_size texts are pending, and then encoded with a single batched call. Each caller
+    awaits its own future and receives only its own vector.
+
+    Cached texts are answered on the event loop; only cache misses are handed to encode_batch, which
+    runs on the executor when one is set so that the event loop stays responsive.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[list[str]], list[Any]],
+        get_cache: Callable[[], Any] | None = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+        executor: Executor | None = None,
+    ):
+        self.encode_batch = encode_batch
+        self.get_cache = get_cache
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+        self._pending: list[tuple[str, asyncio.Future, bool]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, text: str, persist: bool = True) -> Any:
+        """
+        Embed a single text, sharing a model call with other pending requests.
+
+        Args:
+            persist (bool): Write a newly computed vector to the disk tier of the cache; bulk loads
+                pass False so one-off texts stay in memory only.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, persist))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    async def embed_many(self, texts: list[str], persist: bool = True) -> list[Any]:
+        """Embed several texts; they are spread over as many batches as max_batch_size requires."""
+        return list(await asyncio.gather(*(self.embed(text, persist) for text in texts)))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future, bool]]) -> None:
+        # Identical texts from different callers are only encoded once, and persisted if any caller asks to
+        persist: dict[str, bool] = {}
+        for text, _, persist_text in batch:
+            persist[text] = persist.get(text, False) or persist_text
+        unique_texts = list(persist)
+        try:
+            vectors = await self._encode(unique_texts, [persist[text] for text in unique_texts])
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(unique_texts)} texts failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts += len(unique_texts)
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    async def _encode(self, texts: list[str], persist: list[bool]) -> list[Any]:
+        cache = self.get_cache() if self.get_cache else None
+        vectors = [cache.get(text) for text in texts] if cache is not None else [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if self.executor is None:
+                encoded = self.encode_batch(missing_texts)
+            else:
+                encoded = await asyncio.get_running_loop().run_in_executor(self.executor, self.encode_batch, missing_texts)
+            for i, vector in zip(missing, encoded):
+                if cache is not None:
+                    cache.put(texts[i], vector, persist=persist[i])
+                vectors[i] = vector
+        return vectors
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "executor": type(self.executor).__name__ if self.executor else None,
+            "batches": self.batches,
+            "texts": self.texts,
+            "average_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+# "torch" is the reference sentence-transformers model, the others are CPU-oriented alternatives
+EMBEDDING_BACKENDS = ["torch", "onnx", "int8"]
+DEFAULT_EMBEDDING_BACKEND = "torch"
+
+
+def _load_sentence_transformer(model_name: str, backend: str = DEFAULT_EMBEDDING_BACKEND) -> Any:
+    """
+    Load an embedding model with the requested backend.
+
+    All backends return a sentence-transformers model, so callers keep using
+    `model.encode(texts, normalize_embeddings=True)` and the pooling configuration of the model is
+    preserved.
+
+    Args:
+        model_name (str): Hugging Face model name, e.g. BAAI/bge-m3.
+        backend (str): "torch" for full precision PyTorch, "onnx" for ONNX Runtime (requires
+            sentence-transformers>=3.2 and optimum[onnxruntime]), "int8" for PyTorch with dynamic int8
+            quantization of the linear layers.
+
+    Returns:
+        The loaded model.
+
+    Raises:
+        ValueError: If the backend is not supported.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx", device="cpu")
+    if backend == "int8":
+        import torch
+
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    raise ValueError(f"Unsupported embedding backend '{backend}'. Supported backends are: {', '.join(EMBEDDING_BACKENDS)}")
+
+
+class EmbeddingModelRegistry:
+    """
+    Process-wide registry of embedding models.
+
+    Each model is loaded at most once per process and backend, and shared by every tool handler.
+    Models can be warmed up ahead of time, loaded lazily on first use, and unloaded again once they
+    have been idle.
+    """
+
+    def __init__(self, loader: Callable[[str, str], Any] = _load_sentence_transformer, default_backend: str = DEFAULT_EMBEDDING_BACKEND):
+        self._loader = loader
+        self.default_backend = default_backend
+        self._models: dict[str, Any] = {}
+        self._last_used: dict[str, float] = {}
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def model_key(self, model_name: str, backend: str | None = None) -> str:
+        """Name identifying a model and backend pair, e.g. BAAI/bge-m3 or BAAI/bge-m3@int8."""
+        backend = backend or self.default_backend
+        return model_name if backend == DEFAULT_EMBEDDING_BACKEND else f"{model_name}@{backend}"
+
+    def get(self, model_name: str, backend: str | None = None) -> Any:
+        """Return the loaded model, loading it on first use."""
+        backend = backend or self.default_backend
+        key = self.model_key(model_name, backend)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._last_used[key] = time.monotonic()
+                return model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other models stay usable, but only once per model
+        with load_lock:
+            with self._lock:
+                model = self._models.get(key)
+            if model is None:
+                started = time.monotonic()
+                model = self._loader(model_name, backend)
+                logger.info(f"Loaded embedding model {key} in {time.monotonic() - started:.2f}s")
+                with self._lock:
+                    self._models[key] = model
+
+        with self._lock:
+            self._last_used[key] = time.monotonic()
+        return model
+
+    def warmup(self, model_name: str, backend: str | None = None) -> None:
+        """Load a model ahead of the first request that needs it."""
+        self.get(model_name, backend)
+
+    def is_loaded(self, model_name: str, backend: str | None = None) -> bool:
+        with self._lock:
+            return self.model_key(model_name, backend) in self._models
+
+    def unload(self, key: str) -> bool:
+        """Drop a loaded model, by model_key, so its memory can be reclaimed. Returns True if it was loaded."""
+        with self._lock:
+            model = self._models.pop(key, None)
+            self._last_used.pop(key, None)
+        if model is None:
+            return False
+        del model
+        _release_accelerator_memory()
+        logger.info(f"Unloaded embedding model {key}")
+        return True
+
+    def unload_idle(self, max_idle_seconds: float) -> list[str]:
+        """Unload every model that has not been used for max_idle_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, last_used in self._last_used.items() if now - last_used >= max_idle_seconds]
+        return [key for key in idle if self.unload(key)]
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "default_backend": self.default_backend,
+                "loaded_models": list(self._models),
+                "idle_seconds": {name: round(now - last_used, 1) for name, last_used in self._last_used.items()},
+            }
+
+
+def _release_accelerator_memory() -> None:
+    import gc
+
+    gc.collect()
+    try:
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+# Shared by all handlers in server.py; the backend can be chosen with CLICKZETTA_EMBEDDING_BACKEND
+model_registry = EmbeddingModelRegistry(default_backend=os.getenv("CLICKZETTA_EMBEDDING_BACKEND", DEFAULT_EMBEDDING_BACKEND))
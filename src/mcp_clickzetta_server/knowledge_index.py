@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Any, Iterator
+
+from .retrieval import reciprocal_rank_fusion
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Entries whose JSON is longer than this are split into one section per top-level field (and list item)
+DEFAULT_MAX_SECTION_CHARS = 2000
+# A section enters the BM25 ranking only if it contains this share of the query's IDF weight, so one
+# common word such as "how" does not make an unrelated question match
+DEFAULT_MIN_TERM_COVERAGE = 0.4
+# A section enters the embedding ranking only from this cosine similarity on; unrelated texts stay below it with bge models
+DEFAULT_MIN_SIMILARITY = 0.5
+
+_LATIN = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased latin words (underscores split words) plus character bigrams of CJK runs"""
+    text = text.lower()
+    tokens = _LATIN.findall(_CJK_RUN.sub(" ", text))
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run[i : i + 2] for i in range(max(len(run) - 1, 1)))
+    return tokens
+
+
+def iter_knowledge_sections(knowledges: dict[str, Any], max_section_chars: int = DEFAULT_MAX_SECTION_CHARS) -> Iterator[dict[str, Any]]:
+    """
+    Flatten KNOWLEDGES into searchable sections.
+
+    Small entries are one section; larger ones yield one section per top-level field, and fields that
+    are lists of objects yield one section per item.
+
+    Yields:
+        dict: `knowledge` (entry key), `section` (path inside the entry, empty for the whole entry),
+        `content` (the JSON value) and `text` (what is indexed).
+    """
+    for key, entry in knowledges.items():
+        title = key.replace("_", " ")
+        if not isinstance(entry, dict) or len(json.dumps(entry, ensure_ascii=False)) <= max_section_chars:
+            parts = [("", entry)]
+        else:
+            parts = []
+            for field, value in entry.items():
+                if isinstance(value, list) and len(value) > 1 and all(isinstance(item, dict) for item in value):
+                    parts.extend((f"{field}[{i}]", item) for i, item in enumerate(value))
+                else:
+                    parts.append((field, value))
+        for section, content in parts:
+            text = f"{title} {section.replace('_', ' ')}\n{json.dumps(content, ensure_ascii=False)}"
+            yield {"knowledge": key, "section": section, "content": content, "text": text}
+
+
+class KnowledgeIndex:
+    """
+    In-process search over the built-in KNOWLEDGES sections.
+
+    A BM25 inverted index is built on construction and answers on its own; once section embeddings
+    are attached with set_embeddings, cosine similarity is fused with BM25 by reciprocal-rank fusion.
+    Sections below min_term_coverage or min_similarity are left out of the respective ranking, so a
+    question no section is about gets no answer.
+    """
+
+    def __init__(
+        self,
+        knowledges: dict[str, Any],
+        max_section_chars: int = DEFAULT_MAX_SECTION_CHARS,
+        k1: float = 1.5,
+        b: float = 0.75,
+        min_term_coverage: float = DEFAULT_MIN_TERM_COVERAGE,
+        min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    ):
+        self.sections = list(iter_knowledge_sections(knowledges, max_section_chars))
+        self.k1 = k1
+        self.b = b
+        self.min_term_coverage = min_term_coverage
+        self.min_similarity = min_similarity
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._lengths: list[int] = []
+        self._terms: list[set[str]] = []
+        for i, section in enumerate(self.sections):
+            terms = Counter(tokenize(section["text"]))
+            for term, frequency in terms.items():
+                self._postings[term].append((i, frequency))
+            self._lengths.append(sum(terms.values()))
+            self._terms.append(set(terms))
+        self._average_length = sum(self._lengths) / max(len(self._lengths), 1)
+        count = len(self.sections)
+        self._idf = {term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5)) for term, docs in self._postings.items()}
+        # Terms no section contains weigh as much as the rarest possible term
+        self._unknown_idf = math.log(1 + (count + 0.5) / 0.5)
+        self._embeddings: np.ndarray | None = None
+
+    @property
+    def has_embeddings(self) -> bool:
+        return self._embeddings is not None
+
+    def texts(self) -> list[str]:
+        return [section["text"] for section in self.sections]
+
+    def set_embeddings(self, vectors: list[Any]) -> None:
+        """Attach one normalized embedding per section, in the order of texts()"""
+        import numpy as np
+
+        if len(vectors) != len(self.sections):
+            raise ValueError(f"Expected {len(self.sections)} section embeddings, got {len(vectors)}")
+        self._embeddings = np.asarray(vectors, dtype=np.float32)
+
+    def bm25(self, query: str, k: int) -> list[tuple[int, float]]:
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc, frequency in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc] / self._average_length)
+                scores[doc] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def term_coverage(self, query: str, doc: int) -> float:
+        """Share of the query's IDF weight found in a section, 1.0 when every query term occurs in it"""
+        terms = set(tokenize(query))
+        total = sum(self._idf.get(term, self._unknown_idf) for term in terms)
+        if not total:
+            return 0.0
+        return sum(self._idf[term] for term in terms if term in self._terms[doc]) / total
+
+    def cosine(self, vector: Any, k: int) -> list[tuple[int, float]]:
+        import numpy as np
+
+        if self._embeddings is None:
+            return []
+        similarities = self._embeddings @ np.asarray(vector, dtype=np.float32).reshape(-1)
+        top = np.argsort(-similarities)[:k]
+        return [(int(doc), float(similarities[doc])) for doc in top]
+
+    def search(self, query: str, query_vector: Any = None, k: int = 3, candidates: int = 20) -> list[dict[str, Any]]:
+        """
+        Return the k sections that best answer a free-text question.
+
+        Args:
+            query (str): The question, e.g. "how do I build a vector index".
+            query_vector: The normalized query embedding; BM25 alone is used when it is None or no
+                section embeddings are attached.
+            k (int): Number of sections to return.
+            candidates (int): Results taken from each ranking before fusion.
+
+        Returns:
+            list[dict]: Sections with `knowledge`, `section`, `content`, `score` and `ranks`, best first;
+            empty when no section reaches min_term_coverage or min_similarity.
+        """
+        rankings = {
+            "bm25": [
+                {"doc": doc} for doc, score in self.bm25(query, candidates) if score > 0 and self.term_coverage(query, doc) >= self.min_term_coverage
+            ]
+        }
+        if query_vector is not None and self._embeddings is not None:
+            rankings["embedding"] = [{"doc": doc} for doc, similarity in self.cosine(query_vector, candidates) if similarity >= self.min_similarity]
+        fused = reciprocal_rank_fusion(rankings, key=lambda result: result["doc"], limit=k)
+        return [
+            {
+                "knowledge": self.sections[result["doc"]]["knowledge"],
+                "section": self.sections[result["doc"]]["section"],
+                "score": round(result["rrf_score"], 6),
+                "ranks": result["ranks"],
+                "content": self.sections[result["doc"]]["content"],
+            }
+            for result in fused
+        ]
@@ -0,0 +1,165 @@
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+# Rows returned by read_query, and per fetch_page call, unless the caller asks for another page size
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 5000
+DEFAULT_CURSOR_TTL = 600
+# Every open cursor holds a warehouse session, so only a few may be open at once
+DEFAULT_MAX_CURSORS = 4
+
+
+def row_to_dict(row: Any) -> dict[str, Any]:
+    """Rows of to_local_iterator are zettapark Row objects; plain dicts pass through"""
+    if isinstance(row, dict):
+        return row
+    as_dict = getattr(row, "as_dict", None)
+    return as_dict() if as_dict is not None else dict(row)
+
+
+class QueryCursor:
+    """
+    Remaining rows of a running query, read page by page from the job's result stream.
+
+    The cursor owns the session the query runs on and calls release when it is exhausted or
+    closed, so the rows are never fetched again by re-running the query.
+    """
+
+    def __init__(self, query: str, rows: Iterator[Any], release: Callable[[bool], None]):
+        self.id = str(uuid.uuid4())
+        self.query = query
+        self._rows = rows
+        self._release = release
+        self._lock = threading.Lock()
+        self._peeked: list[Any] = []
+        self.rows_fetched = 0
+        self.pages = 0
+        self.exhausted = False
+        self.closed = False
+        self.last_used = time.monotonic()
+
+    def fetch(self, page_size: int) -> tuple[list[dict[str, Any]], bool]:
+        """
+        Read the next page; blocking, run it off the event loop.
+
+        Returns:
+            tuple: The rows, and whether more rows follow. The cursor closes itself after the last page.
+        """
+        with self._lock:
+            if self.closed:
+                raise ValueError("Cursor is closed")
+            self.last_used = time.monotonic()
+            try:
+                page = self._peeked + list(itertools.islice(self._rows, page_size - len(self._peeked)))
+                # Reading one row ahead tells whether another page exists without returning an empty one later
+                self._peeked = list(itertools.islice(self._rows, 1))
+            except Exception:
+                self._close(failed=True)
+                raise
+            self.rows_fetched += len(page)
+            self.pages += 1
+            has_more = bool(self._peeked)
+            if not has_more:
+                self.exhausted = True
+                self._close()
+            return [row_to_dict(row) for row in page], has_more
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _close(self, failed: bool = False) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        close = getattr(self._rows, "close", None)
+        try:
+            if close is not None:
+                close()
+        except Exception as e:
+            logger.debug(f"Error closing result stream of cursor {self.id}: {e}")
+        finally:
+            self._release(failed)
+
+
+class CursorRegistry:
+    """
+    Open query cursors by id.
+
+    Cursors unused for ttl_seconds are closed, and opening more than max_cursors closes the least
+    recently used one, so abandoned cursors do not keep their sessions.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_CURSOR_TTL, max_cursors: int = DEFAULT_MAX_CURSORS):
+        self.ttl_seconds = ttl_seconds
+        self.max_cursors = max_cursors
+        self._cursors: OrderedDict[str, QueryCursor] = OrderedDict()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def add(self, cursor: QueryCursor) -> str:
+        self.expire()
+        with self._lock:
+            self._cursors[cursor.id] = cursor
+            self.opened += 1
+            evicted = []
+            while len(self._cursors) > self.max_cursors:
+                evicted.append(self._cursors.popitem(last=False)[1])
+            self.evicted += len(evicted)
+        for old in evicted:
+            logger.info(f"Closing cursor {old.id}, more than {self.max_cursors} cursors are open")
+            old.close()
+        return cursor.id
+
+    def get(self, cursor_id: str) -> QueryCursor:
+        """
+        Raises:
+            ValueError: If the cursor is unknown, exhausted or expired.
+        """
+        self.expire()
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+            if cursor is None:
+                raise ValueError(f"Unknown or expired cursor {cursor_id}; run the query again with read_query")
+            self._cursors.move_to_end(cursor_id)
+            return cursor
+
+    def discard(self, cursor_id: str, close: bool = True) -> QueryCursor | None:
+        """Forget a cursor and close it, unless the caller closes it elsewhere"""
+        with self._lock:
+            cursor = self._cursors.pop(cursor_id, None)
+        if cursor is not None and close:
+            cursor.close()
+        return cursor
+
+    def expire(self) -> int:
+        """Close cursors unused for ttl_seconds and return how many were closed"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [cursor for cursor in self._cursors.values() if cursor.closed or now - cursor.last_used > self.ttl_seconds]
+            for cursor in stale:
+                del self._cursors[cursor.id]
+            self.expired += sum(not cursor.closed for cursor in stale)
+        for cursor in stale:
+            cursor.close()
+        return len(stale)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "open": len(self._cursors),
+                "max_cursors": self.max_cursors,
+                "ttl_seconds": self.ttl_seconds,
+                "opened": self.opened,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
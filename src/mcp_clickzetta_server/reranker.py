@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from .embedding_cache import normalize_text
+from .embeddings import EmbeddingModelRegistry
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+DEFAULT_RERANKER_MODEL = "BAAI/bge-reranker-v2-m3"
+DEFAULT_RERANK_BUDGET_MS = 300
+DEFAULT_RERANK_CANDIDATES = 20
+DEFAULT_SCORE_CACHE_SIZE = 8192
+# Assumed cost of one uncached pair until the first batch has been timed (CPU, passages of a few hundred tokens)
+DEFAULT_SECONDS_PER_PAIR = 0.03
+# Weight of the latest measurement in the moving averages of the cost model
+EWMA_ALPHA = 0.3
+
+
+def _load_cross_encoder(model_name: str, backend: str = "torch") -> Any:
+    """Load a sentence-transformers CrossEncoder; the onnx backend needs sentence-transformers>=4"""
+    from sentence_transformers import CrossEncoder
+
+    if backend == "onnx":
+        return CrossEncoder(model_name, backend="onnx", device="cpu")
+    return CrossEncoder(model_name)
+
+
+# Cross-encoders are loaded, shared and unloaded like the embedding models, but kept apart from them
+reranker_registry = EmbeddingModelRegistry(loader=_load_cross_encoder)
+
+
+class Reranker:
+    """
+    Cross-encoder re-ranking of retrieved passages under a latency budget.
+
+    Pair scores are cached by (model, normalized question, passage), so re-ranking the same
+    candidates again only scores the pairs not seen before. The cost of a re-ranking is predicted as
+    a fixed overhead plus a per-pair cost, both exponentially weighted moving averages of measured
+    batches; when the prediction exceeds the budget the caller keeps the vector order instead.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_RERANKER_MODEL, registry: EmbeddingModelRegistry = reranker_registry, cache_size: int = DEFAULT_SCORE_CACHE_SIZE):
+        self.model_name = model_name
+        self.registry = registry
+        self.cache_size = cache_size
+        self._scores: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._seconds_per_pair = DEFAULT_SECONDS_PER_PAIR
+        self._overhead_seconds = 0.0
+        self._warming_up = False
+        self.reranked = 0
+        self.skipped = 0
+        self.score_hits = 0
+        self.score_misses = 0
+
+    def _key(self, question: str, passage: str) -> str:
+        raw = f"{self.model_name}\x1f{normalize_text(question)}\x1f{passage}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _uncached(self, question: str, passages: list[str]) -> list[str]:
+        with self._lock:
+            return list(dict.fromkeys(p for p in passages if self._key(question, p) not in self._scores))
+
+    def estimate_seconds(self, question: str, passages: list[str]) -> float:
+        """Predicted wall time of score(question, passages); cached pairs are free"""
+        uncached = len(self._uncached(question, passages))
+        return self._overhead_seconds + uncached * self._seconds_per_pair if uncached else 0.0
+
+    def within_budget(self, question: str, passages: list[str], budget_ms: float) -> tuple[bool, str]:
+        """Whether re-ranking fits budget_ms, with the reason when it does not"""
+        estimate = self.estimate_seconds(question, passages)
+        if estimate == 0.0:
+            return True, "all pair scores cached"
+        if not self.registry.is_loaded(self.model_name):
+            # Loading takes seconds, never spend it inside a request; load in the background instead
+            self.warmup_in_background()
+            return False, "reranker model is loading"
+        if estimate * 1000 > budget_ms:
+            return False, f"estimated {estimate * 1000:.0f} ms exceeds the {budget_ms:.0f} ms budget"
+        return True, f"estimated {estimate * 1000:.0f} ms"
+
+    def warmup_in_background(self) -> None:
+        with self._lock:
+            if self._warming_up:
+                return
+            self._warming_up = True
+
+        def load():
+            try:
+                self.registry.warmup(self.model_name)
+            except Exception as e:
+                logger.warning(f"Failed to load reranker model {self.model_name}: {e}")
+            finally:
+                with self._lock:
+                    self._warming_up = False
+
+        threading.Thread(target=load, name="reranker-warmup", daemon=True).start()
+
+    def score(self, question: str, passages: list[str]) -> list[float]:
+        """Relevance score of every passage for question; blocking, run it in an executor"""
+        keys = {passage: self._key(question, passage) for passage in passages}
+        # Scores of this call are read out first, so evicting them below cannot lose them
+        found: dict[str, float] = {}
+        with self._lock:
+            for passage, key in keys.items():
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[passage] = self._scores[key]
+        uncached = [passage for passage in keys if passage not in found]
+        if uncached:
+            model = self.registry.get(self.model_name)
+            started = time.perf_counter()
+            scores = model.predict([(question, passage) for passage in uncached])
+            self._observe(time.perf_counter() - started, len(uncached))
+            found.update((passage, float(score)) for passage, score in zip(uncached, scores))
+        with self._lock:
+            for passage in uncached:
+                self._scores[keys[passage]] = found[passage]
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+            self.score_misses += len(uncached)
+            self.score_hits += len(passages) - len(uncached)
+        return [found[passage] for passage in passages]
+
+    def rerank(self, question: str, rows: list[dict[str, Any]], text_key: str, top_k: int, budget_ms: float) -> tuple[list[dict[str, Any]], bool, str]:
+        """
+        Re-order retrieved rows by cross-encoder relevance when it fits the latency budget.
+
+        Args:
+            question (str): The search question.
+            rows (list[dict]): Candidates in vector order.
+            text_key (str): Key of the passage text in each row.
+            top_k (int): Number of rows to return.
+            budget_ms (float): Latency allowed for scoring.
+
+        Returns:
+            tuple: The top_k rows (with `rerank_score` when re-ranked), whether they were re-ranked,
+            and the reason.
+        """
+        passages = [str(row.get(text_key) or "") for row in rows]
+        allowed, reason = self.within_budget(question, passages, budget_ms)
+        if not allowed:
+            with self._lock:
+                self.skipped += 1
+            return rows[:top_k], False, reason
+        scores = self.score(question, passages)
+        with self._lock:
+            self.reranked += 1
+        order = sorted(range(len(rows)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [{**rows[i], "rerank_score": round(scores[i], 6)} for i in order], True, reason
+
+    def _observe(self, seconds: float, pairs: int) -> None:
+        # Split the batch time into overhead and per-pair cost; single-pair batches mostly measure overhead
+        per_pair = seconds / pairs
+        with self._lock:
+            self._seconds_per_pair = (1 - EWMA_ALPHA) * self._seconds_per_pair + EWMA_ALPHA * per_pair
+            overhead = max(seconds - pairs * self._seconds_per_pair, 0.0)
+            self._overhead_seconds = (1 - EWMA_ALPHA) * self._overhead_seconds + EWMA_ALPHA * overhead
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "model_name": self.model_name,
+                "loaded": self.registry.is_loaded(self.model_name),
+                "reranked": self.reranked,
+                "skipped": self.skipped,
+                "cached_pair_scores": len(self._scores),
+                "score_hits": self.score_hits,
+                "score_misses": self.score_misses,
+                "ms_per_pair": round(self._seconds_per_pair * 1000, 2),
+                "overhead_ms": round(self._overhead_seconds * 1000, 2),
+            }
+
+
+_reranker: Reranker | None = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Reranker:
+    """The process-wide reranker for CLICKZETTA_RERANKER_MODEL"""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = Reranker(os.getenv("CLICKZETTA_RERANKER_MODEL", DEFAULT_RERANKER_MODEL))
+        return _reranker
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Iterable
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_SEMANTIC_THRESHOLD = 0.95
+DEFAULT_SEMANTIC_MAX_ENTRIES = 256
+DEFAULT_QUERY_CACHE_MAX_ENTRIES = 256
+DEFAULT_QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Upper bounds of the best-similarity histogram kept for tuning the semantic threshold
+SIMILARITY_BUCKETS = (0.8, 0.85, 0.9, 0.95, 0.98)
+
+
+def table_tag(table_name: str) -> str:
+    """Normalize a table reference so `Schema.Table`, `table` and `` `table` `` invalidate the same entries"""
+    return table_name.strip().replace("`", "").replace('"', "").rsplit(".", 1)[-1].lower()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of tool results with a time-to-live.
+
+    Every entry is tagged with the tables it was read from, so a write to a table can drop all results
+    that depend on it. Entries are evicted when they expire, when there are more than max_entries, or
+    when the summed JSON size exceeds max_bytes.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int | None = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (expires_at, size, tags, value)
+        self._entries: OrderedDict[str, tuple[float, int, frozenset[str], Any]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, key: str, value: Any, tables: Iterable[str] = ()) -> None:
+        """Store a JSON-serializable value read from tables"""
+        if not self.enabled:
+            return
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, frozenset(table_tag(t) for t in tables if t), value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate_table(self, table_name: str) -> int:
+        """Drop every entry read from table_name and return how many were dropped"""
+        tag = table_tag(table_name)
+        with self._lock:
+            stale = [key for key, (_, _, tags, _) in self._entries.items() if tag in tags]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SemanticCache:
+    """
+    Cache of results keyed by question embedding instead of question text.
+
+    A lookup returns the result of the most similar cached question in the same scope (table,
+    columns, filters and limit) when its cosine similarity reaches threshold, so paraphrases of a
+    question share one warehouse query. Embeddings are expected to be normalized.
+
+    Besides hits and misses, the best similarity of every lookup is counted in a histogram, which
+    shows how many more lookups a lower threshold would answer.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_SEMANTIC_THRESHOLD,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_SEMANTIC_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._next_id = 0
+        # id -> (scope, expires_at, vector, tags, value), oldest first
+        self._entries: OrderedDict[int, tuple[str, float, np.ndarray, frozenset[str], Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._hit_similarity = 0.0
+        self._no_candidate = 0
+        self._histogram = [0] * (len(SIMILARITY_BUCKETS) + 1)
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.threshold <= 1 and self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, scope: str, vector: Any) -> Any | None:
+        if not self.enabled:
+            return None
+        import numpy as np
+
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        now = time.monotonic()
+        with self._lock:
+            for entry_id in [i for i, entry in self._entries.items() if entry[1] < now]:
+                del self._entries[entry_id]
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry[0] == scope]
+            if not candidates:
+                self.misses += 1
+                self._no_candidate += 1
+                return None
+            similarities = np.stack([entry[2] for _, entry in candidates]) @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            self._histogram[bisect.bisect_right(SIMILARITY_BUCKETS, similarity)] += 1
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            entry_id, entry = candidates[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            self._hit_similarity += similarity
+            return entry[4]
+
+    def put(self, scope: str, vector: Any, value: Any, tables: Iterable[str] = ()) -> None:
+        if not self.enabled:
+            return
+        import numpy as np
+
+        with self._lock:
+            self._entries[self._next_id] = (
+                scope,
+                time.monotonic() + self.ttl_seconds,
+                np.asarray(vector, dtype=np.float32).reshape(-1),
+                frozenset(table_tag(t) for t in tables if t),
+                value,
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_table(self, table_name: str) -> int:
+        """Drop every entry read from table_name and return how many were dropped"""
+        tag = table_tag(table_name)
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items() if tag in entry[3]]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            bounds = [f"<{SIMILARITY_BUCKETS[0]}"] + [f">={bound}" for bound in SIMILARITY_BUCKETS]
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "average_hit_similarity": round(self._hit_similarity / self.hits, 4) if self.hits else None,
+                "lookups_without_candidate": self._no_candidate,
+                "best_similarity_histogram": dict(zip(bounds, self._histogram)),
+            }
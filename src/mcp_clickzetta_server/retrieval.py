@@ -0,0 +1,44 @@
+from typing import Any, Callable, Hashable, Iterable
+
+# The constant from Cormack et al.; it damps the weight of the very first ranks so one list cannot dominate
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: dict[str, Iterable[dict[str, Any]]],
+    key: Callable[[dict[str, Any]], Hashable],
+    k: int = DEFAULT_RRF_K,
+    limit: int | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Merge several ranked result lists with reciprocal-rank fusion.
+
+    Every item scores sum(1 / (k + rank)) over the lists it appears in, with ranks starting at 1 in
+    the order each list is given. Items with the same key are merged into one result: the fields of
+    the first occurrence are kept and the per-list ranks are recorded under `ranks`.
+
+    Args:
+        ranked_lists (dict[str, Iterable[dict]]): Ranked results by retriever name, best first.
+        key (Callable): Returns the identity of a result, used to de-duplicate across and within lists.
+        k (int): The RRF constant.
+        limit (int): Number of fused results to return, all when None.
+
+    Returns:
+        list[dict]: Fused results, best first, with `rrf_score` and `ranks` added.
+    """
+    fused: dict[Hashable, dict[str, Any]] = {}
+    for source, results in ranked_lists.items():
+        rank = 0
+        for result in results:
+            identity = key(result)
+            entry = fused.get(identity)
+            if entry is not None and source in entry["ranks"]:
+                # A duplicate within one list only counts at its best rank
+                continue
+            rank += 1
+            if entry is None:
+                entry = fused[identity] = {**result, "rrf_score": 0.0, "ranks": {}}
+            entry["ranks"][source] = rank
+            entry["rrf_score"] += 1.0 / (k + rank)
+    ordered = sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)
+    return ordered[:limit] if limit is not None else ordered
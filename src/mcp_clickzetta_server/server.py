@@ -1,14 +1,17 @@
+import asyncio
 import datetime
 import importlib.metadata
 import json
 import logging
 import os
+import re
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from typing import Any, Callable
+from typing import TYPE_CHECKING, Any, Callable
 import decimal
-import pandas as pd
 
 
 import mcp.server.stdio
@@ -17,18 +20,43 @@ import yaml
 from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
 from pydantic import AnyUrl, BaseModel
-from clickzetta.zettapark.session import Session
-import clickzetta.zettapark.types as T
 
 from .write_detector import SQLWriteDetector
-from .util import read_data_from_url_or_file_into_dataframe, generate_df_schema, get_embedding_hf,connect_to_database_and_read_data_from_table_into_dataframe,embedding_dim,embedding_max_tokens
+from .util import read_data_from_url_or_file_into_dataframe, generate_df_schema, encode_texts,get_current_embedding_cache,sql_string_literal,format_vector_literal,batched,list_knowledge_files,connect_to_database_and_read_data_from_table_into_dataframe,embedding_dim,embedding_max_tokens,embedding_model_name
+from .embeddings import model_registry
+from .embedding_cache import embedding_cache_stats, normalize_text
+from .embedding_scheduler import EmbeddingBatcher, create_embedding_executor, warmup_embedding_executor
 from .prompts import PROMPTS
 from .knowledges import KNOWLEDGES
+from .vector_index import DEFAULT_INDEX_DIR, LocalVectorIndex
+from .chunker import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS, get_token_counter, iter_file_chunks, iter_string_chunks
+from .retrieval import DEFAULT_RRF_K, reciprocal_rank_fusion
+from .knowledge_index import DEFAULT_MIN_SIMILARITY, DEFAULT_MIN_TERM_COVERAGE, KnowledgeIndex
+from .backfill import BACKFILL_ACTIONS, BACKFILL_MODES, DEFAULT_BACKFILL_BATCH_SIZE, DEFAULT_BACKFILL_PAGE_SIZE, BackfillJob, default_backfill_job_id
+from .dedup import DEDUP_MODES, DEFAULT_DEDUP_MODE, DEFAULT_DEDUP_THRESHOLD, DEFAULT_MAX_DUPLICATE_PAIRS, build_near_duplicate_pairs_sql, group_near_duplicates
+from .vector_query import (
+    VECTOR_SEARCH_MAX_DISTANCE,
+    VectorIndexDetector,
+    build_batch_vector_search_sql,
+    build_build_index_sql,
+    build_create_vector_index_sql,
+    build_vector_search_sql,
+    default_vector_index_name,
+    find_vector_columns,
+)
+from .reranker import DEFAULT_RERANK_BUDGET_MS, DEFAULT_RERANK_CANDIDATES, get_reranker, reranker_registry
+from .result_cache import DEFAULT_MAX_ENTRIES, DEFAULT_QUERY_CACHE_MAX_BYTES, DEFAULT_QUERY_CACHE_MAX_ENTRIES, DEFAULT_SEMANTIC_MAX_ENTRIES, DEFAULT_SEMANTIC_THRESHOLD, DEFAULT_TTL_SECONDS, ResultCache, SemanticCache, table_tag
 from .samples import SAMPLES
+from .query_cursor import DEFAULT_CURSOR_TTL, DEFAULT_MAX_CURSORS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, CursorRegistry, QueryCursor
+from .session_pool import DEFAULT_CHECKOUT_TIMEOUT, DEFAULT_MIN_SESSIONS, DEFAULT_REFRESH_MARGIN, SessionPool
 
 import dotenv
 dotenv.load_dotenv()
 
+# pandas and the zettapark session are imported on first use, not before the stdio handshake
+if TYPE_CHECKING:
+    import pandas as pd
+
 # 加载 samples 数据
 samples_sql = SAMPLES
 
@@ -37,6 +65,9 @@ embedding_column_name = os.getenv("Similar_embedding_column_name")
 content_column_name = os.getenv("Similar_content_column_name")
 other_columns_name = os.getenv("Similar_other_columns_name")
 
+# Shared by all handlers that need embeddings, so concurrent tool calls are encoded together
+embedding_batcher = EmbeddingBatcher(encode_texts, get_cache=get_current_embedding_cache)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -45,7 +76,145 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mcp_clickzetta_server")
 
-def convert_df_to_dict(data: pd.DataFrame) -> list[dict[str, Any]]:
+# Link to the yunqi.tech page of a knowledge row ingested from the documentation markdown files
+DOC_LINK_SQL = """CONCAT(
+                   'https://yunqi.tech/documents',
+                   CASE
+                       WHEN RIGHT(file_directory, 3) = '/s3' THEN ''
+                       WHEN RIGHT(filename, 3) <> '.md' THEN ''
+                       ELSE CONCAT('/', SUBSTRING_INDEX(file_directory, '/s3/', -1))
+                   END,
+                   CASE
+                       WHEN RIGHT(filename, 3) <> '.md' THEN ''
+                       ELSE CONCAT(
+                           '/',
+                           LEFT(filename, LENGTH(filename) - LENGTH(SUBSTRING_INDEX(filename, '.', -1)) - 1)
+                       )
+                   END
+               )"""
+
+# Local mirrors of knowledge tables that can answer vector_search without a warehouse round trip
+local_vector_indexes: list[LocalVectorIndex] = []
+# Set when a write made a mirror stale, so it is refreshed without waiting for the next interval
+local_vector_index_wakeup = asyncio.Event()
+
+# Free-text search over the built-in KNOWLEDGES, embedded on first use through the embedding cache
+knowledge_index = KnowledgeIndex(
+    KNOWLEDGES,
+    min_term_coverage=float(os.getenv("CLICKZETTA_KNOWLEDGE_MIN_TERM_COVERAGE", DEFAULT_MIN_TERM_COVERAGE)),
+    min_similarity=float(os.getenv("CLICKZETTA_KNOWLEDGE_MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY)),
+)
+knowledge_index_lock = asyncio.Lock()
+
+# Answers of vector_search, match_all and hybrid_search, dropped when knowledge is added to their table
+retrieval_cache = ResultCache(
+    ttl_seconds=float(os.getenv("CLICKZETTA_RESULT_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+    max_entries=int(os.getenv("CLICKZETTA_RESULT_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+)
+# vector_search answers reused for paraphrased questions whose embeddings are close enough
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv("CLICKZETTA_SEMANTIC_CACHE_THRESHOLD", DEFAULT_SEMANTIC_THRESHOLD)),
+    ttl_seconds=retrieval_cache.ttl_seconds,
+    max_entries=int(os.getenv("CLICKZETTA_SEMANTIC_CACHE_SIZE", DEFAULT_SEMANTIC_MAX_ENTRIES)),
+)
+# read_query results by normalized SQL, dropped when a tool writes to a table the query reads
+query_cache = ResultCache(
+    ttl_seconds=float(os.getenv("CLICKZETTA_QUERY_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+    max_entries=int(os.getenv("CLICKZETTA_QUERY_CACHE_SIZE", DEFAULT_QUERY_CACHE_MAX_ENTRIES)),
+    max_bytes=int(os.getenv("CLICKZETTA_QUERY_CACHE_MAX_BYTES", DEFAULT_QUERY_CACHE_MAX_BYTES)),
+)
+# read_query results larger than one page, continued with fetch_page
+query_cursors = CursorRegistry(
+    ttl_seconds=float(os.getenv("CLICKZETTA_CURSOR_TTL", DEFAULT_CURSOR_TTL)),
+    max_cursors=int(os.getenv("CLICKZETTA_MAX_CURSORS", DEFAULT_MAX_CURSORS)),
+)
+# Queries whose result changes without any write are never cached
+UNCACHEABLE_QUERY_PATTERN = re.compile(r"\b(CURRENT_TIMESTAMP|CURRENT_DATE|CURRENT_TIME|NOW|SYSDATE|RAND|RANDOM|UUID)\b", re.IGNORECASE)
+# Tag of cached catalog reads (SHOW, DESC, information_schema), dropped by every write
+CATALOG_CACHE_TAG = "__catalog__"
+
+
+# Which knowledge tables have a vector index on their embedding column, checked with SHOW INDEX
+vector_index_detector = VectorIndexDetector()
+# Embedding backfills started by backfill_embeddings, by job id
+backfill_jobs: dict[str, BackfillJob] = {}
+
+
+# Background work started by tools, kept referenced until done so failures are logged
+maintenance_tasks: set[asyncio.Task] = set()
+
+
+def start_maintenance_task(coroutine, description: str) -> asyncio.Task:
+    """Run coroutine in the background and log its failure, since no tool call awaits it"""
+    task = asyncio.get_running_loop().create_task(coroutine)
+    maintenance_tasks.add(task)
+
+    def done(task: asyncio.Task) -> None:
+        maintenance_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"{description} failed: {task.exception()}")
+
+    task.add_done_callback(done)
+    return task
+
+
+async def rebuild_local_vector_index(db, index: LocalVectorIndex) -> None:
+    await db.run_async(index.rebuild, lambda query: db.execute_query(query)[0])
+    # Answers cached while the mirror still held the old rows are stale
+    invalidate_cached_results(index.table_name, mirrors=False)
+
+
+def invalidate_cached_results(table_name: str, mirrors: bool = True) -> None:
+    """
+    Drop cached search and read_query results read from table_name after it was written to.
+
+    Local vector index mirrors of the table are marked stale as well, and the refresher is woken to
+    sync them; refreshes themselves pass mirrors=False.
+    """
+    if mirrors:
+        for index in local_vector_indexes:
+            if table_tag(index.table_name) == table_tag(table_name):
+                index.mark_stale()
+                local_vector_index_wakeup.set()
+    retrieval_cache.invalidate_table(table_name)
+    semantic_cache.invalidate_table(table_name)
+    query_cache.invalidate_table(table_name)
+    # Table lists, descriptions and information_schema row counts may have changed as well
+    query_cache.invalidate_table(CATALOG_CACHE_TAG)
+
+
+def find_local_vector_index(table_name, embedding_column_name, content_column_name, partition_scope) -> LocalVectorIndex | None:
+    return next(
+        (
+            index
+            for index in local_vector_indexes
+            if index.ready and index.matches(table_name, embedding_column_name, content_column_name, partition_scope)
+        ),
+        None,
+    )
+
+
+def data_output(data: list[dict[str, Any]], data_id: str) -> list[types.TextContent | types.EmbeddedResource]:
+    """Render tool result rows as YAML text plus a JSON data:// resource, like every query tool does"""
+    output = {
+        "type": "data",
+        "data_id": data_id,
+        "data": data,
+    }
+    yaml_output = data_to_yaml(output)
+    json_output = json.dumps(output, ensure_ascii=False)
+    return [
+        types.TextContent(type="text", text=yaml_output),
+        types.EmbeddedResource(
+            type="resource",
+            resource=types.TextResourceContents(uri=f"data://{data_id}", text=json_output, mimeType="application/json"),
+        ),
+    ]
+
+
+def convert_df_to_dict(data: "pd.DataFrame") -> list[dict[str, Any]]:
+    import pandas as pd
+
     # Convert Timestamp, date, and Decimal objects to strings for JSON serialization compatibility
     # Convert the data to a pandas DataFrame for efficient processing
     df = pd.DataFrame(data)
@@ -68,12 +237,26 @@ def data_to_yaml(data: Any) -> str:
 
 class ClickzettaDB:
     AUTH_EXPIRATION_TIME = 1800
+    DEFAULT_QUERY_WORKERS = 8
 
-    def __init__(self, connection_config: dict):
+    def __init__(self, connection_config: dict, query_workers: int | None = None):
         self.connection_config = connection_config
-        self.session = None
         self.insights: list[str] = []
-        self.auth_time = 0
+        # Queries run on this bounded pool so a long warehouse query never blocks the event loop
+        self.query_workers = query_workers or int(os.getenv("CLICKZETTA_QUERY_WORKERS", self.DEFAULT_QUERY_WORKERS))
+        self.executor = ThreadPoolExecutor(max_workers=self.query_workers, thread_name_prefix="clickzetta-query")
+        # One session per concurrently running query, so queries do not share a connection
+        self.pool = SessionPool(
+            self._init_database,
+            min_size=int(os.getenv("CLICKZETTA_SESSION_POOL_MIN", DEFAULT_MIN_SESSIONS)),
+            max_size=int(os.getenv("CLICKZETTA_SESSION_POOL_MAX", self.query_workers)),
+            checkout_timeout=float(os.getenv("CLICKZETTA_SESSION_CHECKOUT_TIMEOUT", DEFAULT_CHECKOUT_TIMEOUT)),
+            max_age=self.AUTH_EXPIRATION_TIME,
+        )
+        self._stats_lock = threading.Lock()
+        self.queries_submitted = 0
+        self.queries_running = 0
+        self.queries_completed = 0
         self.connection_config["hints"] = {
             "sdk.job.timeout": 300,
             "query_tag": "Query from MCP Server",
@@ -88,24 +271,40 @@ class ClickzettaDB:
         }
 
     def _init_database(self):
-        """Initialize connection to the Clickzetta database"""
+        """Open a new session to the Clickzetta database"""
         try:
             # logger.info(f"self.connection_config: {self.connection_config}")
-            self.session = Session.builder.configs(self.connection_config).create()
+            from clickzetta.zettapark.session import Session
+
+            session = Session.builder.configs(self.connection_config).create()
             for component in [ "schema"]:
-                self.session.sql(f"USE {component.upper()} {self.connection_config[component].upper()}")
-            self.auth_time = time.time()
+                session.sql(f"USE {component.upper()} {self.connection_config[component].upper()}")
+            return session
         except Exception as e:
             raise ValueError(f"Failed to connect to Clickzetta workspace/database: {e}")
 
+    def session_scope(self):
+        """
+        Check out a pooled session for a with block, e.g. for dataframe writes.
+
+        Raises:
+            TimeoutError: If every session stays busy for CLICKZETTA_SESSION_CHECKOUT_TIMEOUT seconds.
+        """
+        return self.pool.session()
+
+    def prefill_sessions(self) -> None:
+        """Open the minimum number of sessions ahead of the first query"""
+        try:
+            self.pool.prefill()
+        except Exception as e:
+            logger.warning(f"Could not open warehouse sessions ahead of time: {e}")
+
     def execute_query(self, query: str) -> list[dict[str, Any]]:
         """Execute a SQL query and return results as a list of dictionaries"""
-        if not self.session or time.time() - self.auth_time > self.AUTH_EXPIRATION_TIME:
-            self._init_database()
-
         logger.debug(f"Executing query: {query}")
         try:
-            result = self.session.sql(query).to_pandas()
+            with self.session_scope() as session:
+                result = session.sql(query).to_pandas()
             result_rows = result.to_dict(orient="records")
             data_id = str(uuid.uuid4())
 
@@ -115,6 +314,57 @@ class ClickzettaDB:
             logger.error(f'Database error executing "{query}": {e}')
             raise
 
+    def open_cursor(self, query: str) -> QueryCursor:
+        """
+        Start a query and return a cursor streaming its rows with to_local_iterator.
+
+        The cursor keeps a pooled session checked out until it is exhausted or closed.
+        """
+        logger.debug(f"Opening cursor for query: {query}")
+        item = self.pool.acquire()
+        try:
+            rows = item.session.sql(query).to_local_iterator()
+        except Exception as e:
+            self.pool.release(item, failed=True)
+            logger.error(f'Database error executing "{query}": {e}')
+            raise
+        return QueryCursor(query, rows, lambda failed: self.pool.release(item, failed))
+
+    async def run_async(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking call that uses the session, such as a dataframe write, on the query pool"""
+        with self._stats_lock:
+            self.queries_submitted += 1
+
+        def run():
+            with self._stats_lock:
+                self.queries_running += 1
+            try:
+                return func(*args)
+            finally:
+                with self._stats_lock:
+                    self.queries_running -= 1
+                    self.queries_completed += 1
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+
+    async def execute_query_async(self, query: str) -> tuple[list[dict[str, Any]], str]:
+        """Awaitable execute_query; independent tool calls overlap up to query_workers queries"""
+        return await self.run_async(self.execute_query, query)
+
+    async def fetch_rows_async(self, query: str) -> list[dict[str, Any]]:
+        """execute_query_async without the data id, for background jobs that only need the rows"""
+        return (await self.execute_query_async(query))[0]
+
+    def query_stats(self) -> dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "workers": self.query_workers,
+                "running": self.queries_running,
+                "queued": self.queries_submitted - self.queries_completed - self.queries_running,
+                "completed": self.queries_completed,
+                "sessions": self.pool.stats(),
+            }
+
     def add_insight(self, insight: str) -> None:
         """Add a new insight to the collection"""
         self.insights.append(insight)
@@ -134,6 +384,12 @@ class ClickzettaDB:
         return memo
 
 
+def save_dataframe_as_table(db: ClickzettaDB, df, df_schema, dest_table: str) -> None:
+    """Write a pandas DataFrame to dest_table, replacing it; blocking, run it with db.run_async"""
+    with db.session_scope() as session:
+        session.create_dataframe(df, schema=df_schema).write.mode("overwrite").save_as_table(dest_table)
+
+
 def handle_tool_errors(func: Callable) -> Callable:
     """Decorator to standardize tool error handling"""
 
@@ -163,7 +419,7 @@ async def handle_list_tables(arguments, db, *_):
         FROM {db.connection_config['workspace']}.information_schema.tables 
         WHERE table_catalog = '{db.connection_config['workspace'].lower()}' AND table_schema = '{db.connection_config['schema'].lower()}'
     """
-    data, data_id = db.execute_query(query)
+    data, data_id = await db.execute_query_async(query)
 
     # Convert the DataFrame back to a list of dictionaries
     data = convert_df_to_dict(data)
@@ -193,7 +449,7 @@ async def handle_describe_table(arguments, db, *_):
     query = f"""
         DESC TABLE EXTENDED {table_name};
     """
-    data, data_id = db.execute_query(query)
+    data, data_id = await db.execute_query_async(query)
 
     # Convert the DataFrame back to a list of dictionaries
     data = convert_df_to_dict(data)
@@ -220,7 +476,7 @@ async def handle_show_object_list(arguments, db, *_):
     query = f"""
        SHOW {object_type};
     """
-    data, data_id = db.execute_query(query)
+    data, data_id = await db.execute_query_async(query)
 
     # Convert the DataFrame back to a list of dictionaries
     data = convert_df_to_dict(data)
@@ -248,7 +504,7 @@ async def handle_desc_object(arguments, db, *_):
     query = f"""
        desc {object_type} extended {object_name};
     """
-    data, data_id = db.execute_query(query)
+    data, data_id = await db.execute_query_async(query)
 
     # Convert the DataFrame back to a list of dictionaries
     data = convert_df_to_dict(data)
@@ -268,6 +524,26 @@ async def handle_desc_object(arguments, db, *_):
         ),
     ]
 
+def vector_search_scope(table_name, embedding_column_name, content_column_name, partition_scope, other_columns_name, limit) -> str:
+    """Cache scope shared by vector_search and batch_vector_search, so either one answers the other's questions"""
+    return ResultCache.make_key(
+        "vector_search", table_name, embedding_column_name, content_column_name, partition_scope, other_columns_name, int(limit)
+    )
+
+
+async def vector_search_access_path(db, table_name, embedding_column_name, partition_scope) -> str:
+    """
+    How a vector search on the table is expected to read rows.
+
+    An index found by SHOW INDEX is only reported as available: whether the plan uses it depends on
+    the index being built and on the optimizer, which this check does not see.
+    """
+    vector_index_name = await db.run_async(vector_index_detector.find, lambda sql: db.execute_query(sql)[0], table_name, embedding_column_name)
+    if vector_index_name:
+        return f"vector_index_available {vector_index_name}"
+    return "full_scan" if not partition_scope else "partition_scan"
+
+
 async def handle_vector_search(arguments, db, *_):
     if not arguments or "question" not in arguments:
         raise ValueError("Missing object_type argument")
@@ -298,52 +574,149 @@ async def handle_vector_search(arguments, db, *_):
         vector_search_limit_n = arguments["vector_search_limit_n"]
     
     question = arguments["question"]
-    embedded_question = get_embedding_hf(question)
-    embedding_list = embedded_question.tolist()
-    query = f"""
-        SELECT {content_column_name},
-               COSINE_DISTANCE({embedding_column_name}, CAST("{embedding_list}" as VECTOR({embedding_dim}))) AS distance,
-               "vector_search_cosine" as search_method,
-               {other_columns_name},
-               CONCAT(
-                   'https://yunqi.tech/documents',
-                   CASE 
-                       WHEN RIGHT(file_directory, 3) = '/s3' THEN ''
-                       WHEN RIGHT(filename, 3) <> '.md' THEN ''
-                       ELSE CONCAT('/', SUBSTRING_INDEX(file_directory, '/s3/', -1))
-                   END,
-                   CASE 
-                       WHEN RIGHT(filename, 3) <> '.md' THEN ''
-                       ELSE CONCAT(
-                           '/',
-                           LEFT(filename, LENGTH(filename) - LENGTH(SUBSTRING_INDEX(filename, '.', -1)) - 1)
-                       )
-                   END
-               ) AS doc_link
-        FROM {table_name}
-        WHERE COSINE_DISTANCE({embedding_column_name}, CAST("{embedding_list}" as VECTOR({embedding_dim}))) < 0.8
-        ORDER BY 2
-        LIMIT {vector_search_limit_n};
-    """
-    data, data_id = db.execute_query(query)
+    # With rerank, more candidates are fetched and a cross-encoder picks the best vector_search_limit_n of them
+    rerank = bool(arguments.get("rerank", False))
+    limit_n = int(vector_search_limit_n)
+    candidates_n = max(int(arguments.get("rerank_candidates_n", DEFAULT_RERANK_CANDIDATES)), limit_n) if rerank else limit_n
+    rerank_budget_ms = float(arguments.get("rerank_budget_ms", os.getenv("CLICKZETTA_RERANK_BUDGET_MS", DEFAULT_RERANK_BUDGET_MS)))
+    semantic_scope = vector_search_scope(table_name, embedding_column_name, content_column_name, partition_scope, other_columns_name, limit_n)
+    if rerank:
+        semantic_scope = ResultCache.make_key(semantic_scope, "rerank", candidates_n)
+    cache_key = ResultCache.make_key(semantic_scope, normalize_text(question))
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return data_output(cached, str(uuid.uuid4()))
+    embedded_question = await embedding_batcher.embed(question)
+    cached = semantic_cache.get(semantic_scope, embedded_question)
+    if cached is not None:
+        return data_output(cached, str(uuid.uuid4()))
+
+    data = None
+    data_id = str(uuid.uuid4())
+    # Answer from the local mirror when it covers this table and scope; fall back to SQL on a miss
+    local_index = find_local_vector_index(table_name, embedding_column_name, content_column_name, partition_scope)
+    if local_index is not None:
+        rows = local_index.search(embedded_question, candidates_n, max_distance=VECTOR_SEARCH_MAX_DISTANCE)
+        if rows:
+            vector_index_detector.record_access(table_name, "local_vector_index")
+            data = [
+                {
+                    content_column_name: row["content"],
+                    "distance": str(row["distance"]),
+                    "search_method": "local_vector_index",
+                    "access_path": "local_vector_index",
+                    **{k: v for k, v in row.items() if k not in ("id", "content", "distance", "date_modified")},
+                }
+                for row in rows
+            ]
+
+    if data is None:
+        access_path = await vector_search_access_path(db, table_name, embedding_column_name, partition_scope)
+        vector_index_detector.record_access(table_name, access_path)
+        query = build_vector_search_sql(
+            table_name,
+            embedding_column_name,
+            content_column_name,
+            embedded_question,
+            embedding_dim,
+            candidates_n,
+            partition_scope=partition_scope,
+            other_columns_name=other_columns_name,
+            extra_columns={"doc_link": DOC_LINK_SQL},
+        )
+        data, data_id = await db.execute_query_async(query)
+
+        # Convert the DataFrame back to a list of dictionaries; the warehouse may return column names in any case
+        data = [
+            {
+                content_column_name: row.pop(content_column_name.lower()),
+                "distance": row.pop("distance"),
+                "search_method": "vector_search_cosine",
+                "access_path": access_path,
+                **row,
+            }
+            for row in ({k.lower(): v for k, v in row.items()} for row in convert_df_to_dict(data))
+        ]
 
-    # Convert the DataFrame back to a list of dictionaries
-    data = convert_df_to_dict(data)
+    reranked = not rerank
+    if rerank and data:
+        data, reranked, reason = await asyncio.get_running_loop().run_in_executor(
+            None, get_reranker().rerank, question, data, content_column_name, limit_n, rerank_budget_ms
+        )
+        for row in data:
+            row["rerank"] = reason if reranked else f"skipped: {reason}"
+    # Vector-order fallbacks are not cached, so the next call can still be re-ranked
+    if reranked:
+        retrieval_cache.put(cache_key, data, tables=[table_name])
+        semantic_cache.put(semantic_scope, embedded_question, data, tables=[table_name])
+    return data_output(data, data_id)
+
+async def handle_batch_vector_search(arguments, db, *_):
+    if not arguments or not arguments.get("questions"):
+        raise ValueError("Missing questions argument")
+    dotenv.load_dotenv()
+    table_name = arguments.get("table_name", os.getenv("Similar_table_name"))
+    embedding_column_name = arguments.get("embedding_column_name", os.getenv("Similar_embedding_column_name"))
+    content_column_name = arguments.get("content_column_name", os.getenv("Similar_content_column_name"))
+    partition_scope = arguments.get("partition_scope", os.getenv("Similar_partition_scope"))
+    other_columns_name = arguments.get("other_columns_name", os.getenv("Similar_other_columns_name"))
+    limit_n = int(arguments.get("vector_search_limit_n", 1))
+    questions = list(dict.fromkeys(arguments["questions"]))
+    semantic_scope = vector_search_scope(table_name, embedding_column_name, content_column_name, partition_scope, other_columns_name, limit_n)
+
+    # Questions already answered by vector_search or an earlier batch are not sent to the warehouse
+    answers: dict[str, list[dict[str, Any]]] = {}
+    for question in questions:
+        cached = retrieval_cache.get(ResultCache.make_key(semantic_scope, normalize_text(question)))
+        if cached is not None:
+            answers[question] = cached
+    pending = [question for question in questions if question not in answers]
+    embeddings = dict(zip(pending, await embedding_batcher.embed_many(pending)))
+    for question in pending:
+        cached = semantic_cache.get(semantic_scope, embeddings[question])
+        if cached is not None:
+            answers[question] = cached
+    pending = [question for question in pending if question not in answers]
+
+    access_path = None
+    if pending:
+        # A join against several query vectors is not the single-vector top-k shape a vector index answers
+        access_path = "full_scan" if not partition_scope else "partition_scan"
+        vector_index_detector.record_access(table_name, access_path)
+        query = build_batch_vector_search_sql(
+            table_name,
+            embedding_column_name,
+            content_column_name,
+            [embeddings[question] for question in pending],
+            embedding_dim,
+            limit_n,
+            partition_scope=partition_scope,
+            other_columns_name=other_columns_name,
+            extra_columns={"doc_link": DOC_LINK_SQL},
+        )
+        rows, _ = await db.execute_query_async(query)
+        results: dict[int, list[dict[str, Any]]] = {i: [] for i in range(len(pending))}
+        for row in convert_df_to_dict(rows):
+            row = {k.lower(): v for k, v in row.items()}
+            question_id = int(row.pop("question_id"))
+            row.pop("question_rank", None)
+            results[question_id].append(
+                {
+                    content_column_name: row.pop(content_column_name.lower()),
+                    "distance": row.pop("distance"),
+                    "search_method": "vector_search_cosine",
+                    "access_path": access_path,
+                    **row,
+                }
+            )
+        for question_id, question in enumerate(pending):
+            answers[question] = results[question_id]
+            retrieval_cache.put(ResultCache.make_key(semantic_scope, normalize_text(question)), results[question_id], tables=[table_name])
+            semantic_cache.put(semantic_scope, embeddings[question], results[question_id], tables=[table_name])
 
-    output = {
-        "type": "data",
-        "data_id": data_id,
-        "data": data,
-    }
-    yaml_output = data_to_yaml(output)
-    json_output = json.dumps(output, ensure_ascii=False)
-    return [
-        types.TextContent(type="text", text=yaml_output),
-        types.EmbeddedResource(
-            type="resource",
-            resource=types.TextResourceContents(uri=f"data://{data_id}", text=json_output, mimeType="application/json"),
-        ),
-    ]
+    data = [{"question": question, "results": answers[question]} for question in questions]
+    logger.info(f"batch_vector_search: {len(questions)} questions, {len(pending)} sent to the warehouse in one statement")
+    return data_output(data, str(uuid.uuid4()))
 
 async def handle_match_all(arguments, db, *_):
     if not arguments or "question" not in arguments:
@@ -362,6 +735,10 @@ async def handle_match_all(arguments, db, *_):
     elif "partition_scope" in arguments:
         partition_scope = arguments["partition_scope"]
     question = arguments["question"]
+    cache_key = ResultCache.make_key("match_all", normalize_text(question), table_name, content_column_name, partition_scope)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return data_output(cached, str(uuid.uuid4()))
     query = f"""
         SELECT  {content_column_name}, 0 AS distance, "match_all_search" as search_method
         FROM {table_name}
@@ -369,10 +746,11 @@ async def handle_match_all(arguments, db, *_):
         ORDER BY 2
         LIMIT 5;
         """
-    data, data_id = db.execute_query(query)
+    data, data_id = await db.execute_query_async(query)
 
     # Convert the DataFrame back to a list of dictionaries
     data = convert_df_to_dict(data)
+    retrieval_cache.put(cache_key, data, tables=[table_name])
 
     output = {
         "type": "data",
@@ -389,28 +767,193 @@ async def handle_match_all(arguments, db, *_):
         ),
     ]
 
+async def handle_hybrid_search(arguments, db, *_):
+    if not arguments or "question" not in arguments:
+        raise ValueError("Missing question argument")
+    dotenv.load_dotenv()
+    table_name = arguments.get("table_name", os.getenv("Similar_table_name"))
+    embedding_column_name = arguments.get("embedding_column_name", os.getenv("Similar_embedding_column_name"))
+    content_column_name = arguments.get("content_column_name", os.getenv("Similar_content_column_name"))
+    partition_scope = arguments.get("partition_scope", os.getenv("Similar_partition_scope"))
+    other_columns_name = arguments.get("other_columns_name", os.getenv("Similar_other_columns_name"))
+    limit_n = int(arguments.get("limit_n", 5))
+    candidate_n = max(int(arguments.get("candidate_n", 20)), limit_n)
+    rrf_k = int(arguments.get("rrf_k", DEFAULT_RRF_K))
+
+    question = arguments["question"]
+    cache_key = ResultCache.make_key(
+        "hybrid_search", normalize_text(question), table_name, embedding_column_name, content_column_name,
+        partition_scope, other_columns_name, limit_n, candidate_n, rrf_k,
+    )
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return data_output(cached, str(uuid.uuid4()))
+    embedded_question = await embedding_batcher.embed(question)
+
+    scope = f"({partition_scope}) AND " if partition_scope else ""
+    other_columns = f"{other_columns_name}, " if other_columns_name else ""
+    distance = f"COSINE_DISTANCE({embedding_column_name}, query_embedding.query_vector)"
+    # Both retrievers run in one statement; each keeps its own ranking and the fusion happens below.
+    # MATCH_ALL has no relevance score, so among rows containing every term the shortest passages rank first.
+    query = f"""
+        WITH query_embedding AS (
+            SELECT CAST('{format_vector_literal(embedded_question)}' AS VECTOR({embedding_dim})) AS query_vector
+        ),
+        vector_hits AS (
+            SELECT {content_column_name} AS content, {distance} AS distance, {other_columns}{DOC_LINK_SQL} AS doc_link
+            FROM {table_name}, query_embedding
+            WHERE {scope}{distance} < 0.8
+            ORDER BY distance
+            LIMIT {candidate_n}
+        ),
+        keyword_hits AS (
+            SELECT {content_column_name} AS content, {distance} AS distance, {other_columns}{DOC_LINK_SQL} AS doc_link
+            FROM {table_name}, query_embedding
+            WHERE {scope}MATCH_ALL({content_column_name}, {sql_string_literal(question)})
+            ORDER BY LENGTH({content_column_name})
+            LIMIT {candidate_n}
+        )
+        SELECT 'vector_search' AS retriever, ROW_NUMBER() OVER (ORDER BY distance) AS retriever_rank, * FROM vector_hits
+        UNION ALL
+        SELECT 'match_all' AS retriever, ROW_NUMBER() OVER (ORDER BY LENGTH(content)) AS retriever_rank, * FROM keyword_hits;
+    """
+    rows, data_id = await db.execute_query_async(query)
+    rows = sorted(({k.lower(): v for k, v in row.items()} for row in rows), key=lambda row: int(row["retriever_rank"]))
+
+    fused = reciprocal_rank_fusion(
+        {
+            retriever: [row for row in rows if row["retriever"] == retriever]
+            for retriever in ("vector_search", "match_all")
+        },
+        key=lambda row: row["content"],
+        k=rrf_k,
+        limit=limit_n,
+    )
+    data = [
+        {
+            content_column_name: row["content"],
+            "distance": row["distance"],
+            "search_method": "hybrid_rrf",
+            "rrf_score": round(row["rrf_score"], 6),
+            "ranks": row["ranks"],
+            **{k: v for k, v in row.items() if k not in ("content", "distance", "retriever", "retriever_rank", "rrf_score", "ranks")},
+        }
+        for row in fused
+    ]
+    data = convert_df_to_dict(data)
+    retrieval_cache.put(cache_key, data, tables=[table_name])
+    return data_output(data, data_id)
+
+async def handle_manage_vector_index(arguments, db, _, __, server):
+    if not arguments or "action" not in arguments:
+        raise ValueError("Missing action argument")
+    action = arguments["action"]
+    table_name = arguments.get("table_name") or os.getenv("Similar_table_name")
+    column_name = arguments.get("column_name") or os.getenv("Similar_embedding_column_name")
+    if not table_name:
+        raise ValueError("Missing table_name argument")
+    index_name = arguments.get("index_name")
+    if not index_name and action != "show":
+        existing = None
+        if action != "create" and column_name:
+            existing = await db.run_async(vector_index_detector.find, lambda sql: db.execute_query(sql)[0], table_name, column_name)
+        index_name = existing or default_vector_index_name(table_name, column_name or "")
+
+    if action == "show":
+        data, data_id = await db.execute_query_async(f"SHOW INDEX FROM {table_name}")
+        return data_output(convert_df_to_dict(data), data_id)
+    if action == "describe":
+        return await handle_desc_object({"object_type": "index", "object_name": index_name}, db)
+    if action == "create":
+        if not column_name:
+            raise ValueError("Missing column_name argument")
+        statements = [build_create_vector_index_sql(index_name, table_name, column_name, arguments.get("properties"))]
+        if arguments.get("build", True):
+            statements.append(build_build_index_sql(index_name, table_name))
+    elif action == "build":
+        # Large partitioned tables are built one partition at a time, as the knowledge entry recommends
+        partitions = arguments.get("partition_scopes") or [None]
+        statements = [build_build_index_sql(index_name, table_name, partition) for partition in partitions]
+    elif action == "drop":
+        statements = [f"DROP INDEX IF EXISTS {index_name}"]
+    else:
+        raise ValueError(f"Unknown action {action}, expected one of create, build, describe, show, drop")
+
+    results = []
+    for i, statement in enumerate(statements):
+        started = time.time()
+        await db.execute_query_async(statement)
+        results.append({"statement": statement, "seconds": round(time.time() - started, 2)})
+        await report_progress(server, i + 1, len(statements), statement)
+    # The index changes which access path vector_search takes, and answers cached before may differ
+    vector_index_detector.forget(table_name)
+    invalidate_cached_results(table_name)
+    return data_output([{"action": action, "index_name": index_name, "table_name": table_name, "executed": results}], str(uuid.uuid4()))
+
+async def handle_check_vector_retrieval_paths(arguments, db, *_):
+    arguments = arguments or {}
+    table_names = arguments.get("table_names") or [
+        name for name in dict.fromkeys([os.getenv("Similar_table_name"), *(index.table_name for index in local_vector_indexes)]) if name
+    ]
+    if not table_names:
+        raise ValueError("Missing table_names argument")
+    brute_force_rows = int(arguments.get("brute_force_rows", 10000))
+    execute = lambda sql: db.execute_query(sql)[0]
+
+    report = []
+    for table_name in table_names:
+        # The same DESC ... EXTENDED as desc_object, used to find every VECTOR column of the table
+        columns = find_vector_columns((await db.execute_query_async(f"desc table extended {table_name}"))[0])
+        count_rows, _ = await db.execute_query_async(f"SELECT COUNT(*) AS row_count FROM {table_name}")
+        rows = int(next(iter(count_rows[0].values())))
+        vector_index_detector.forget(table_name)
+        for column_name in columns:
+            index_name = await db.run_async(vector_index_detector.find, execute, table_name, column_name)
+            brute_force = index_name is None and rows >= brute_force_rows
+            entry = {
+                "table_name": table_name,
+                "column_name": column_name,
+                "rows": rows,
+                "vector_index": index_name,
+                "searches_by_access_path": vector_index_detector.access_paths(table_name),
+                "brute_force_scan": brute_force,
+            }
+            if brute_force:
+                suggested = default_vector_index_name(table_name, column_name)
+                entry["recommendation"] = (
+                    f"Every vector_search reads all {rows} rows. Create and build an index with manage_vector_index "
+                    f"(action=create, table_name={table_name}, column_name={column_name}), which runs: "
+                    f"{build_create_vector_index_sql(suggested, table_name, column_name)}; {build_build_index_sql(suggested, table_name)}"
+                )
+            report.append(entry)
+        if not columns:
+            report.append({"table_name": table_name, "rows": rows, "vector_index": None, "brute_force_scan": False, "note": "no VECTOR column"})
+    return data_output(report, str(uuid.uuid4()))
+
 async def handle_import_data_into_table_from_url(arguments, db, *_):
     if not arguments or "from_url" not in arguments or "dest_table" not in arguments:
         raise ValueError("Missing object_type argument")
     from_url = arguments["from_url"]
     dest_table = arguments["dest_table"]
-    df_loaded = read_data_from_url_or_file_into_dataframe(from_url)
+    # Downloading does not use the session, so it runs on the default executor instead of taking a query slot
+    df_loaded = await asyncio.get_running_loop().run_in_executor(None, read_data_from_url_or_file_into_dataframe, from_url)
     df_schema = generate_df_schema(df_loaded)
     
     query = f"""
        drop table if exists {dest_table};
     """
-    data, data_id = db.execute_query(query)
+    data, data_id = await db.execute_query_async(query)
+    invalidate_cached_results(dest_table)
     try:
-        zetta_df = db.session.create_dataframe(df_loaded, schema=df_schema)
-        zetta_df.write.mode("overwrite").save_as_table(dest_table)
+        await db.run_async(save_dataframe_as_table, db, df_loaded, df_schema, dest_table)
+        invalidate_cached_results(dest_table)
     except Exception as save_error:
         print(f"Error load data to table {dest_table}: {save_error}")
 
     # query = f"""
     #    desc table extended {dest_table};
     # """
-    # data, data_id = db.execute_query(query)
+    # data, data_id = await db.execute_query_async(query)
     data = [
         {"Result": "Successfully imported data into table", "Table": dest_table},
     ]
@@ -481,14 +1024,17 @@ async def handle_import_data_into_table_from_database(arguments, db, *_):
     # Connect to the source database and read data into a DataFrame
     try:
         query = f"SELECT * FROM {source_table};"
-        df_loaded = connect_to_database_and_read_data_from_table_into_dataframe(
-            db_type=db_type,
-            host=host,
-            port=port,
-            database=database,
-            username=username,
-            password=password,
-            table_name=source_table,
+        df_loaded = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: connect_to_database_and_read_data_from_table_into_dataframe(
+                db_type=db_type,
+                host=host,
+                port=port,
+                database=database,
+                username=username,
+                password=password,
+                table_name=source_table,
+            ),
         )
     except Exception as connection_error:
         raise RuntimeError(f"Failed to connect to the database or read data from table '{source_table}'. Error: {connection_error}")
@@ -499,14 +1045,15 @@ async def handle_import_data_into_table_from_database(arguments, db, *_):
     # Drop the destination table if it exists
     drop_query = f"DROP TABLE IF EXISTS {dest_table};"
     try:
-        db.execute_query(drop_query)
+        await db.execute_query_async(drop_query)
     except Exception as drop_error:
         raise RuntimeError(f"Failed to drop table '{dest_table}'. Error: {drop_error}")
+    invalidate_cached_results(dest_table)
 
     # Save the DataFrame into the destination table
     try:
-        zetta_df = db.session.create_dataframe(df_loaded, schema=df_schema)
-        zetta_df.write.mode("overwrite").save_as_table(dest_table)
+        await db.run_async(save_dataframe_as_table, db, df_loaded, df_schema, dest_table)
+        invalidate_cached_results(dest_table)
     except Exception as save_error:
         raise RuntimeError(f"Error loading data into table '{dest_table}': {save_error}")
 
@@ -531,29 +1078,104 @@ async def handle_import_data_into_table_from_database(arguments, db, *_):
         ),
     ]
 
-async def handle_read_query(arguments, db, write_detector, *_):
-    if write_detector.analyze_query(arguments["query"])["contains_write"]:
-        raise ValueError("Calls to read_query should not contain write operations")
-    data, data_id = db.execute_query(arguments["query"])
-    
-    # Convert the DataFrame back to a list of dictionaries
-    data = convert_df_to_dict(data)
-    output = {
-        "type": "data",
-        "data_id": data_id,
-        "data": data,
-    }
+def get_page_size(arguments: dict[str, Any]) -> int:
+    page_size = int(arguments.get("max_rows") or arguments.get("page_size") or os.getenv("CLICKZETTA_READ_QUERY_MAX_ROWS", DEFAULT_PAGE_SIZE))
+    if not 0 < page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"Page size must be between 1 and {MAX_PAGE_SIZE}")
+    return page_size
+
+
+def query_output(output: dict[str, Any]) -> list[types.TextContent | types.EmbeddedResource]:
+    """A page of query results as YAML text plus the same data as a JSON resource"""
     yaml_output = data_to_yaml(output)
     json_output = json.dumps(output, ensure_ascii=False)
     return [
         types.TextContent(type="text", text=yaml_output),
         types.EmbeddedResource(
             type="resource",
-            resource=types.TextResourceContents(uri=f"data://{data_id}", text=json_output, mimeType="application/json"),
+            resource=types.TextResourceContents(uri=f"data://{output['data_id']}", text=json_output, mimeType="application/json"),
         ),
     ]
 
 
+async def fetch_cursor_page(db, cursor: QueryCursor, page_size: int) -> dict[str, Any]:
+    """Next page of a cursor as read_query output; the cursor is registered while rows remain"""
+    rows, has_more = await db.run_async(cursor.fetch, page_size)
+    output = {
+        "type": "data",
+        "data_id": str(uuid.uuid4()),
+        "data": convert_df_to_dict(rows),
+        "rows_fetched": cursor.rows_fetched,
+    }
+    if has_more:
+        output["next_cursor"] = cursor.id
+        output["note"] = f"More rows follow; call fetch_page with cursor {cursor.id}, or narrow the query"
+    return output
+
+
+def close_cursor_in_background(db, cursor: QueryCursor) -> None:
+    """Close a cursor off the event loop; a page read still running on a worker holds the cursor until it ends"""
+    start_maintenance_task(db.run_async(cursor.close), f"Closing cursor {cursor.id}")
+
+
+async def open_query_cursor(db, query: str) -> QueryCursor:
+    opening = asyncio.ensure_future(db.run_async(db.open_cursor, query))
+    try:
+        return await asyncio.shield(opening)
+    except asyncio.CancelledError:
+        # open_cursor keeps running on its worker; its cursor must still give the session back
+        opening.add_done_callback(lambda done: done.cancelled() or done.exception() or close_cursor_in_background(db, done.result()))
+        raise
+
+
+async def handle_read_query(arguments, db, write_detector, *_):
+    if write_detector.analyze_query(arguments["query"])["contains_write"]:
+        raise ValueError("Calls to read_query should not contain write operations")
+    page_size = get_page_size(arguments)
+    cache_key = ResultCache.make_key(
+        "read_query", db.connection_config.get("workspace"), db.connection_config.get("schema"), write_detector.normalize_query(arguments["query"]), page_size
+    )
+    output = query_cache.get(cache_key)
+    if output is None:
+        # Rows are streamed from the job and only the first page is read, however large the result
+        cursor = await open_query_cursor(db, arguments["query"])
+        try:
+            output = await fetch_cursor_page(db, cursor, page_size)
+            if "next_cursor" in output and query_cursors.max_cursors > 0:
+                query_cursors.add(cursor)
+            elif "next_cursor" in output:
+                # No session can be spared for a cursor, so the remaining rows are dropped
+                cursor.close()
+                del output["next_cursor"]
+                output["note"] = "More rows follow, but the session pool is too small to keep a cursor; narrow the query or raise max_rows"
+        except BaseException:
+            # Failed or cancelled before the registry owns the cursor, which would keep its session forever
+            close_cursor_in_background(db, cursor)
+            raise
+        if cursor.exhausted and not UNCACHEABLE_QUERY_PATTERN.search(arguments["query"]):
+            # Only complete results are cached; a cursor can be read once
+            tables = write_detector.extract_tables(arguments["query"])
+            if write_detector.is_metadata_query(arguments["query"]):
+                tables.add(CATALOG_CACHE_TAG)
+            query_cache.put(cache_key, output, tables)
+    return query_output(output)
+
+
+async def handle_fetch_page(arguments, db, *_):
+    if not arguments or "cursor" not in arguments:
+        raise ValueError("Missing cursor argument")
+    cursor = query_cursors.get(arguments["cursor"])
+    try:
+        output = await fetch_cursor_page(db, cursor, get_page_size(arguments))
+    except BaseException:
+        query_cursors.discard(cursor.id, close=False)
+        close_cursor_in_background(db, cursor)
+        raise
+    if "next_cursor" not in output:
+        query_cursors.discard(cursor.id)
+    return query_output(output)
+
+
 async def handle_append_insight(arguments, db, _, __, server):
     if not arguments or "insight" not in arguments:
         raise ValueError("Missing insight argument")
@@ -563,30 +1185,70 @@ async def handle_append_insight(arguments, db, _, __, server):
     return [types.TextContent(type="text", text="Insight added to memo")]
 
 
-async def handle_write_query(arguments, db, _, allow_write, __):
+def invalidate_written_tables(write_detector: SQLWriteDetector, query: str) -> None:
+    """Drop cached results of the tables a statement writes to; everything when they cannot be told"""
+    tables = write_detector.extract_tables(query)
+    if not tables:
+        query_cache.clear()
+    for table in tables:
+        invalidate_cached_results(table)
+
+
+async def handle_write_query(arguments, db, write_detector, allow_write, __):
     # if not allow_write:
     #     raise ValueError("Write operations are not allowed for this data connection")
     if arguments["query"].strip().upper().startswith("SELECT"):
         raise ValueError("SELECT queries are not allowed for write_query")
 
-    results, data_id = db.execute_query(arguments["query"])
+    try:
+        results, data_id = await db.execute_query_async(arguments["query"])
+    finally:
+        # A failed statement may still have written part of its changes
+        invalidate_written_tables(write_detector, arguments["query"])
     return [types.TextContent(type="text", text=str(results))]
 
 
-async def handle_create_table(arguments, db, _, allow_write, __):
+async def handle_create_table(arguments, db, write_detector, allow_write, __):
     # if not allow_write:
     #     raise ValueError("Write operations are not allowed for this data connection")
     if not arguments["query"].strip().upper().startswith("CREATE TABLE"):
         raise ValueError("Only CREATE TABLE statements are allowed")
 
-    results, data_id = db.execute_query(arguments["query"])
+    results, data_id = await db.execute_query_async(arguments["query"])
+    # Cached reads of a table that did not exist yet, or of a replaced one, are stale now
+    invalidate_written_tables(write_detector, arguments["query"])
     return [types.TextContent(type="text", text=f"Table created successfully. data_id = {data_id}")]
 
+async def embed_knowledge_sections() -> None:
+    """Attach section embeddings to knowledge_index once; they come from the disk embedding cache after the first run"""
+    async with knowledge_index_lock:
+        if knowledge_index.has_embeddings:
+            return
+        try:
+            knowledge_index.set_embeddings(await embedding_batcher.embed_many(knowledge_index.texts()))
+            logger.info(f"Embedded {len(knowledge_index.sections)} knowledge sections")
+        except Exception as e:
+            logger.warning(f"Knowledge search falls back to BM25 only, embeddings unavailable: {e}")
+
+
+async def search_knowledges(question: str, limit_n: int = 3) -> list[dict[str, Any]]:
+    """Best-matching KNOWLEDGES sections for a free-text question, by BM25 fused with embedding similarity"""
+    await embed_knowledge_sections()
+    query_vector = await embedding_batcher.embed(question) if knowledge_index.has_embeddings else None
+    return knowledge_index.search(question, query_vector, k=limit_n)
+
+
 async def handle_get_knowledge_about_how_to_something(arguments, db, _, allow_write, __):
     if not arguments or "to_do_something" not in arguments:
         raise ValueError("Missing to_do_something argument to describe your purpose")
 
-    data = KNOWLEDGES[arguments["to_do_something"]]
+    to_do_something = arguments["to_do_something"]
+    if to_do_something in KNOWLEDGES:
+        data = KNOWLEDGES[to_do_something]
+    else:
+        data = await search_knowledges(to_do_something, int(arguments.get("limit_n", 3)))
+        if not data:
+            raise ValueError(f"No knowledge found about {to_do_something}, known topics are: {', '.join(KNOWLEDGES)}")
     data_id = str(uuid.uuid4())
     # 使用 ensure_ascii=False 保证中文不乱码
     text = json.dumps(data, ensure_ascii=False, indent=2)
@@ -617,13 +1279,116 @@ async def handle_create_table_with_prompt(arguments, db, _, allow_write, __):
     query = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns});"
 
     # 执行建表语句
-    results, data_id = db.execute_query(query)
+    results, data_id = await db.execute_query_async(query)
+    invalidate_cached_results(table_name)
 
     # 返回结果
     return [
         types.TextContent(type="text", text=f"Table '{table_name}' created successfully. data_id = {data_id}")
     ]
 
+def build_knowledge_insert_sql(knowledge_table_name: str, rows: list[dict[str, Any]]) -> str:
+    """
+    Build one multi-row INSERT for knowledge rows.
+
+    Each row has text and embedding, and optionally type, filetype, record_id and element_id. Chunks
+    of one document share the document's record_id, and their element_id is "<record_id>#<ordinal>".
+    """
+    values = ",\n".join(
+        f"""(
+        uuid(), {sql_string_literal(row.get("type", "UserInput"))}, {sql_string_literal(row["record_id"]) if "record_id" in row else "uuid()"}, {sql_string_literal(row["element_id"]) if "element_id" in row else "uuid()"}, {sql_string_literal(row.get("filetype", "text"))}, CURRENT_TIMESTAMP, '["zh-cn"]',
+        {sql_string_literal(row["text"])},
+        CAST('{format_vector_literal(row["embedding"])}' AS vector(float,{embedding_dim})), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        )"""
+        for row in rows
+    )
+    return f"""
+        INSERT INTO {knowledge_table_name} (
+        id, type, record_id, element_id, filetype, last_modified, languages, text, embeddings, date_created, date_modified, date_processed
+        ) VALUES {values};
+        """
+
+
+def get_dedup_options(arguments: dict[str, Any]) -> tuple[str, float]:
+    """Dedup mode and similarity threshold from tool arguments, defaulting to CLICKZETTA_DEDUP_THRESHOLD"""
+    mode = arguments.get("dedup_mode", DEFAULT_DEDUP_MODE)
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"dedup_mode must be one of {', '.join(DEDUP_MODES)}")
+    threshold = float(arguments.get("dedup_threshold", os.getenv("CLICKZETTA_DEDUP_THRESHOLD", DEFAULT_DEDUP_THRESHOLD)))
+    if not 0 < threshold <= 1:
+        raise ValueError("dedup_threshold must be in (0, 1]")
+    return mode, threshold
+
+
+async def deduplicate_knowledge_rows(db, knowledge_table_name: str, rows: list[dict[str, Any]], mode: str, threshold: float):
+    """
+    Drop or merge embedded knowledge rows that repeat existing knowledge before they are inserted.
+
+    Chunks repeated within rows are dropped first. Then one statement looks up the nearest existing
+    row of every remaining chunk; chunks at least threshold similar to it are skipped, or with
+    mode "merge" folded into it: the existing row takes the new text and embedding when the new text
+    is longer, and its date_modified is refreshed either way.
+
+    Returns:
+        tuple: The rows still to insert, and a list describing every skipped or merged chunk.
+    """
+    if mode == "off" or not rows:
+        return rows, []
+    duplicates = []
+    unique: dict[str, dict[str, Any]] = {}
+    for row in rows:
+        key = normalize_text(row["text"])
+        if key in unique:
+            duplicates.append({"text": row["text"][:80], "action": "skipped", "duplicate_of": "the same request", "similarity": 1.0})
+        else:
+            unique[key] = row
+    rows = list(unique.values())
+
+    query = build_batch_vector_search_sql(
+        knowledge_table_name, "embeddings", "text", [row["embedding"] for row in rows], embedding_dim, 1,
+        extra_columns={"existing_id": "CAST(id AS STRING)"}, max_distance=1 - threshold,
+    )
+    nearest = {}
+    for match in (await db.execute_query_async(query))[0]:
+        match = {str(k).lower(): v for k, v in match.items()}
+        nearest[int(match["question_id"])] = match
+
+    keep = []
+    for question_id, row in enumerate(rows):
+        match = nearest.get(question_id)
+        if match is None:
+            keep.append(row)
+            continue
+        duplicate = {"text": row["text"][:80], "duplicate_of": match["existing_id"], "similarity": round(1 - float(match["distance"]), 4)}
+        if mode == "merge":
+            assignments = "date_modified = CURRENT_TIMESTAMP"
+            if len(row["text"]) > len(str(match["text"] or "")):
+                assignments = (
+                    f"text = {sql_string_literal(row['text'])}, "
+                    f"embeddings = CAST('{format_vector_literal(row['embedding'])}' AS vector(float,{embedding_dim})), " + assignments
+                )
+                duplicate["action"] = "merged, existing text replaced by the longer new text"
+            else:
+                duplicate["action"] = "merged, existing text kept"
+            await db.execute_query_async(f"UPDATE {knowledge_table_name} SET {assignments} WHERE CAST(id AS STRING) = {sql_string_literal(match['existing_id'])}")
+        else:
+            duplicate["action"] = "skipped"
+        duplicates.append(duplicate)
+    return keep, duplicates
+
+
+async def report_progress(server, progress: float, total: float | None = None, message: str | None = None) -> None:
+    """Send an MCP progress notification if the client asked for progress on the current request"""
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return
+    progress_token = ctx.meta.progressToken if ctx.meta else None
+    if progress_token is None:
+        return
+    await ctx.session.send_progress_notification(progress_token, progress, total, message)
+
+
 async def handle_add_new_clickzetta_product_knowledge_to_embedded_documents(arguments, db, *_):
     if not arguments or "knowledge" not in arguments:
         raise ValueError("Missing knowledge argument")
@@ -632,21 +1397,29 @@ async def handle_add_new_clickzetta_product_knowledge_to_embedded_documents(argu
         knowledge_table_name = table_name
     else:
         knowledge_table_name = arguments["knowledge_table_name"]
-    embedded_kb = get_embedding_hf(knowledge)
-    embedded_kb_list = embedded_kb.tolist()
-    add_kb_sql = f"""
-        INSERT INTO {knowledge_table_name} (
-        id, type, record_id, element_id, filetype, last_modified, languages, text, embeddings, date_created, date_modified, date_processed
-        ) VALUES (
-        uuid(), 'UserInput', uuid(), uuid(), 'text', CURRENT_TIMESTAMP, '["zh-cn"]',
-        '{knowledge}',
-        CAST('{embedded_kb_list}' AS vector(float,{embedding_dim})), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-        );
-        """
-    data, data_id = db.execute_query(add_kb_sql)
+    # Knowledge longer than one chunk is stored as several overlapping chunks of the same record
+    rows = list(iter_chunk_rows(iter_string_chunks(knowledge, **get_chunking_options(arguments)), 0, type="UserInput", filetype="text"))
+    if not rows:
+        raise ValueError("Knowledge must not be empty")
+    dedup_mode, dedup_threshold = get_dedup_options(arguments)
+    embeddings = await embedding_batcher.embed_many([row["text"] for row in rows])
+    for row, embedding in zip(rows, embeddings):
+        row["embedding"] = embedding
+    rows, duplicates = await deduplicate_knowledge_rows(db, knowledge_table_name, rows, dedup_mode, dedup_threshold)
+    data_id = str(uuid.uuid4())
+    if rows:
+        add_kb_sql = build_knowledge_insert_sql(knowledge_table_name, rows)
+        _, data_id = await db.execute_query_async(add_kb_sql)
+    if rows or any(d["action"].startswith("merged") for d in duplicates):
+        invalidate_cached_results(knowledge_table_name)
 
-    # Convert the DataFrame back to a list of dictionaries
-    data = convert_df_to_dict(data)
+    data = [
+        {
+            "Table": knowledge_table_name,
+            "Inserted chunks": len(rows),
+            "Duplicates": duplicates,
+        }
+    ]
 
     output = {
         "type": "data",
@@ -664,18 +1437,209 @@ async def handle_add_new_clickzetta_product_knowledge_to_embedded_documents(argu
     ]
 
 
+def get_chunking_options(arguments: dict[str, Any]) -> dict[str, Any]:
+    """Chunk size and overlap from tool arguments, chunks never exceed embedding_max_tokens"""
+    max_tokens = min(int(arguments.get("chunk_tokens", DEFAULT_CHUNK_TOKENS)), embedding_max_tokens)
+    overlap_tokens = int(arguments.get("chunk_overlap_tokens", DEFAULT_OVERLAP_TOKENS))
+    if max_tokens < 1 or overlap_tokens < 0:
+        raise ValueError("chunk_tokens must be positive and chunk_overlap_tokens must not be negative")
+    return {"max_tokens": max_tokens, "overlap_tokens": overlap_tokens, "count_tokens": get_token_counter(embedding_model_name)}
+
+
+def iter_chunk_rows(chunks, document: int, **row):
+    """
+    Attach a shared parent record_id and the chunk ordinal to every chunk of one document.
+
+    The final chunk is marked with last_chunk, so a streaming caller knows when the document is complete.
+    """
+    record_id = str(uuid.uuid4())
+    previous = None
+    for ordinal, chunk in enumerate(chunks):
+        if previous is not None:
+            yield previous
+        previous = {**row, "text": chunk, "record_id": record_id, "element_id": f"{record_id}#{ordinal}", "document": document, "last_chunk": False}
+    if previous is not None:
+        yield {**previous, "last_chunk": True}
+
+
+def iter_knowledge_rows(knowledges: list[str], files: list[str], chunking: dict[str, Any]):
+    """Yield chunked knowledge rows from literal texts first, then from files, streaming each file"""
+    for document, knowledge in enumerate(knowledges):
+        yield from iter_chunk_rows(iter_string_chunks(knowledge, **chunking), document, type="UserInput", filetype="text")
+    for document, path in enumerate(files, start=len(knowledges)):
+        filetype = os.path.splitext(path)[1].lstrip(".").lower()
+        yield from iter_chunk_rows(iter_file_chunks(path, **chunking), document, type="FileInput", filetype=filetype)
+
+
+async def handle_bulk_add_clickzetta_product_knowledge_to_embedded_documents(arguments, db, _, __, server):
+    if not arguments or not (arguments.get("knowledges") or arguments.get("path")):
+        raise ValueError("Missing knowledges or path argument")
+    knowledge_table_name = arguments.get("knowledge_table_name") or table_name
+    batch_size = int(arguments.get("batch_size", 64))
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+
+    knowledges = [k for k in arguments.get("knowledges", []) if k and k.strip()]
+    files = list_knowledge_files(arguments["path"]) if arguments.get("path") else []
+    total = len(knowledges) + len(files)
+    chunking = get_chunking_options(arguments)
+    dedup_mode, dedup_threshold = get_dedup_options(arguments)
+
+    started = time.time()
+    inserted = 0
+    skipped = 0
+    merged = 0
+    batches = 0
+    documents_done = 0
+    for rows in batched(iter_knowledge_rows(knowledges, files, chunking), batch_size):
+        # Ingested chunks are rarely embedded again, so they stay out of the disk tier of the embedding cache
+        embeddings = await embedding_batcher.embed_many([row["text"] for row in rows], persist=False)
+        for row, embedding in zip(rows, embeddings):
+            row["embedding"] = embedding
+        # A document is done once its last chunk is written; the last one of a batch may continue in the next
+        completed_documents = sum(row["last_chunk"] for row in rows)
+        rows, duplicates = await deduplicate_knowledge_rows(db, knowledge_table_name, rows, dedup_mode, dedup_threshold)
+        skipped += sum(d["action"] == "skipped" for d in duplicates)
+        merged += len(duplicates) - sum(d["action"] == "skipped" for d in duplicates)
+        if rows:
+            await db.execute_query_async(build_knowledge_insert_sql(knowledge_table_name, rows))
+        invalidate_cached_results(knowledge_table_name)
+        inserted += len(rows)
+        documents_done += completed_documents
+        batches += 1
+        logger.info(f"Bulk knowledge ingestion into {knowledge_table_name}: {inserted} chunks, {documents_done}/{total} documents")
+        await report_progress(server, documents_done, total, f"Inserted {inserted} chunks from {documents_done} of {total} documents")
+    await report_progress(server, total, total, f"Inserted {inserted} chunks from {total} documents")
+    # Documents that produced no chunks are done as well
+    documents_done = total
+
+    elapsed = time.time() - started
+    data = [
+        {
+            "Result": "Successfully added knowledge to embedded documents",
+            "Table": knowledge_table_name,
+            "Documents": total,
+            "Chunks": inserted,
+            "Skipped duplicate chunks": skipped,
+            "Merged duplicate chunks": merged,
+            "Batches": batches,
+            "Seconds": round(elapsed, 2),
+            "Documents per minute": round(documents_done / elapsed * 60, 1) if elapsed > 0 else None,
+            "Chunks per minute": round(inserted / elapsed * 60, 1) if elapsed > 0 else None,
+        },
+    ]
+    data_id = str(uuid.uuid4())
+    output = {
+        "type": "data",
+        "data_id": data_id,
+        "data": data,
+    }
+    yaml_output = data_to_yaml(output)
+    json_output = json.dumps(output, ensure_ascii=False)
+    return [
+        types.TextContent(type="text", text=yaml_output),
+        types.EmbeddedResource(
+            type="resource",
+            resource=types.TextResourceContents(uri=f"data://{data_id}", text=json_output, mimeType="application/json"),
+        ),
+    ]
+
+
+async def handle_collapse_duplicate_knowledge(arguments, db, *_):
+    arguments = arguments or {}
+    knowledge_table_name = arguments.get("knowledge_table_name") or table_name
+    _, threshold = get_dedup_options(arguments)
+    max_pairs = int(arguments.get("max_pairs", DEFAULT_MAX_DUPLICATE_PAIRS))
+    dry_run = bool(arguments.get("dry_run", True))
+
+    pairs, _ = await db.execute_query_async(build_near_duplicate_pairs_sql(knowledge_table_name, threshold, arguments.get("scope"), max_pairs))
+    clusters = group_near_duplicates(pairs)
+    remove = [row_id for cluster in clusters for row_id in cluster["remove"]]
+    if remove and not dry_run:
+        for ids in batched(remove, 500):
+            await db.execute_query_async(f"DELETE FROM {knowledge_table_name} WHERE CAST(id AS STRING) IN ({', '.join(sql_string_literal(i) for i in ids)})")
+        invalidate_cached_results(knowledge_table_name)
+        # Local mirrors only drop deleted rows when they are rebuilt
+        for index in local_vector_indexes:
+            if table_tag(index.table_name) == table_tag(knowledge_table_name):
+                start_maintenance_task(rebuild_local_vector_index(db, index), f"Rebuilding the local vector index of {index.table_name}")
+        logger.info(f"Collapsed {len(clusters)} near-duplicate groups in {knowledge_table_name}, removed {len(remove)} rows")
+
+    data = [
+        {
+            "Table": knowledge_table_name,
+            "Dry run": dry_run,
+            "Similarity threshold": threshold,
+            "Near-duplicate pairs": len(pairs),
+            # More pairs may exist when the pair limit was reached; run the tool again after collapsing
+            "Pair limit reached": len(pairs) >= max_pairs,
+            "Groups": len(clusters),
+            "Rows to remove" if dry_run else "Rows removed": len(remove),
+            "Groups detail": clusters,
+        }
+    ]
+    return data_output(data, str(uuid.uuid4()))
+
+
+async def handle_backfill_embeddings(arguments, db, *_):
+    arguments = arguments or {}
+    action = arguments.get("action", "status")
+    if action not in BACKFILL_ACTIONS:
+        raise ValueError(f"action must be one of {', '.join(BACKFILL_ACTIONS)}")
+    knowledge_table_name = arguments.get("knowledge_table_name") or table_name
+    embedding_column_name = arguments.get("embedding_column_name", "embeddings")
+    job_id = arguments.get("job_id") or default_backfill_job_id(knowledge_table_name, embedding_column_name)
+
+    if action == "start":
+        job = backfill_jobs.get(job_id)
+        if job is not None and job.running:
+            raise ValueError(f"Backfill {job_id} is already running")
+        job = BackfillJob(
+            job_id,
+            knowledge_table_name,
+            embedding_model_name,
+            embedding_dim,
+            embedding_column_name=embedding_column_name,
+            content_column_name=arguments.get("content_column_name", "text"),
+            mode=arguments.get("mode", "missing"),
+            scope=arguments.get("scope"),
+            page_size=int(arguments.get("page_size", DEFAULT_BACKFILL_PAGE_SIZE)),
+            batch_size=int(arguments.get("batch_size", DEFAULT_BACKFILL_BATCH_SIZE)),
+        )
+        resumed = False if arguments.get("restart") else job.load_checkpoint()
+        backfill_jobs[job_id] = job
+        job.start(
+            db.fetch_rows_async,
+            lambda texts: embedding_batcher.embed_many(texts, persist=False),
+            on_page=lambda: invalidate_cached_results(knowledge_table_name),
+        )
+        logger.info(f"Backfill {job_id} started on {knowledge_table_name}.{embedding_column_name}{' from checkpoint ' + str(job.after_id) if resumed else ''}")
+        data = [{**job.stats(), "resumed": resumed}]
+    elif action == "cancel":
+        job = backfill_jobs.get(job_id)
+        if job is None or not job.cancel():
+            raise ValueError(f"Backfill {job_id} is not running")
+        data = [job.stats()]
+    else:
+        if "job_id" in arguments or "knowledge_table_name" in arguments:
+            jobs = [backfill_jobs[job_id]] if job_id in backfill_jobs else []
+        else:
+            jobs = list(backfill_jobs.values())
+        data = [job.stats() for job in jobs]
+    return data_output(data, str(uuid.uuid4()))
+
 
 async def prefetch_tables(db: ClickzettaDB, credentials: dict) -> dict:
     """Prefetch table and column information"""
     try:
         logger.info("Prefetching table descriptions")
-        table_results, data_id = db.execute_query(
+        table_results, data_id = await db.execute_query_async(
             f"""SELECT table_name, comment 
                 FROM {credentials['workspace']}.information_schema.tables 
                 WHERE table_schema = '{credentials['schema'].upper()}'"""
         )
 
-        column_results, data_id = db.execute_query(
+        column_results, data_id = await db.execute_query_async(
             f"""SELECT table_name, column_name, data_type, comment 
                 FROM {credentials['workspace']}.information_schema.columns 
                 WHERE table_schema = '{credentials['schema'].upper()}'"""
@@ -697,6 +1661,69 @@ async def prefetch_tables(db: ClickzettaDB, credentials: dict) -> dict:
         return f"Error prefetching table descriptions: {e}"
 
 
+def collect_server_metrics(db: ClickzettaDB | None = None) -> dict[str, Any]:
+    """Gather runtime counters exposed through the metrics://server resource"""
+    return {
+        "queries": db.query_stats() if db is not None else None,
+        "embedding_models": model_registry.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "embedding_batches": embedding_batcher.stats(),
+        "local_vector_indexes": [index.stats() for index in local_vector_indexes],
+        "retrieval_cache": retrieval_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "query_cache": query_cache.stats(),
+        "query_cursors": query_cursors.stats(),
+        "vector_indexes": vector_index_detector.stats(),
+        "reranker": get_reranker().stats(),
+        "backfill_jobs": [job.stats() for job in backfill_jobs.values()],
+    }
+
+
+async def refresh_warehouse_sessions(db: ClickzettaDB, interval: int):
+    """Renew pooled sessions ahead of their expiry, so no tool call reconnects inline"""
+    loop = asyncio.get_running_loop()
+    margin = float(os.getenv("CLICKZETTA_SESSION_REFRESH_MARGIN", DEFAULT_REFRESH_MARGIN))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # The default executor, so waiting between retries never holds a query worker
+            await loop.run_in_executor(None, db.pool.refresh_expiring, margin)
+            # Abandoned cursors hold pooled sessions until they expire
+            await loop.run_in_executor(None, query_cursors.expire)
+        except Exception as e:
+            logger.error(f"Error renewing warehouse sessions: {e}")
+
+
+async def refresh_local_vector_indexes(db: ClickzettaDB, interval: int):
+    """
+    Keep the local vector index mirrors in sync, pulling only rows modified since the last refresh.
+
+    Mirrors are refreshed every interval seconds, and right away when a write marks one stale. A
+    refresh runs on the query pool, so its queries count against the same worker and session limits.
+    """
+    while True:
+        local_vector_index_wakeup.clear()
+        for index in local_vector_indexes:
+            try:
+                if await db.run_async(index.refresh, lambda query: db.execute_query(query)[0]):
+                    invalidate_cached_results(index.table_name, mirrors=False)
+            except Exception as e:
+                logger.error(f"Error refreshing local vector index for {index.table_name}: {e}")
+        try:
+            await asyncio.wait_for(local_vector_index_wakeup.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def unload_idle_embedding_models(idle_timeout: int):
+    """Periodically release embedding models that have not been used for idle_timeout seconds"""
+    while True:
+        await asyncio.sleep(max(idle_timeout / 4, 1))
+        unloaded = model_registry.unload_idle(idle_timeout) + reranker_registry.unload_idle(idle_timeout)
+        if unloaded:
+            logger.info(f"Unloaded idle embedding models: {unloaded}")
+
+
 async def main(
     allow_write: bool = False,
     connection_args: dict = None,
@@ -704,6 +1731,15 @@ async def main(
     prefetch: bool = False,
     log_level: str = "INFO",
     exclude_tools: list[str] = [],
+    preload_embedding_model: bool = False,
+    embedding_idle_timeout: int = 0,
+    embedding_batch_size: int = 32,
+    embedding_batch_wait_ms: float = 5,
+    embedding_executor: str = "thread",
+    embedding_workers: int = 1,
+    embedding_backend: str | None = None,
+    local_vector_index: bool = False,
+    local_vector_index_refresh: int = 300,
 ):
     # Setup logging
     if log_dir:
@@ -716,9 +1752,42 @@ async def main(
     logger.info("Allow write operations: %s", allow_write)
     logger.info("Prefetch table descriptions: %s", prefetch)
     logger.info("Excluded tools: %s", exclude_tools)
+    logger.info("Preload embedding model: %s", preload_embedding_model)
+
+    embedding_batcher.max_batch_size = embedding_batch_size
+    embedding_batcher.max_wait_ms = embedding_batch_wait_ms
+    if embedding_backend:
+        model_registry.default_backend = embedding_backend
+    logger.info("Embedding backend: %s", model_registry.default_backend)
+    embedding_batcher.executor = create_embedding_executor(embedding_executor, embedding_workers, embedding_model_name)
+    logger.info("Embedding executor: %s with %s workers", embedding_executor, embedding_workers)
 
     db = ClickzettaDB(connection_args)
+    db.executor.submit(db.prefill_sessions)
+    # Open cursors hold sessions; at least one stays free for queries that do not page
+    if query_cursors.max_cursors > db.pool.max_size - 1:
+        logger.warning(f"CLICKZETTA_MAX_CURSORS lowered from {query_cursors.max_cursors} to {db.pool.max_size - 1} to fit the session pool")
+        query_cursors.max_cursors = max(db.pool.max_size - 1, 0)
+    logger.info("Query workers: %s, warehouse sessions: %s to %s", db.query_workers, db.pool.min_size, db.pool.max_size)
     server = Server("clickzetta-manager")
+
+    if local_vector_index and table_name and embedding_column_name and content_column_name:
+        select_columns = {"doc_link": DOC_LINK_SQL}
+        for column in (other_columns_name or "").split(","):
+            if column.strip():
+                select_columns[column.strip()] = column.strip()
+        local_vector_indexes.append(
+            LocalVectorIndex(
+                table_name,
+                embedding_column_name,
+                content_column_name,
+                embedding_dim,
+                select_columns=select_columns,
+                partition_scope=os.getenv("Similar_partition_scope"),
+                directory=os.getenv("CLICKZETTA_VECTOR_INDEX_DIR", DEFAULT_INDEX_DIR),
+            )
+        )
+        logger.info("Local vector index enabled for %s, refreshed every %s seconds", table_name, local_vector_index_refresh)
     write_detector = SQLWriteDetector()
 
     tables_info = (await prefetch_tables(db, connection_args)) if prefetch else {}
@@ -829,12 +1898,35 @@ async def main(
             description="Perform vector search/knowledge retrieve/document retrieve on a table using a question and return the vector_search_limit_n closest answers",
             input_schema={
                 "type": "object",
-                "properties": {"table_name": {"type": "string", "description": "table name"},"content_column_name": {"type": "string", "description": "column which stored content"},"embedding_column_name": {"type": "string", "description": "column which stored embedding"},"handle_vector_search":{"type": "string", "description": "other columes tobe selected, format is column1, columns2,columns2"},"partition_scope": {"type": "string", "description": "sql code to define the partiion scope as part of where condition"},"vector_search_limit_n":{"type": "string", "description": "limit the return results,default is 1"} },
+                "properties": {"table_name": {"type": "string", "description": "table name"},"content_column_name": {"type": "string", "description": "column which stored content"},"embedding_column_name": {"type": "string", "description": "column which stored embedding"},"handle_vector_search":{"type": "string", "description": "other columes tobe selected, format is column1, columns2,columns2"},"partition_scope": {"type": "string", "description": "sql code to define the partiion scope as part of where condition"},"vector_search_limit_n":{"type": "string", "description": "limit the return results,default is 1"},
+                               "rerank": {"type": "boolean", "description": "re-rank rerank_candidates_n vector search candidates with a local cross-encoder and return the best vector_search_limit_n, default is false"},
+                               "rerank_candidates_n": {"type": "integer", "description": f"candidates fetched for re-ranking, default is {DEFAULT_RERANK_CANDIDATES}"},
+                               "rerank_budget_ms": {"type": "number", "description": f"re-ranking is skipped when it is expected to take longer, default is {DEFAULT_RERANK_BUDGET_MS}"} },
                 "required": ["question"],
             },
             handler=handle_vector_search,
             tags=["query"],
         ),
+        Tool(
+            name="batch_vector_search",
+            description=("Perform vector search for several questions at once and return the vector_search_limit_n closest answers of each question. "
+                         "All questions are embedded together and searched with a single SQL statement, so use this instead of calling vector_search once per sub-question."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "questions": {"type": "array", "items": {"type": "string"}, "description": "questions to search"},
+                    "table_name": {"type": "string", "description": "table name"},
+                    "content_column_name": {"type": "string", "description": "column which stored content"},
+                    "embedding_column_name": {"type": "string", "description": "column which stored embedding"},
+                    "other_columns_name": {"type": "string", "description": "other columes tobe selected, format is column1, columns2,columns2"},
+                    "partition_scope": {"type": "string", "description": "sql code to define the partiion scope as part of where condition"},
+                    "vector_search_limit_n": {"type": "integer", "description": "results per question, default is 1"},
+                },
+                "required": ["questions"],
+            },
+            handler=handle_batch_vector_search,
+            tags=["query"],
+        ),
         Tool(
             name="match_all",
             description="Perform search via match all function on a table using a question and return the top 5 answers",
@@ -846,18 +1938,105 @@ async def main(
             handler=handle_match_all,
             tags=["query"],
         ),
+        Tool(
+            name="hybrid_search",
+            description=("Perform vector search and match all search on a table in one query and merge both rankings with reciprocal-rank fusion. "
+                         "Returns the limit_n best deduplicated passages with doc_link and the rank each search gave them. Prefer this tool over calling vector_search and match_all separately."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string", "description": "question to search"},
+                    "table_name": {"type": "string", "description": "table name"},
+                    "content_column_name": {"type": "string", "description": "column which stored content"},
+                    "embedding_column_name": {"type": "string", "description": "column which stored embedding"},
+                    "other_columns_name": {"type": "string", "description": "other columes tobe selected, format is column1, columns2,columns2"},
+                    "partition_scope": {"type": "string", "description": "sql code to define the partiion scope as part of where condition"},
+                    "limit_n": {"type": "integer", "description": "limit the return results, default is 5"},
+                    "candidate_n": {"type": "integer", "description": "candidates taken from each search before fusion, default is 20"},
+                    "rrf_k": {"type": "integer", "description": f"reciprocal-rank fusion constant, default is {DEFAULT_RRF_K}"},
+                },
+                "required": ["question"],
+            },
+            handler=handle_hybrid_search,
+            tags=["query"],
+        ),
+        Tool(
+            name="manage_vector_index",
+            description=("Create, build, show, describe or drop the vector index on an embedding column, following how_to_create_and_build_index. "
+                         "create adds an HNSW index with cosine_distance (matching vector_search) and builds it on existing data unless build is false; "
+                         "build indexes existing rows, one partition_scopes entry at a time for large partitioned tables; "
+                         "show lists the indexes of the table; describe runs desc_object on the index; drop removes it. "
+                         "Defaults to Similar_table_name and Similar_embedding_column_name."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "action": {"type": "string", "enum": ["create", "build", "show", "describe", "drop"], "description": "what to do"},
+                    "table_name": {"type": "string", "description": "table with the embedding column"},
+                    "column_name": {"type": "string", "description": "VECTOR column to index"},
+                    "index_name": {"type": "string", "description": "index name, by default the existing vector index or <table>_<column>_vector_idx"},
+                    "properties": {
+                        "type": "object",
+                        "description": "vector index PROPERTIES such as distance.function, scalar.type, m, ef.construction, compress.codec",
+                        "additionalProperties": {"type": "string"},
+                    },
+                    "build": {"type": "boolean", "description": "build the index on existing data after create, default is true"},
+                    "partition_scopes": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "partition conditions built one after another, such as [\"pt = '2024-01-01'\", \"pt = '2024-01-02'\"]"
+                    },
+                },
+                "required": ["action"],
+            },
+            handler=handle_manage_vector_index,
+            tags=["write"],
+        ),
+        Tool(
+            name="check_vector_retrieval_paths",
+            description=("Check whether vector search on knowledge tables uses a vector index or scans every row. "
+                         "For each VECTOR column found with desc_object, reports the row count, the vector index, how recent vector_search calls read the table, "
+                         "and flags brute-force scans with the statements that would index the column."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "table_names": {"type": "array", "items": {"type": "string"}, "description": "tables to check, default is Similar_table_name and the local vector index tables"},
+                    "brute_force_rows": {"type": "integer", "description": "tables without an index are flagged from this many rows, default is 10000"},
+                },
+            },
+            handler=handle_check_vector_retrieval_paths,
+            tags=["query"],
+        ),
         Tool(
             name="read_query",
             description="Execute a SELECT query. Date and time functions that are compatible with Spark SQL.",
             input_schema={
                 "type": "object",
-                "properties": {"query": {"type": "string", "description": "SELECT SQL query to execute"}},
+                "properties": {
+                    "query": {"type": "string", "description": "SELECT SQL query to execute"},
+                    "max_rows": {"type": "integer", "description": f"rows returned at most, default is {DEFAULT_PAGE_SIZE}; larger results return next_cursor for fetch_page"},
+                },
                 "required": ["query"],
             },
             handler=handle_read_query,
             tags=["query"],
             samples=samples_sql.get("read_query", []),  # 从 samples 加载样例 SQL
         ),
+        Tool(
+            name="fetch_page",
+            description=("Fetch the next rows of a read_query result that was larger than one page. "
+                         "Rows are streamed from the same query job, the query is not run again. "
+                         "Cursors expire after some minutes without use."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "cursor": {"type": "string", "description": "next_cursor returned by read_query or the previous fetch_page"},
+                    "page_size": {"type": "integer", "description": f"rows to fetch, default is {DEFAULT_PAGE_SIZE}"},
+                },
+                "required": ["cursor"],
+            },
+            handler=handle_fetch_page,
+            tags=["query"],
+        ),
         Tool(
             name="append_insight",
             description="Add a data insight to the memo",
@@ -936,7 +2115,12 @@ async def main(
                         "how_to_create_storage_connection, how_to_create_external_volume, how_to_alter_vcluster,"
                         "partition_table_guide,cluster_table_guide,how_to_do_attribution_analysis,"
                         "how_to_do_forecasting_analysis, how_to_get_and_set_context_info,"
-                        "how_to_analyze_system_issues_and_data_governance_with_information_schema,etc.")
+                        "how_to_analyze_system_issues_and_data_governance_with_information_schema,etc. "
+                        "Any other text is treated as a free-text question and the best-matching knowledge sections are returned.")
+                    },
+                    "limit_n": {
+                        "type": "integer",
+                        "description": "number of knowledge sections to return for a free-text question, default is 3"
                     },
                 },
             },
@@ -960,7 +2144,10 @@ async def main(
                     },
                     "vector_search_limit_n":{
                         "type": "string", 
-                        "description": "limit the return results,default value is 1"}
+                        "description": "limit the return results,default value is 1"},
+                    "rerank": {
+                        "type": "boolean",
+                        "description": f"fetch {DEFAULT_RERANK_CANDIDATES} candidates and return the vector_search_limit_n most relevant ones by a cross-encoder, default is false"}
                 },
             },
             handler=handle_vector_search,
@@ -968,7 +2155,7 @@ async def main(
         ),
         Tool(
             name="add_new_clickzetta_product_knowledge_to_embedded_documents",
-            description=(f"Add new knowledge to embeded documents(store as table format). The string length of knowledge should be less than {embedding_max_tokens} characters."
+            description=(f"Add new knowledge to embeded documents(store as table format). Knowledge longer than {DEFAULT_CHUNK_TOKENS} tokens is split into overlapping chunks that share one record_id."
                          "While you learned new knowledge about clickzetta/云器/Singdata, especially knowledge for solving specific problems or private knowledge, please ask user if use this tool to add new knowledge to embedded documents."),
             input_schema={
                 "type": "object",
@@ -981,10 +2168,110 @@ async def main(
                         "type": "string",
                         "description": "new knowledge to add, such as:'Yunqi是云器的汉语拼音名称,云器/Singdata/ClickZetta在技术上是等同的名称','云器Lakehouse的SQl是和Spark SQl、Snowflake高度兼容，云器的Zettapark是和pySpark、Snowflake的Snowpark是高度兼容的，但不是100%兼容'"
                     },
+                    "dedup_mode": {
+                        "type": "string",
+                        "enum": DEDUP_MODES,
+                        "description": "what to do with chunks nearly identical to existing knowledge: skip them (default), merge them into the existing row, or off to insert everything"
+                    },
+                    "dedup_threshold": {
+                        "type": "number",
+                        "description": f"cosine similarity from which a chunk is a duplicate, default is {DEFAULT_DEDUP_THRESHOLD}"
+                    },
                 },
             },
             handler=handle_add_new_clickzetta_product_knowledge_to_embedded_documents,
             tags=["write"],
+        ),
+        Tool(
+            name="bulk_add_clickzetta_product_knowledge_to_embedded_documents",
+            description=("Bulk add many knowledge documents to embedded documents(store as table format). "
+                         "Accepts a list of knowledge texts and/or a local file or directory (.md, .markdown, .txt files are loaded recursively, one document per file). "
+                         "Documents are streamed into token-aware overlapping chunks; each chunk row stores its document in record_id and '<record_id>#<ordinal>' in element_id. "
+                         "Chunks are embedded in batches and written with multi-row inserts; progress is reported while loading."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "knowledge_table_name": {
+                        "type": "string",
+                        "description": "new knowledge to be stored in which table, default is {table_name}"
+                    },
+                    "knowledges": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "list of knowledge texts to add"
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "local file or directory with knowledge documents"
+                    },
+                    "batch_size": {
+                        "type": "integer",
+                        "description": "chunks embedded and inserted per batch, default is 64"
+                    },
+                    "chunk_tokens": {
+                        "type": "integer",
+                        "description": f"maximum tokens per chunk, default is {DEFAULT_CHUNK_TOKENS}, at most {embedding_max_tokens}"
+                    },
+                    "chunk_overlap_tokens": {
+                        "type": "integer",
+                        "description": f"tokens shared by consecutive chunks, default is {DEFAULT_OVERLAP_TOKENS}"
+                    },
+                    "dedup_mode": {
+                        "type": "string",
+                        "enum": DEDUP_MODES,
+                        "description": "what to do with chunks nearly identical to existing knowledge: skip them (default), merge them into the existing row, or off to insert everything"
+                    },
+                    "dedup_threshold": {
+                        "type": "number",
+                        "description": f"cosine similarity from which a chunk is a duplicate, default is {DEFAULT_DEDUP_THRESHOLD}"
+                    },
+                },
+            },
+            handler=handle_bulk_add_clickzetta_product_knowledge_to_embedded_documents,
+            tags=["write"],
+        ),
+        Tool(
+            name="collapse_duplicate_knowledge",
+            description=("Find near-duplicate rows in a knowledge table and collapse each group to one row. "
+                         "Rows whose embeddings reach dedup_threshold cosine similarity, directly or through other duplicates, form a group; "
+                         "the longest text (then the oldest row) is kept and the others are deleted. "
+                         "Runs as a dry run that only reports the groups unless dry_run is false."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "knowledge_table_name": {"type": "string", "description": "knowledge table, default is {table_name}"},
+                    "dedup_threshold": {"type": "number", "description": f"cosine similarity from which rows are duplicates, default is {DEFAULT_DEDUP_THRESHOLD}"},
+                    "scope": {"type": "string", "description": "optional sql condition limiting the rows compared, such as a partition filter"},
+                    "max_pairs": {"type": "integer", "description": f"maximum duplicate pairs handled per run, default is {DEFAULT_MAX_DUPLICATE_PAIRS}"},
+                    "dry_run": {"type": "boolean", "description": "only report what would be removed, default is true"},
+                },
+            },
+            handler=handle_collapse_duplicate_knowledge,
+            tags=["write"],
+        ),
+        Tool(
+            name="backfill_embeddings",
+            description=("Compute embeddings for the rows of a knowledge table in the background, e.g. rows loaded without vectors "
+                         "or all rows after the embedding model changed. Rows are embedded page by page and written back with MERGE; "
+                         "progress is checkpointed, so starting the same backfill again resumes where it stopped. "
+                         "Use action status to follow a backfill and cancel to stop it."),
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "action": {"type": "string", "enum": BACKFILL_ACTIONS, "description": "start, status (default) or cancel"},
+                    "knowledge_table_name": {"type": "string", "description": "knowledge table, default is {table_name}"},
+                    "embedding_column_name": {"type": "string", "description": "VECTOR column to fill, default is embeddings"},
+                    "content_column_name": {"type": "string", "description": "column with the text to embed, default is text"},
+                    "mode": {"type": "string", "enum": BACKFILL_MODES, "description": "missing (default) embeds rows without a vector, all re-embeds every row processed before the backfill started"},
+                    "scope": {"type": "string", "description": "optional sql condition limiting the rows, such as a partition filter"},
+                    "page_size": {"type": "integer", "description": f"rows read and merged per page, default is {DEFAULT_BACKFILL_PAGE_SIZE}"},
+                    "batch_size": {"type": "integer", "description": f"texts embedded per batch, default is {DEFAULT_BACKFILL_BATCH_SIZE}"},
+                    "restart": {"type": "boolean", "description": "ignore the saved checkpoint and start from the first row"},
+                    "job_id": {"type": "string", "description": "backfill to report or cancel, default is derived from table and column"},
+                },
+            },
+            handler=handle_backfill_embeddings,
+            tags=["write"],
         )
     ]
     server.prompts = {
@@ -1013,7 +2300,13 @@ async def main(
                 name="Data Insights Memo",
                 description="A living document of discovered data insights",
                 mimeType="text/plain",
-            )
+            ),
+            types.Resource(
+                uri=AnyUrl("metrics://server"),
+                name="Server Metrics",
+                description="Embedding model and cache counters of this MCP server",
+                mimeType="text/plain",
+            ),
         ]
         table_brief_resources = [
             types.Resource(
@@ -1031,6 +2324,8 @@ async def main(
     async def handle_read_resource(uri: AnyUrl) -> str:
         if str(uri) == "memo://insights":
             return db.get_memo()
+        elif str(uri) == "metrics://server":
+            return data_to_yaml(collect_server_metrics(db))
         elif str(uri).startswith("context://table"):
             table_name = str(uri).split("/")[-1]
             if table_name in tables_info:
@@ -1148,6 +2443,19 @@ async def main(
         ]
         return tools
 
+    # Warm up the embedding model in the background so the stdio handshake is not delayed
+    background_tasks = []
+    if preload_embedding_model:
+        background_tasks += warmup_embedding_executor(embedding_batcher.executor, embedding_workers, embedding_model_name)
+        background_tasks.append(asyncio.create_task(embed_knowledge_sections()))
+    if local_vector_indexes:
+        background_tasks.append(asyncio.create_task(refresh_local_vector_indexes(db, local_vector_index_refresh)))
+    session_refresh_interval = int(os.getenv("CLICKZETTA_SESSION_REFRESH_INTERVAL", 60))
+    if session_refresh_interval > 0:
+        background_tasks.append(asyncio.create_task(refresh_warehouse_sessions(db, session_refresh_interval)))
+    if embedding_idle_timeout > 0:
+        background_tasks.append(asyncio.create_task(unload_idle_embedding_models(embedding_idle_timeout)))
+
     # Start server
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
         logger.info("Server running with stdio transport")
@@ -0,0 +1,319 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+DEFAULT_MIN_SESSIONS = 1
+DEFAULT_MAX_SESSIONS = 8
+DEFAULT_CHECKOUT_TIMEOUT = 60
+# Sessions idle for longer than this are checked with SELECT 1 before they are handed out
+DEFAULT_HEALTH_CHECK_INTERVAL = 60
+# Matches the authentication lifetime ClickzettaDB used to renew its single session after
+DEFAULT_MAX_SESSION_AGE = 1800
+# The background refresher replaces sessions this long before they reach max_age
+DEFAULT_REFRESH_MARGIN = 300
+DEFAULT_RETRY_ATTEMPTS = 4
+DEFAULT_RETRY_BASE_DELAY = 1.0
+DEFAULT_RETRY_MAX_DELAY = 30.0
+
+
+def retry_with_backoff(
+    func: Callable[[], Any],
+    attempts: int = DEFAULT_RETRY_ATTEMPTS,
+    base_delay: float = DEFAULT_RETRY_BASE_DELAY,
+    max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Any:
+    """
+    Call func until it succeeds, waiting base_delay, 2 * base_delay, ... (at most max_delay) between attempts.
+
+    Raises:
+        Exception: The error of the last attempt.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(base_delay * 2**attempt, max_delay)
+            logger.warning(f"Attempt {attempt + 1} of {attempts} failed, retrying in {delay:.1f} seconds: {e}")
+            sleep(delay)
+
+
+class PooledSession:
+    """A session with the bookkeeping the pool needs to decide whether it may be reused"""
+
+    def __init__(self, session: Any):
+        self.session = session
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.needs_check = False
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.item: PooledSession | None = None
+        # Set instead of item when a slot freed up and the waiter may open a session itself
+        self.may_create = False
+
+
+class SessionPool:
+    """
+    Bounded pool of warehouse sessions shared by the query worker threads.
+
+    At most max_size sessions exist; min_size are opened up front. Checkouts are first come, first
+    served: a returned session, or a slot freed by a discarded one, is handed to the longest waiting
+    caller, and a caller that waits longer than checkout_timeout gets a TimeoutError.
+
+    A session idle for health_check_interval seconds, or returned after a failed query, is checked
+    with SELECT 1 before reuse and replaced if the check fails; sessions older than max_age are
+    replaced before their authentication expires.
+    """
+
+    def __init__(
+        self,
+        create_session: Callable[[], Any],
+        min_size: int = DEFAULT_MIN_SESSIONS,
+        max_size: int = DEFAULT_MAX_SESSIONS,
+        checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        max_age: float = DEFAULT_MAX_SESSION_AGE,
+        close_session: Callable[[Any], None] | None = None,
+    ):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError(f"Invalid session pool size min={min_size} max={max_size}")
+        self.create_session = create_session
+        self.close_session = close_session or _close_session
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.max_age = max_age
+        self._idle: deque[PooledSession] = deque()
+        self._sessions: set[PooledSession] = set()
+        self._waiters: deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+        self._size = 0
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.failed_health_checks = 0
+        self.refreshed = 0
+        self.refresh_failures = 0
+        self._wait_seconds = 0.0
+
+    def prefill(self) -> None:
+        """Open sessions until min_size exist"""
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                item = self._open()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+            self.release(item)
+
+    def _open(self) -> PooledSession:
+        item = PooledSession(self.create_session())
+        with self._lock:
+            self.created += 1
+            self._sessions.add(item)
+        return item
+
+    def _discard(self, item: PooledSession) -> None:
+        try:
+            self.close_session(item.session)
+        except Exception as e:
+            logger.debug(f"Error closing session: {e}")
+        with self._lock:
+            self.discarded += 1
+            self._sessions.discard(item)
+
+    def _healthy(self, item: PooledSession) -> bool:
+        if time.time() - item.created_at > self.max_age:
+            return False
+        if not item.needs_check and time.monotonic() - item.last_used < self.health_check_interval:
+            return True
+        try:
+            item.session.sql("SELECT 1").collect()
+            item.needs_check = False
+            return True
+        except Exception as e:
+            logger.warning(f"Session failed its health check and is replaced: {e}")
+            with self._lock:
+                self.failed_health_checks += 1
+            return False
+
+    def acquire(self, timeout: float | None = None) -> PooledSession:
+        """
+        Check out a healthy session, opening one while the pool is below max_size.
+
+        Raises:
+            TimeoutError: If no session became available within timeout (default checkout_timeout).
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        item = None
+        waiter = None
+        with self._lock:
+            if self._idle and not self._waiters:
+                item = self._idle.popleft()
+            elif self._size < self.max_size and not self._waiters:
+                self._size += 1
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+        if waiter is not None:
+            remaining = timeout - (time.monotonic() - started)
+            if not waiter.event.wait(max(remaining, 0)):
+                with self._lock:
+                    if not waiter.event.is_set():
+                        self._waiters.remove(waiter)
+                        self.timeouts += 1
+                        raise TimeoutError(f"No warehouse session available within {timeout} seconds ({self.max_size} in use)")
+            # Either a returned session or, when waiter.may_create, a free slot to open one in
+            item = waiter.item
+        if item is None:
+            try:
+                item = self._open()
+            except Exception:
+                self._free_slot()
+                raise
+        elif not self._healthy(item):
+            self._discard(item)
+            try:
+                item = self._open()
+            except Exception:
+                self._free_slot()
+                raise
+        with self._lock:
+            self.checkouts += 1
+            self._wait_seconds += time.monotonic() - started
+        return item
+
+    def release(self, item: PooledSession, failed: bool = False) -> None:
+        """Return a session; after a failed query it is health checked before its next use"""
+        item.last_used = time.monotonic()
+        item.needs_check = item.needs_check or failed
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.item = item
+                waiter.event.set()
+            else:
+                self._idle.append(item)
+
+    def _free_slot(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # The slot passes to the longest waiting caller, which opens its own session
+                waiter = self._waiters.popleft()
+                waiter.may_create = True
+                waiter.event.set()
+            else:
+                self._size -= 1
+
+    def invalidate(self, item: PooledSession) -> None:
+        """Close a checked out session that must not be reused"""
+        self._discard(item)
+        self._free_slot()
+
+    @contextmanager
+    def session(self, timeout: float | None = None) -> Iterator[Any]:
+        """Check out a session for the duration of the with block"""
+        item = self.acquire(timeout)
+        failed = False
+        try:
+            yield item.session
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(item, failed)
+
+    def refresh_expiring(self, margin: float = DEFAULT_REFRESH_MARGIN, **retry: Any) -> int:
+        """
+        Replace idle sessions that expire within margin seconds, so no checkout has to reconnect.
+
+        The replacement is opened first, retried with exponential backoff on failure, and swapped
+        in under the lock only if the old session is still idle; a session that was checked out in
+        the meantime is left to the next refresh. Blocking, run it off the event loop.
+
+        Args:
+            margin (float): Seconds before max_age from which a session is replaced.
+            **retry: attempts, base_delay and max_delay of retry_with_backoff.
+
+        Returns:
+            int: The number of sessions replaced.
+        """
+        deadline = time.time() - (self.max_age - margin)
+        with self._lock:
+            expiring = [item for item in self._idle if item.created_at <= deadline]
+        replaced = 0
+        for old in expiring:
+            try:
+                new = retry_with_backoff(self._open, **retry)
+            except Exception as e:
+                # The old session stays in use until it expires; the next refresh tries again
+                logger.error(f"Could not renew warehouse session: {e}")
+                with self._lock:
+                    self.refresh_failures += 1
+                continue
+            with self._lock:
+                swapped = old in self._idle
+                if swapped:
+                    self._idle[self._idle.index(old)] = new
+                    self.refreshed += 1
+            self._discard(old if swapped else new)
+            replaced += swapped
+        if replaced:
+            logger.info(f"Renewed {replaced} warehouse sessions before they expired")
+        return replaced
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for item in idle:
+            self._discard(item)
+
+    def stats(self) -> dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            ages = [now - item.created_at for item in self._sessions]
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": len(self._waiters),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "created": self.created,
+                "discarded": self.discarded,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "failed_health_checks": self.failed_health_checks,
+                "average_wait_ms": round(self._wait_seconds / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "refreshed": self.refreshed,
+                "refresh_failures": self.refresh_failures,
+                "oldest_session_age_seconds": round(max(ages)) if ages else None,
+                "newest_session_age_seconds": round(min(ages)) if ages else None,
+                "max_session_age_seconds": self.max_age,
+            }
+
+
+def _close_session(session: Any) -> None:
+    close = getattr(session, "close", None)
+    if close is not None:
+        close()
@@ -1,16 +1,20 @@
-import pandas as pd
-import requests
+from __future__ import annotations
+
 import zipfile
 import gzip
 from io import StringIO, BytesIO
-from typing import Union
-import clickzetta.zettapark.types as T
+from typing import TYPE_CHECKING, Iterable, Iterator
 
-from sqlalchemy import create_engine, text
+import os
 
-import os,json
+# pandas, requests, sqlalchemy and zettapark are imported by the functions that use them, so that
+# importing this module for the embedding settings does not slow down server startup
+if TYPE_CHECKING:
+    import pandas as pd
+    import clickzetta.zettapark.types as T
 
-from sentence_transformers import SentenceTransformer
+from .embeddings import model_registry
+from .embedding_cache import get_embedding_cache
 
 
 embedding_provider = "huggingface"
@@ -22,11 +26,53 @@ if embedding_dim == 768:
     embedding_model_name = embedding_model_name_768
 elif embedding_dim == 1024:
     embedding_model_name = embedding_model_name_1024
+# Significant digits of each element when an embedding is written into SQL text
+vector_literal_precision = int(os.getenv("CLICKZETTA_VECTOR_LITERAL_PRECISION", 6))
+
+
+def format_vector_literal(vector, precision: int | None = None) -> str:
+    """
+    Format an embedding as compact text for CAST('...' AS VECTOR(...)).
+
+    Elements are written with a fixed number of significant digits and without spaces, which is about
+    a third of the size of str(list) of float32 values while keeping cosine distances accurate to ~1e-6.
+    """
+    precision = precision or vector_literal_precision
+    return "[" + ",".join(f"{float(x):.{precision}g}" for x in vector) + "]"
+
+
+def get_current_embedding_cache():
+    """Embedding cache of the configured model; the ONNX and int8 backends get entries of their own"""
+    return get_embedding_cache(model_registry.model_key(embedding_model_name), embedding_dim)
 
 
 def get_embedding_hf(query):
-    model = SentenceTransformer(embedding_model_name)
-    return model.encode(query, normalize_embeddings=True)
+    cache = get_current_embedding_cache()
+    embedding = cache.get(query)
+    if embedding is not None:
+        return embedding
+    embedding = encode_texts([query])[0]
+    cache.put(query, embedding)
+    return embedding
+
+
+def encode_texts(queries: list[str]) -> list:
+    """Run the embedding model on a batch of texts without consulting the cache"""
+    model = model_registry.get(embedding_model_name)
+    return list(model.encode(queries, normalize_embeddings=True))
+
+
+def get_embeddings_hf(queries: list[str]) -> list:
+    """Embed several texts with one batched model call, skipping texts that are already cached"""
+    cache = get_current_embedding_cache()
+    embeddings = [cache.get(query) for query in queries]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        encoded = encode_texts([queries[i] for i in missing])
+        for i, embedding in zip(missing, encoded):
+            cache.put(queries[i], embedding)
+            embeddings[i] = embedding
+    return embeddings
 
 
 def read_data_from_url_or_file_into_dataframe(source: str, **kwargs) -> pd.DataFrame:
@@ -45,6 +91,9 @@ def read_data_from_url_or_file_into_dataframe(source: str, **kwargs) -> pd.DataF
     Raises:
         ValueError: If the file type is unsupported or the file cannot be read.
     """
+    import pandas as pd
+    import requests
+
     # Determine if the source is a URL or a local file
     is_url = source.startswith("http://") or source.startswith("https://")
 
@@ -147,6 +196,8 @@ def generate_df_schema(df: pd.DataFrame) -> T.StructType:
     Returns:
         T.StructType: The schema definition.
     """
+    import clickzetta.zettapark.types as T
+
     type_mapping = {
         "int64": T.IntegerType(),
         "float64": T.FloatType(),
@@ -192,6 +243,9 @@ def connect_to_database_and_read_data_from_table_into_dataframe(
         ConnectionError: If the connection to the database fails.
         RuntimeError: If the query execution fails.
     """
+    import pandas as pd
+    from sqlalchemy import create_engine
+
     # Supported database types
     supported_db_types = ["mysql", "postgresql", "sqlite", "mssql", "oracle"]
 
@@ -222,4 +276,48 @@ def connect_to_database_and_read_data_from_table_into_dataframe(
             print("Query executed successfully.")
         return df
     except Exception as e:
-        raise RuntimeError(f"Failed to execute query. Error: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Failed to execute query. Error: {e}")
+
+
+def sql_string_literal(value: str) -> str:
+    """Quote a Python string as a single-quoted SQL string literal"""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[list]:
+    """Yield lists of up to batch_size items from iterable"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+knowledge_file_extensions = (".md", ".markdown", ".txt")
+
+
+def list_knowledge_files(path: str) -> list[str]:
+    """
+    List the knowledge files found at a local path.
+
+    Args:
+        path (str): A single file, or a directory that is searched recursively for .md, .markdown and .txt files.
+
+    Returns:
+        list[str]: The file paths, sorted so that repeated ingestions process files in the same order.
+
+    Raises:
+        ValueError: If the path does not exist.
+    """
+    if os.path.isfile(path):
+        return [path]
+    if not os.path.isdir(path):
+        raise ValueError(f"Local file or directory does not exist: {path}")
+    files = []
+    for directory, _, filenames in os.walk(path):
+        files += [os.path.join(directory, f) for f in filenames if f.lower().endswith(knowledge_file_extensions)]
+    return sorted(files)
+
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mcp_clickzetta_server", "vector_index")
+# Exact search is a single matrix-vector product; above this many rows an HNSW graph is used when hnswlib is installed
+DEFAULT_HNSW_THRESHOLD = 50000
+# Rows without date_modified sort as if modified at this time, so they still advance the watermark
+MISSING_DATE_MODIFIED = "1970-01-01 00:00:00"
+
+
+def parse_vector(value: Any, dim: int) -> "np.ndarray":
+    """Convert a VECTOR value as returned by the driver (list, array, JSON text or raw float32 bytes) to a normalized float32 array"""
+    import numpy as np
+
+    if isinstance(value, str):
+        value = json.loads(value)
+    if isinstance(value, (bytes, bytearray)):
+        vector = np.frombuffer(value, dtype=np.float32)
+    else:
+        vector = np.asarray(value, dtype=np.float32).reshape(-1)
+    if vector.shape[0] != dim:
+        raise ValueError(f"Expected a vector of dimension {dim}, got {vector.shape[0]}")
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+class LocalVectorIndex:
+    """
+    Local mirror of a knowledge table for top-k vector search without a warehouse round trip.
+
+    The table's id, embedding and content columns (plus doc_link and any other selected columns) are
+    synced into a directory holding a memory-mapped float32 matrix (`vectors.f32`), the row metadata
+    (`rows.jsonl`) and the sync watermark (`state.json`). Refreshes only pull rows whose
+    date_modified is newer than the watermark; a row that changed replaces its previous version.
+    Rows deleted in the warehouse are only dropped by rebuild(). After mark_stale() the mirror is not
+    ready until the next refresh completes, so writes made through the server are never missed.
+
+    Search is exact (cosine over normalized vectors) unless the mirror grows beyond hnsw_threshold
+    rows and hnswlib is installed, in which case an HNSW graph answers approximate queries.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        embedding_column_name: str,
+        content_column_name: str,
+        dim: int,
+        select_columns: dict[str, str] | None = None,
+        partition_scope: str | None = None,
+        directory: str = DEFAULT_INDEX_DIR,
+        hnsw_threshold: int = DEFAULT_HNSW_THRESHOLD,
+    ):
+        self.table_name = table_name
+        self.embedding_column_name = embedding_column_name
+        self.content_column_name = content_column_name
+        self.dim = dim
+        # Extra output columns as alias -> SQL expression, e.g. {"doc_link": "CONCAT(...)"}
+        self.select_columns = select_columns or {}
+        self.partition_scope = partition_scope
+        self.hnsw_threshold = hnsw_threshold
+        signature = json.dumps([table_name, embedding_column_name, content_column_name, dim, self.select_columns, partition_scope])
+        self.directory = os.path.join(directory, hashlib.sha256(signature.encode("utf-8")).hexdigest()[:16])
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.rows_path = os.path.join(self.directory, "rows.jsonl")
+        self.state_path = os.path.join(self.directory, "state.json")
+
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._rows: list[dict[str, Any] | None] = []
+        self._row_by_id: dict[str, int] = {}
+        self._deleted: set[int] = set()
+        self._mmap = None
+        self._hnsw = None
+        # Rows are pulled in (date_modified, id) order, so the watermark is the last pair seen
+        self.watermark: str | None = None
+        self.watermark_id: str | None = None
+        self.last_refresh: float | None = None
+        # mark_stale() bumps the first, a refresh that started after the last mark catches up the second
+        self._stale_version = 0
+        self._fresh_version = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def matches(self, table_name: str, embedding_column_name: str, content_column_name: str, partition_scope: str | None) -> bool:
+        """Whether this mirror can answer a vector search with these parameters"""
+        return (table_name, embedding_column_name, content_column_name, partition_scope) == (
+            self.table_name,
+            self.embedding_column_name,
+            self.content_column_name,
+            self.partition_scope,
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.last_refresh is not None and len(self._row_by_id) > 0 and not self.stale
+
+    @property
+    def stale(self) -> bool:
+        return self._stale_version != self._fresh_version
+
+    def mark_stale(self) -> None:
+        """Record that the table was written to; searches skip the mirror until it is refreshed"""
+        self._stale_version += 1
+
+    def _load(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if not (os.path.exists(self.state_path) and os.path.exists(self.rows_path)):
+            # Files left by a first refresh that never completed cannot be trusted
+            for path in (self.vectors_path, self.rows_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        stored_rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        kept_lines = []
+        extra_lines = False
+        with open(self.rows_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if len(kept_lines) >= stored_rows:
+                    extra_lines = True
+                    break
+                # A line cut off by an interrupted write is dropped with anything after it
+                if not line.endswith("\n"):
+                    extra_lines = True
+                    break
+                self._append_row(json.loads(line))
+                kept_lines.append(line)
+        # An interrupted refresh can leave either file longer than the other; trim both to the rows they share
+        if extra_lines:
+            with open(self.rows_path + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(kept_lines)
+            os.replace(self.rows_path + ".tmp", self.rows_path)
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > len(self._rows) * 4 * self.dim:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(len(self._rows) * 4 * self.dim)
+        self.watermark = state.get("watermark")
+        self.watermark_id = state.get("watermark_id")
+        self.last_refresh = state.get("last_refresh")
+
+    def _append_row(self, row: dict[str, Any]) -> None:
+        previous = self._row_by_id.get(row["id"])
+        if previous is not None:
+            self._rows[previous] = None
+            self._deleted.add(previous)
+            if self._hnsw is not None:
+                self._hnsw.mark_deleted(previous)
+        self._row_by_id[row["id"]] = len(self._rows)
+        self._rows.append(row)
+
+    def _fetch_query(self, page_size: int) -> str:
+        columns = ", ".join(f"{expression} AS {alias}" for alias, expression in self.select_columns.items())
+        date_modified = f"COALESCE(date_modified, CAST('{MISSING_DATE_MODIFIED}' AS TIMESTAMP))"
+        conditions = []
+        if self.watermark:
+            watermark = f"CAST('{self.watermark}' AS TIMESTAMP)"
+            conditions.append(f"({date_modified} > {watermark} OR ({date_modified} = {watermark} AND CAST(id AS STRING) > '{self.watermark_id}'))")
+        if self.partition_scope:
+            conditions.append(f"({self.partition_scope})")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"""
+            SELECT CAST(id AS STRING) AS id, {self.content_column_name} AS content, {self.embedding_column_name} AS embedding,
+                   CAST({date_modified} AS STRING) AS date_modified{', ' + columns if columns else ''}
+            FROM {self.table_name}
+            {where}
+            ORDER BY {date_modified}, CAST(id AS STRING)
+            LIMIT {page_size}
+        """
+
+    def refresh(self, execute_query: Callable[[str], list[dict[str, Any]]], page_size: int = 1000) -> int:
+        """
+        Pull rows modified since the last refresh.
+
+        Args:
+            execute_query (Callable): Runs a SQL query and returns rows as dictionaries.
+            page_size (int): Rows fetched per query.
+
+        Returns:
+            int: The number of rows added or replaced.
+        """
+        import numpy as np
+
+        with self._refresh_lock:
+            # Writes marked after this point are not guaranteed to be pulled, so they keep the mirror stale
+            version = self._stale_version
+            pulled = 0
+            while True:
+                rows = execute_query(self._fetch_query(page_size))
+                if not rows:
+                    break
+                rows = [{k.lower(): v for k, v in row.items()} for row in rows]
+                vectors = []
+                metadata = []
+                for row in rows:
+                    try:
+                        vectors.append(parse_vector(row.pop("embedding"), self.dim))
+                    except (TypeError, ValueError):
+                        continue
+                    metadata.append({k: (v if isinstance(v, (str, int, float, bool)) or v is None else str(v)) for k, v in row.items()})
+                if vectors:
+                    with open(self.vectors_path, "ab") as f:
+                        f.write(np.stack(vectors).astype(np.float32).tobytes())
+                    with open(self.rows_path, "a", encoding="utf-8") as f:
+                        f.writelines(json.dumps(m, ensure_ascii=False) + "\n" for m in metadata)
+                    with self._lock:
+                        first_new = len(self._rows)
+                        for m in metadata:
+                            self._append_row(m)
+                        self._mmap = None
+                        if self._hnsw is not None:
+                            self._add_to_hnsw(np.stack(vectors), first_new)
+                    pulled += len(metadata)
+                self.watermark, self.watermark_id = rows[-1]["date_modified"], rows[-1]["id"]
+                if len(rows) < page_size:
+                    break
+
+            self.last_refresh = time.time()
+            self._fresh_version = version
+            with open(self.state_path, "w", encoding="utf-8") as f:
+                json.dump({"watermark": self.watermark, "watermark_id": self.watermark_id, "last_refresh": self.last_refresh}, f)
+            with self._lock:
+                if self._hnsw is None and len(self._row_by_id) >= self.hnsw_threshold:
+                    self._build_hnsw()
+            if pulled:
+                logger.info(f"Local vector index for {self.table_name}: pulled {pulled} rows, {len(self._row_by_id)} rows in total")
+            return pulled
+
+    def rebuild(self, execute_query: Callable[[str], list[dict[str, Any]]], page_size: int = 1000) -> int:
+        """Drop the mirror and sync the whole table again, which also removes rows deleted in the warehouse"""
+        with self._refresh_lock, self._lock:
+            for path in (self.vectors_path, self.rows_path, self.state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._rows, self._row_by_id, self._deleted, self._mmap, self._hnsw = [], {}, set(), None, None
+            self.watermark = self.watermark_id = self.last_refresh = None
+        return self.refresh(execute_query, page_size)
+
+    def _matrix(self) -> "np.ndarray":
+        import numpy as np
+
+        if self._mmap is None or self._mmap.shape[0] != len(self._rows):
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self.dim))
+        return self._mmap
+
+    def _build_hnsw(self) -> None:
+        try:
+            import hnswlib
+        except ImportError:
+            logger.info("hnswlib is not installed, the local vector index keeps using exact search")
+            self.hnsw_threshold = float("inf")
+            return
+        import numpy as np
+
+        matrix = self._matrix()
+        index = hnswlib.Index(space="cosine", dim=self.dim)
+        index.init_index(max_elements=max(len(self._rows) * 2, 1024), ef_construction=200, M=16)
+        index.add_items(np.asarray(matrix), np.arange(len(self._rows)))
+        for row in self._deleted:
+            index.mark_deleted(row)
+        index.set_ef(128)
+        self._hnsw = index
+        logger.info(f"Built HNSW graph over {len(self._rows)} rows of {self.table_name}")
+
+    def _add_to_hnsw(self, vectors: "np.ndarray", first_row: int) -> None:
+        import numpy as np
+
+        needed = first_row + len(vectors)
+        if needed > self._hnsw.get_max_elements():
+            self._hnsw.resize_index(needed * 2)
+        self._hnsw.add_items(vectors, np.arange(first_row, needed))
+
+    def search(self, vector: Any, k: int, max_distance: float | None = None) -> list[dict[str, Any]]:
+        """
+        Return up to k rows closest to vector by cosine distance.
+
+        Args:
+            vector: The normalized query embedding.
+            k (int): Number of rows to return.
+            max_distance (float): Only return rows closer than this cosine distance.
+
+        Returns:
+            list[dict]: Row metadata with a `distance` key, closest first.
+        """
+        import numpy as np
+
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            live = len(self._row_by_id)
+            if live == 0:
+                return []
+            k = min(k, live)
+            if self._hnsw is not None:
+                labels, distances = self._hnsw.knn_query(query, k=k)
+                candidates = zip(labels[0].tolist(), distances[0].tolist())
+            else:
+                distances = 1.0 - np.asarray(self._matrix() @ query)
+                # Replaced rows are never returned
+                if self._deleted:
+                    distances[list(self._deleted)] = np.inf
+                top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+                top = top[np.argsort(distances[top])]
+                candidates = ((int(row), float(distances[row])) for row in top)
+            results = [
+                {**self._rows[row], "distance": distance}
+                for row, distance in candidates
+                if self._rows[row] is not None and (max_distance is None or distance < max_distance)
+            ]
+        if results:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return results
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "table_name": self.table_name,
+            "rows": len(self._row_by_id),
+            "search_method": "hnsw" if self._hnsw is not None else "exact",
+            "watermark": self.watermark,
+            "last_refresh": self.last_refresh,
+            "stale": self.stale,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,267 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable
+
+from .result_cache import table_tag
+from .util import format_vector_literal
+
+logger = logging.getLogger("mcp_clickzetta_server")
+
+# Rows farther than this cosine distance from the question are never returned
+VECTOR_SEARCH_MAX_DISTANCE = 0.8
+DEFAULT_INDEX_CHECK_TTL = 600
+# HNSW parameters from the how_to_create_and_build_index knowledge entry; cosine matches vector_search
+DEFAULT_VECTOR_INDEX_PROPERTIES = {
+    "distance.function": "cosine_distance",
+    "scalar.type": "f32",
+    "m": "16",
+    "ef.construction": "128",
+}
+VECTOR_INDEX_PROPERTY_NAMES = (
+    "distance.function",
+    "scalar.type",
+    "m",
+    "ef.construction",
+    "reuse.vector.column",
+    "compress.codec",
+    "compress.level",
+    "compress.byte.stream.split",
+    "compress.block.size",
+    "conversion.rule",
+)
+
+
+def build_vector_search_sql(
+    table_name: str,
+    embedding_column_name: str,
+    content_column_name: str,
+    vector: Any,
+    dim: int,
+    limit: int,
+    partition_scope: str | None = None,
+    other_columns_name: str | None = None,
+    extra_columns: dict[str, str] | None = None,
+    max_distance: float = VECTOR_SEARCH_MAX_DISTANCE,
+) -> str:
+    """
+    Build the top-k cosine search over a table.
+
+    The inner query is the `ORDER BY distance LIMIT k` shape that a vector index on the embedding
+    column can answer, with partition_scope pushed into its WHERE clause so pruned partitions are
+    never read. The distance is computed once there and only filtered by max_distance outside, which
+    returns the same rows as filtering first because the filter keeps a prefix of the ordering.
+
+    Args:
+        table_name (str): Table to search.
+        embedding_column_name (str): VECTOR column compared with the question.
+        content_column_name (str): Column returned as the passage.
+        vector: The normalized question embedding.
+        dim (int): Dimension of the embedding column.
+        limit (int): Number of rows to return.
+        partition_scope (str): Optional SQL condition limiting the scanned partitions.
+        other_columns_name (str): Optional comma separated columns returned as they are.
+        extra_columns (dict[str, str]): Optional alias -> SQL expression columns, e.g. doc_link.
+        max_distance (float): Largest cosine distance returned.
+
+    Returns:
+        str: The SQL statement.
+    """
+    columns = [f"{content_column_name}", f"COSINE_DISTANCE({embedding_column_name}, CAST('{format_vector_literal(vector)}' AS VECTOR({dim}))) AS distance"]
+    if other_columns_name:
+        columns.append(other_columns_name)
+    columns.extend(f"{expression} AS {alias}" for alias, expression in (extra_columns or {}).items())
+    where = f"WHERE {partition_scope}" if partition_scope else ""
+    select_list = ",\n                   ".join(columns)
+    return f"""
+        SELECT *
+        FROM (
+            SELECT {select_list}
+            FROM {table_name}
+            {where}
+            ORDER BY distance
+            LIMIT {int(limit)}
+        ) nearest
+        WHERE distance < {max_distance}
+        ORDER BY distance;
+    """
+
+
+def build_batch_vector_search_sql(
+    table_name: str,
+    embedding_column_name: str,
+    content_column_name: str,
+    vectors: list[Any],
+    dim: int,
+    limit: int,
+    partition_scope: str | None = None,
+    other_columns_name: str | None = None,
+    extra_columns: dict[str, str] | None = None,
+    max_distance: float = VECTOR_SEARCH_MAX_DISTANCE,
+) -> str:
+    """
+    Build one statement answering several vector searches: top-k rows per query vector.
+
+    The query vectors are an inline VALUES table numbered by question_id. Every row in scope is
+    scored against each of them in one pass, and ROW_NUMBER() partitioned by question_id keeps the
+    limit closest rows of each question, so N questions cost one round trip and one table scan.
+
+    Returns:
+        str: The SQL statement; result rows carry question_id and question_rank.
+    """
+    query_vectors = ",\n                ".join(
+        f"({question_id}, CAST('{format_vector_literal(vector)}' AS VECTOR({dim})))" for question_id, vector in enumerate(vectors)
+    )
+    columns = [f"{content_column_name}", f"COSINE_DISTANCE({embedding_column_name}, query_embeddings.query_vector) AS distance"]
+    if other_columns_name:
+        columns.append(other_columns_name)
+    columns.extend(f"{expression} AS {alias}" for alias, expression in (extra_columns or {}).items())
+    where = f"WHERE {partition_scope}" if partition_scope else ""
+    select_list = ",\n                   ".join(columns)
+    return f"""
+        WITH query_embeddings AS (
+            SELECT * FROM VALUES
+                {query_vectors}
+            AS t(question_id, query_vector)
+        ),
+        scored AS (
+            SELECT query_embeddings.question_id,
+                   {select_list}
+            FROM {table_name} CROSS JOIN query_embeddings
+            {where}
+        ),
+        ranked AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY question_id ORDER BY distance) AS question_rank
+            FROM scored
+            WHERE distance < {max_distance}
+        )
+        SELECT * FROM ranked
+        WHERE question_rank <= {int(limit)}
+        ORDER BY question_id, question_rank;
+    """
+
+
+def default_vector_index_name(table_name: str, column_name: str) -> str:
+    return re.sub(r"\W+", "_", f"{table_tag(table_name)}_{column_name.strip('`')}_vector_idx").lower()
+
+
+def build_create_vector_index_sql(index_name: str, table_name: str, column_name: str, properties: dict[str, Any] | None = None) -> str:
+    """
+    CREATE VECTOR INDEX statement for an existing table; the index covers new data, BUILD INDEX indexes existing rows.
+
+    Raises:
+        ValueError: If a property is not a vector index property.
+    """
+    merged = {**DEFAULT_VECTOR_INDEX_PROPERTIES, **(properties or {})}
+    unknown = sorted(set(merged) - set(VECTOR_INDEX_PROPERTY_NAMES))
+    if unknown:
+        raise ValueError(f"Unknown vector index properties: {', '.join(unknown)}; supported are {', '.join(VECTOR_INDEX_PROPERTY_NAMES)}")
+    rendered = ", ".join(f'"{name}" = "{value}"' for name, value in merged.items())
+    return f"CREATE VECTOR INDEX IF NOT EXISTS {index_name} ON TABLE {table_name}({column_name}) PROPERTIES({rendered})"
+
+
+def build_build_index_sql(index_name: str, table_name: str, partition_scope: str | None = None) -> str:
+    where = f" WHERE {partition_scope}" if partition_scope else ""
+    return f"BUILD INDEX {index_name} ON {table_name}{where}"
+
+
+def find_vector_columns(describe_rows: list[dict[str, Any]]) -> list[str]:
+    """Names of VECTOR columns in the output of DESC TABLE"""
+    columns = []
+    for row in describe_rows:
+        row = {str(k).lower(): v for k, v in row.items()}
+        if str(row.get("data_type", "")).strip().lower().startswith("vector") and row.get("column_name"):
+            columns.append(str(row["column_name"]))
+    return columns
+
+
+def _lower_values(row: dict[str, Any]) -> list[str]:
+    return [str(value).strip().lower() for value in row.values() if value is not None]
+
+
+class VectorIndexDetector:
+    """
+    Finds the vector index on an embedding column with SHOW INDEX, remembering the answer per table.
+
+    Results, including "no index", are kept for ttl_seconds; forget() drops a table's answer, e.g.
+    after an index was created or dropped.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_INDEX_CHECK_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._indexes: dict[tuple[str, str], tuple[float, str | None]] = {}
+        self._access_paths: dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def find(self, execute_query: Callable[[str], list[dict[str, Any]]], table_name: str, column_name: str) -> str | None:
+        """
+        Return the name of a vector index on table_name.column_name, or None.
+
+        Args:
+            execute_query (Callable): Runs a SQL query and returns rows as dictionaries.
+            table_name (str): The table, optionally schema qualified.
+            column_name (str): The embedding column.
+
+        Returns:
+            str | None: The index name when one exists.
+        """
+        key = (table_name.lower(), column_name.lower())
+        with self._lock:
+            checked = self._indexes.get(key)
+        if checked is not None and time.monotonic() - checked[0] < self.ttl_seconds:
+            return checked[1]
+        try:
+            index_name = self._detect(execute_query, table_name, column_name)
+        except Exception as e:
+            # Detection is only an optimization hint; a failing SHOW INDEX must not fail the search
+            logger.warning(f"Cannot list indexes of {table_name}: {e}")
+            index_name = None
+        with self._lock:
+            self._indexes[key] = (time.monotonic(), index_name)
+        return index_name
+
+    def _detect(self, execute_query: Callable[[str], list[dict[str, Any]]], table_name: str, column_name: str) -> str | None:
+        column = column_name.strip("`").lower()
+        for row in execute_query(f"SHOW INDEX FROM {table_name}"):
+            row = {str(k).lower(): v for k, v in row.items()}
+            values = _lower_values(row)
+            if "vector" not in values:
+                continue
+            index_name = str(row.get("index_name") or row.get("name") or next(iter(row.values())))
+            if column in values:
+                return index_name
+            # SHOW INDEX does not always list the indexed column, DESC INDEX does
+            described = execute_query(f"DESC INDEX {index_name}")
+            if any(column in _lower_values({str(k).lower(): v for k, v in r.items()}) for r in described):
+                return index_name
+        return None
+
+    def record_access(self, table_name: str, access_path: str) -> None:
+        """Count a vector search on table_name by how the rows were read"""
+        with self._lock:
+            self._access_paths.setdefault(table_tag(table_name), Counter())[access_path.split(" ")[0]] += 1
+
+    def access_paths(self, table_name: str) -> dict[str, int]:
+        with self._lock:
+            return dict(self._access_paths.get(table_tag(table_name), {}))
+
+    def forget(self, table_name: str) -> None:
+        tag = table_tag(table_name)
+        with self._lock:
+            for key in [key for key in self._indexes if table_tag(key[0]) == tag]:
+                del self._indexes[key]
+
+    def stats(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "table_name": table,
+                    "column_name": column,
+                    "vector_index": index_name,
+                    "checked_seconds_ago": round(time.monotonic() - checked_at),
+                    "searches_by_access_path": dict(self._access_paths.get(table_tag(table), {})),
+                }
+                for (table, column), (checked_at, index_name) in self._indexes.items()
+            ]
@@ -1,7 +1,9 @@
+import re
+
 import sqlparse
-from sqlparse.sql import Token, TokenList
-from sqlparse.tokens import Keyword, DML, DDL
-from typing import Dict, List, Set, Tuple
+from sqlparse.sql import Function, Identifier, IdentifierList, Parenthesis, TokenList
+from sqlparse.tokens import Keyword, DML, DDL, CTE
+from typing import Dict, Set
 
 
 class SQLWriteDetector:
@@ -16,6 +18,13 @@ class SQLWriteDetector:
         # Combine all write keywords
         self.write_keywords = self.dml_write_keywords | self.ddl_keywords | self.dcl_keywords
 
+        # Keywords followed by a table reference
+        self.table_keywords = {"FROM", "INTO", "UPDATE", "TABLE", "USING"}
+        # Keywords that may stand between a table keyword and the table, e.g. DROP TABLE IF EXISTS t
+        self.table_modifier_keywords = {"IF", "NOT", "EXISTS", "IF EXISTS", "IF NOT EXISTS", "ONLY", "OVERWRITE", "TABLE", "EXTENDED"}
+        # Keywords after a table keyword that start something other than a table name, e.g. FROM VALUES (...)
+        self.non_table_keywords = {"VALUES", "LATERAL", "UNNEST", "SET"}
+
     def analyze_query(self, sql_query: str) -> Dict:
         """
         Analyze a SQL query to determine if it contains write operations.
@@ -96,3 +105,101 @@ class SQLWriteDetector:
                 operations.update(child_ops)
 
         return operations
+
+    def extract_tables(self, sql_query: str) -> Set[str]:
+        """
+        Find the tables a SQL query reads or writes.
+
+        Names follow FROM, JOIN, INTO, UPDATE, TABLE and USING anywhere in the parse tree, including
+        subqueries; names of CTEs defined in the query are left out.
+
+        Args:
+            sql_query: The SQL query string to analyze
+
+        Returns:
+            Set of lowercased table names without quotes, qualified as written (e.g. "schema.table")
+        """
+        tables = set()
+        ctes = set()
+        for statement in sqlparse.parse(sql_query):
+            self._collect_tables(statement, tables, ctes)
+        return tables - ctes
+
+    def _collect_tables(self, token_list: TokenList, tables: Set[str], ctes: Set[str]) -> None:
+        expect_table = False
+        in_cte = False
+        for token in token_list.tokens:
+            if token.is_whitespace or token.ttype in (sqlparse.tokens.Comment, sqlparse.tokens.Punctuation) and token.value != ";":
+                continue
+            if token.ttype is CTE:
+                in_cte = True
+                continue
+            if token.ttype in (Keyword, DML, DDL):
+                normalized = token.normalized.upper()
+                if expect_table and normalized in self.table_modifier_keywords:
+                    continue
+                if expect_table and token.ttype is Keyword and normalized not in self.table_keywords | self.non_table_keywords:
+                    # Tables named like a keyword, such as `source` or `returns`, are lexed as keywords
+                    tables.add(token.value.lower())
+                    expect_table = False
+                    continue
+                expect_table = normalized in self.table_keywords or normalized.endswith("JOIN")
+                # The CTE definitions end where the main statement starts
+                in_cte = in_cte and token.ttype is not DML
+                continue
+            if in_cte and isinstance(token, (Identifier, IdentifierList)):
+                for identifier in token.get_identifiers() if isinstance(token, IdentifierList) else [token]:
+                    if isinstance(identifier, Identifier):
+                        ctes.add(self._table_name(identifier))
+                        self._collect_tables(identifier, tables, ctes)
+                continue
+            if expect_table:
+                identifiers = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+                for identifier in identifiers:
+                    if isinstance(identifier, Function):
+                        # INSERT INTO t(a, b) parses as a call of t
+                        identifier = identifier.tokens[0]
+                    if isinstance(identifier, Identifier) and not any(isinstance(t, Parenthesis) for t in identifier.tokens):
+                        tables.add(self._table_name(identifier))
+                    elif isinstance(identifier, TokenList):
+                        self._collect_tables(identifier, tables, ctes)
+                expect_table = False
+                continue
+            if isinstance(token, TokenList):
+                self._collect_tables(token, tables, ctes)
+
+    @staticmethod
+    def _table_name(identifier: Identifier) -> str:
+        parts = []
+        for token in identifier.tokens:
+            if token.is_whitespace or (token.ttype in (Keyword,) and token.normalized == "AS") or isinstance(token, Identifier):
+                break
+            parts.append(token.value)
+        return "".join(parts).replace("`", "").replace('"', "").lower()
+
+    def normalize_query(self, sql_query: str) -> str:
+        """
+        Canonical text of a query for cache keys: no comments, upper-case keywords, single spaces, no trailing semicolon.
+
+        Only whitespace between tokens is collapsed; string literals are kept verbatim, so queries
+        comparing with 'a  b' and 'a b' stay different.
+        """
+        parts = []
+        for statement in sqlparse.parse(sql_query):
+            for token in statement.flatten():
+                if token.is_whitespace or token.ttype in sqlparse.tokens.Comment:
+                    if parts and parts[-1] != " ":
+                        parts.append(" ")
+                elif token.ttype in sqlparse.tokens.String:
+                    parts.append(token.value)
+                elif token.is_keyword:
+                    parts.append(token.normalized.upper())
+                else:
+                    parts.append(token.value)
+        return "".join(parts).strip().rstrip(";").strip()
+
+    def is_metadata_query(self, sql_query: str) -> bool:
+        """Whether a query reads the catalog (SHOW, DESC or information_schema), whose answer any DDL can change"""
+        if re.match(r"\s*(SHOW|DESC|DESCRIBE)\b", sqlparse.format(sql_query, strip_comments=True), re.IGNORECASE):
+            return True
+        return any("information_schema" in table.split(".") for table in self.extract_tables(sql_query))
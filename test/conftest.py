@@ -0,0 +1,2 @@
+# test_prompt.py starts the server over stdio and needs warehouse credentials; run it directly instead
+collect_ignore = ["test_prompt.py"]
@@ -0,0 +1,115 @@
+import asyncio
+import re
+
+import pytest
+
+from mcp_clickzetta_server.backfill import BackfillJob
+
+
+class FakeWarehouse:
+    """Serves backfill pages from an in-memory table and applies its MERGE statements"""
+
+    def __init__(self, count, now="2024-05-01 00:00:00"):
+        self.embeddings = {f"{i:03d}": None for i in range(count)}
+        self.now = now
+        self.queries = []
+
+    async def execute_query(self, query):
+        self.queries.append(query)
+        if "CURRENT_TIMESTAMP AS STRING" in query:
+            return [{"NOW": self.now}]
+        if query.strip().startswith("MERGE"):
+            for row_id in re.findall(r"\('(\d+)', CAST", query):
+                self.embeddings[row_id] = "vector"
+            return []
+        after = re.search(r"CAST\(id AS STRING\) > '(\d+)'", query)
+        limit = int(query.split("LIMIT")[1])
+        # Re-embed queries also select rows that already have a vector
+        stale = [row_id for row_id, vector in self.embeddings.items() if vector is None or "date_processed" in query]
+        ids = sorted(row_id for row_id in stale if after is None or row_id > after.group(1))
+        return [{"ID": row_id, "CONTENT": f"text {row_id}"} for row_id in ids[:limit]]
+
+    def page_queries(self):
+        return [query for query in self.queries if "ORDER BY CAST(id AS STRING)" in query]
+
+
+async def embed_many(texts):
+    return [[1.0, 0.0] for _ in texts]
+
+
+def make_job(tmp_path, **kwargs):
+    options = {"page_size": 2, "batch_size": 2, "checkpoint_dir": str(tmp_path)}
+    options.update(kwargs)
+    return BackfillJob("docs_embeddings", "docs", "model", 2, **options)
+
+
+def failing_embed_many(after_calls):
+    calls = []
+
+    async def embed(texts):
+        calls.append(texts)
+        if len(calls) > after_calls:
+            raise RuntimeError("model unavailable")
+        return [[1.0, 0.0] for _ in texts]
+
+    return embed
+
+
+def test_pages_are_read_by_keyset_after_the_last_id(tmp_path):
+    warehouse = FakeWarehouse(5)
+    job = make_job(tmp_path)
+    asyncio.run(job.run(warehouse.execute_query, embed_many))
+
+    assert job.status == "completed"
+    assert (job.rows_embedded, job.pages) == (5, 3)
+    pages = warehouse.page_queries()
+    assert "CAST(id AS STRING) >" not in pages[0]
+    assert "CAST(id AS STRING) > '001'" in pages[1]
+    assert "CAST(id AS STRING) > '003'" in pages[2]
+    assert all(vector is not None for vector in warehouse.embeddings.values())
+
+
+def test_interrupted_job_resumes_after_its_checkpoint(tmp_path):
+    warehouse = FakeWarehouse(5)
+    job = make_job(tmp_path)
+    asyncio.run(job.run(warehouse.execute_query, failing_embed_many(after_calls=1)))
+    assert job.status == "failed"
+
+    resumed = make_job(tmp_path)
+    assert resumed.load_checkpoint()
+    assert (resumed.after_id, resumed.rows_embedded) == ("001", 2)
+    warehouse.queries.clear()
+    asyncio.run(resumed.run(warehouse.execute_query, embed_many))
+    assert "CAST(id AS STRING) > '001'" in warehouse.page_queries()[0]
+    assert (resumed.status, resumed.rows_embedded) == ("completed", 5)
+
+
+def test_completed_checkpoint_is_not_resumed(tmp_path):
+    asyncio.run(make_job(tmp_path).run(FakeWarehouse(1).execute_query, embed_many))
+    job = make_job(tmp_path)
+    assert not job.load_checkpoint()
+    assert job.after_id is None and job.rows_embedded == 0
+
+
+def test_checkpoint_of_other_parameters_is_refused(tmp_path):
+    job = make_job(tmp_path)
+    job.after_id = "001"
+    job.save_checkpoint()
+    with pytest.raises(ValueError):
+        BackfillJob("docs_embeddings", "docs", "other-model", 2, checkpoint_dir=str(tmp_path)).load_checkpoint()
+
+
+def test_reembed_cutoff_is_kept_across_resumes(tmp_path):
+    warehouse = FakeWarehouse(5)
+    job = make_job(tmp_path, mode="all")
+    asyncio.run(job.run(warehouse.execute_query, failing_embed_many(after_calls=1)))
+    assert job.stale_before == "2024-05-01 00:00:00"
+
+    # The warehouse clock moved on; the resumed job must not re-embed rows written by the first run
+    warehouse.now = "2024-05-02 00:00:00"
+    warehouse.queries.clear()
+    resumed = make_job(tmp_path, mode="all")
+    assert resumed.load_checkpoint()
+    asyncio.run(resumed.run(warehouse.execute_query, embed_many))
+    assert not any("CURRENT_TIMESTAMP AS STRING" in query for query in warehouse.queries)
+    assert all("CAST('2024-05-01 00:00:00' AS TIMESTAMP)" in query for query in warehouse.page_queries())
@@ -0,0 +1,75 @@
+import pytest
+
+from mcp_clickzetta_server.chunker import estimate_tokens, iter_file_chunks, iter_paragraphs, iter_string_chunks
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def paragraph(name, words):
+    return " ".join(f"{name}{i}" for i in range(words))
+
+
+@pytest.mark.parametrize("text", ["", "   ", "\n\n \t\n"])
+def test_empty_or_whitespace_input_yields_no_chunk(text):
+    assert list(iter_string_chunks(text, count_tokens=count_words)) == []
+
+
+def test_small_paragraphs_are_packed_into_one_chunk():
+    text = f"{paragraph('a', 3)}\n\n{paragraph('b', 3)}\n"
+    assert list(iter_string_chunks(text, max_tokens=10, overlap_tokens=0, count_tokens=count_words)) == [
+        f"{paragraph('a', 3)}\n{paragraph('b', 3)}"
+    ]
+
+
+def test_chunks_never_exceed_max_tokens():
+    text = "\n\n".join(paragraph(name, 4) for name in "abcdef")
+    chunks = list(iter_string_chunks(text, max_tokens=10, overlap_tokens=0, count_tokens=count_words))
+    assert [count_words(chunk) for chunk in chunks] == [8, 8, 8]
+
+
+def test_next_chunk_starts_with_the_tail_of_the_previous_one():
+    text = "\n\n".join(paragraph(name, 4) for name in "abcd")
+    chunks = list(iter_string_chunks(text, max_tokens=10, overlap_tokens=4, count_tokens=count_words))
+    assert chunks == [
+        f"{paragraph('a', 4)}\n{paragraph('b', 4)}",
+        f"{paragraph('b', 4)}\n{paragraph('c', 4)}",
+        f"{paragraph('c', 4)}\n{paragraph('d', 4)}",
+    ]
+
+
+def test_overlap_is_dropped_when_it_would_not_leave_room_for_the_next_unit():
+    text = f"{paragraph('a', 4)}\n\n{paragraph('b', 8)}"
+    chunks = list(iter_string_chunks(text, max_tokens=10, overlap_tokens=5, count_tokens=count_words))
+    assert chunks == [paragraph("a", 4), paragraph("b", 8)]
+
+
+def test_oversized_paragraph_is_split_at_sentences():
+    text = "One two three. Four five six. Seven eight nine."
+    chunks = list(iter_string_chunks(text, max_tokens=6, overlap_tokens=0, count_tokens=count_words))
+    assert chunks == ["One two three. Four five six.", "Seven eight nine."]
+
+
+def test_oversized_sentence_is_cut_into_windows():
+    text = paragraph("w", 25)
+    chunks = list(iter_string_chunks(text, max_tokens=10, overlap_tokens=0, count_tokens=count_words))
+    assert all(count_words(chunk) <= 10 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_heading_starts_a_new_paragraph():
+    assert list(iter_paragraphs(["intro\n", "# Title\n", "body\n"])) == ["intro\n", "# Title\nbody\n"]
+
+
+def test_file_and_string_are_chunked_alike(tmp_path):
+    text = "\n\n".join(paragraph(name, 4) for name in "abcd")
+    path = tmp_path / "doc.md"
+    path.write_text(text, encoding="utf-8")
+    options = {"max_tokens": 10, "overlap_tokens": 4, "count_tokens": count_words}
+    assert list(iter_file_chunks(str(path), **options)) == list(iter_string_chunks(text, **options))
+
+
+def test_estimate_counts_cjk_characters_and_latin_word_pieces():
+    assert estimate_tokens("向量索引") == 4
+    assert estimate_tokens("index") == 2
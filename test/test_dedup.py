@@ -0,0 +1,46 @@
+from mcp_clickzetta_server.dedup import group_near_duplicates
+
+
+def pair(id_a, id_b, similarity, length_a=10, length_b=10, created_a="2024-01-01", created_b="2024-01-02"):
+    return {
+        "ID_A": id_a,
+        "ID_B": id_b,
+        "SIMILARITY": similarity,
+        "LENGTH_A": length_a,
+        "LENGTH_B": length_b,
+        "CREATED_A": created_a,
+        "CREATED_B": created_b,
+    }
+
+
+def test_longest_text_is_kept():
+    [cluster] = group_near_duplicates([pair("a", "b", 0.97, length_a=10, length_b=40)])
+    assert cluster == {"keep": "b", "remove": ["a"], "chained": [], "min_similarity": 0.97}
+
+
+def test_oldest_row_is_kept_between_equal_lengths():
+    [cluster] = group_near_duplicates([pair("a", "b", 0.97, created_a="2024-03-01", created_b="2024-01-01")])
+    assert cluster["keep"] == "b"
+
+
+def test_chained_rows_are_not_removed():
+    # a ~ b and b ~ c do not make a and c duplicates of each other
+    [cluster] = group_near_duplicates([pair("a", "b", 0.96, length_a=30), pair("b", "c", 0.96, length_b=5)])
+    assert cluster["keep"] == "a"
+    assert cluster["remove"] == ["b"]
+    assert cluster["chained"] == ["c"]
+
+
+def test_rows_paired_with_keeper_are_removed():
+    pairs = [pair("a", "b", 0.97, length_a=30), pair("a", "c", 0.95, length_a=30, length_b=5), pair("b", "c", 0.96, length_b=5)]
+    [cluster] = group_near_duplicates(pairs)
+    assert cluster["remove"] == ["b", "c"]
+    assert cluster["chained"] == []
+    assert cluster["min_similarity"] == 0.95
+
+
+def test_separate_groups_largest_first():
+    pairs = [pair("x", "y", 0.99), pair("a", "b", 0.98, length_a=30), pair("a", "c", 0.98, length_a=30)]
+    clusters = group_near_duplicates(pairs)
+    assert [cluster["keep"] for cluster in clusters] == ["a", "x"]
+    assert group_near_duplicates([]) == []
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+
+from mcp_clickzetta_server.embedding_cache import EmbeddingCache, _DiskVectorStore
+
+
+def vector(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+
+def test_vectors_survive_reopening(tmp_path):
+    store = _DiskVectorStore(str(tmp_path), 4)
+    store.put("a", vector(1))
+    store.put("b", vector(2))
+    reopened = _DiskVectorStore(str(tmp_path), 4)
+    assert len(reopened) == 2
+    assert np.array_equal(reopened.get("b"), vector(2))
+
+
+def test_truncated_row_is_cut_off_on_load(tmp_path):
+    store = _DiskVectorStore(str(tmp_path), 4)
+    store.put("a", vector(1))
+    # An interrupted write left part of a second row and its index line
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(b"\0" * 6)
+    with open(tmp_path / "index.tsv", "a", encoding="utf-8") as f:
+        f.write("b\t1\n")
+
+    reopened = _DiskVectorStore(str(tmp_path), 4)
+    assert os.path.getsize(tmp_path / "vectors.f32") == 16
+    assert reopened.get("b") is None
+    reopened.put("c", vector(3))
+    # The next vector starts on a row boundary
+    assert np.array_equal(_DiskVectorStore(str(tmp_path), 4).get("c"), vector(3))
+
+
+def test_segments_rotate_at_half_of_max_rows(tmp_path):
+    store = _DiskVectorStore(str(tmp_path), 4, max_rows=4)
+    for i in range(4):
+        store.put(f"k{i}", vector(i))
+    assert store.rotations == 1
+    assert len(store) == 4
+
+    store.put("k4", vector(4))
+    assert store.rotations == 2
+    # The oldest segment was dropped with its vectors
+    assert store.get("k0") is None and store.get("k1") is None
+    assert np.array_equal(store.get("k3"), vector(3))
+    assert len(store) <= 4
+
+
+def test_vector_read_from_previous_segment_survives_rotation(tmp_path):
+    store = _DiskVectorStore(str(tmp_path), 4, max_rows=4)
+    store.put("used", vector(1))
+    store.put("unused", vector(2))
+    store.put("k2", vector(3))
+    # "used" is now in the previous segment; reading it copies it forward
+    assert np.array_equal(store.get("used"), vector(1))
+    # The next rotation drops the segment that held "unused"
+    store.put("k3", vector(4))
+    store.put("k4", vector(5))
+    assert store.rotations == 2
+    assert np.array_equal(store.get("used"), vector(1))
+    assert store.get("unused") is None
+
+
+def test_persist_false_keeps_vector_in_memory_only(tmp_path):
+    cache = EmbeddingCache("model", 4, cache_dir=str(tmp_path))
+    cache.put("bulk chunk", vector(1), persist=False)
+    cache.put("question", vector(2))
+    assert cache.stats()["disk_entries"] == 1
+    assert EmbeddingCache("model", 4, cache_dir=str(tmp_path)).get("bulk chunk") is None
+
+
+def test_disk_read_failure_is_a_miss(tmp_path):
+    cache = EmbeddingCache("model", 4, cache_dir=str(tmp_path))
+    cache.put("question", vector(1))
+    reopened = EmbeddingCache("model", 4, cache_dir=str(tmp_path))
+
+    def fail(key):
+        raise OSError("no space left on device")
+
+    reopened._disk.get = fail
+    assert reopened.get("question") is None
+    assert reopened.stats()["misses"] == 1
+
+
+def test_keys_ignore_case_and_spacing(tmp_path):
+    cache = EmbeddingCache("model", 4, cache_dir=str(tmp_path))
+    cache.put("How  do I build an index?", vector(1))
+    assert np.array_equal(cache.get("how do i build an index?"), vector(1))
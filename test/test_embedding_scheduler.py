@@ -0,0 +1,78 @@
+import asyncio
+
+from mcp_clickzetta_server.embedding_scheduler import EmbeddingBatcher
+
+
+class FakeCache:
+    def __init__(self):
+        self.vectors = {}
+        self.persisted = set()
+
+    def get(self, text):
+        return self.vectors.get(text)
+
+    def put(self, text, vector, persist=True):
+        self.vectors[text] = vector
+        if persist:
+            self.persisted.add(text)
+
+
+def test_concurrent_requests_share_one_batch():
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        return [len(text) for text in texts]
+
+    async def run():
+        batcher = EmbeddingBatcher(encode, max_batch_size=8, max_wait_ms=20)
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("bb"), batcher.embed("a"))
+
+    assert asyncio.run(run()) == [1, 2, 1]
+    # Identical texts are encoded once
+    assert batches == [["a", "bb"]]
+
+
+def test_full_batch_is_flushed_without_waiting():
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        return [0] * len(texts)
+
+    async def run():
+        batcher = EmbeddingBatcher(encode, max_batch_size=2, max_wait_ms=10_000)
+        return await asyncio.wait_for(batcher.embed_many(["a", "b", "c", "d"]), timeout=2)
+
+    assert asyncio.run(run()) == [0, 0, 0, 0]
+    assert batches == [["a", "b"], ["c", "d"]]
+
+
+def test_cached_texts_skip_the_model_and_persist_is_honoured():
+    cache = FakeCache()
+    cache.put("known", "cached vector")
+    encoded = []
+
+    def encode(texts):
+        encoded.extend(texts)
+        return [f"vector of {text}" for text in texts]
+
+    async def run():
+        batcher = EmbeddingBatcher(encode, get_cache=lambda: cache, max_wait_ms=1)
+        return await batcher.embed_many(["known", "bulk chunk"], persist=False)
+
+    assert asyncio.run(run()) == ["cached vector", "vector of bulk chunk"]
+    assert encoded == ["bulk chunk"]
+    assert "bulk chunk" in cache.vectors and "bulk chunk" not in cache.persisted
+
+
+def test_failed_batch_fails_every_caller():
+    def encode(texts):
+        raise RuntimeError("model unavailable")
+
+    async def run():
+        batcher = EmbeddingBatcher(encode, max_wait_ms=1)
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from mcp_clickzetta_server import server
+from mcp_clickzetta_server.knowledge_index import KnowledgeIndex, tokenize
+from mcp_clickzetta_server.knowledges import KNOWLEDGES
+
+
+@pytest.fixture(scope="module")
+def index():
+    return KnowledgeIndex(KNOWLEDGES)
+
+
+def test_exact_key_skips_the_search(monkeypatch):
+    async def search_knowledges(question, limit_n=3):
+        raise AssertionError("an exact key must not be searched")
+
+    monkeypatch.setattr(server, "search_knowledges", search_knowledges)
+    result = asyncio.run(server.handle_get_knowledge_about_how_to_something({"to_do_something": "analyze_slow_query"}, None, None, False, None))
+    assert KNOWLEDGES["analyze_slow_query"]["title"] in result[0].text
+
+
+def test_unrelated_question_matches_nothing(index):
+    # "how" and "in" occur in many sections but carry too little of the question's weight
+    assert index.search("what is the weather in paris tomorrow") == []
+    assert index.search("how do I bake bread") == []
+
+
+@pytest.mark.parametrize(
+    "question, knowledge",
+    [
+        ("build vector index", "how_to_create_and_build_index"),
+        ("slow query", "analyze_slow_query"),
+        ("small files in a table", "analyze_table_with_small_file"),
+        ("partition table", "partition_table_guide"),
+    ],
+)
+def test_partial_question_ranks_its_section_first(index, question, knowledge):
+    assert index.search(question)[0]["knowledge"] == knowledge
+
+
+def test_embedding_ranking_is_fused_with_bm25():
+    index = KnowledgeIndex({"vector_index": {"text": "vector index"}, "slow_query": {"text": "slow query"}})
+    index.set_embeddings([[1.0, 0.0], [0.0, 1.0]])
+    # No shared words, so only the embedding ranking can find the section
+    results = index.search("latency", query_vector=[0.0, 1.0])
+    assert [result["knowledge"] for result in results] == ["slow_query"]
+    assert results[0]["ranks"] == {"embedding": 1}
+
+
+def test_tokenize_splits_underscores_and_cjk_bigrams():
+    assert tokenize("create_table 向量索引") == ["create", "table", "向量", "量索", "索引"]
@@ -0,0 +1,90 @@
+import pytest
+
+from mcp_clickzetta_server.query_cursor import CursorRegistry, QueryCursor
+
+
+def make_cursor(rows=5, releases=None):
+    releases = releases if releases is not None else []
+    return QueryCursor("SELECT * FROM t", iter({"i": i} for i in range(rows)), releases.append), releases
+
+
+def test_fetch_pages_and_release_after_last_page():
+    cursor, releases = make_cursor(5)
+    assert cursor.fetch(2) == ([{"i": 0}, {"i": 1}], True)
+    assert cursor.fetch(2) == ([{"i": 2}, {"i": 3}], True)
+    assert cursor.fetch(2) == ([{"i": 4}], False)
+    assert cursor.exhausted and cursor.closed
+    assert releases == [False]
+    with pytest.raises(ValueError):
+        cursor.fetch(2)
+
+
+def test_page_ending_exactly_at_the_last_row_has_no_next_page():
+    cursor, releases = make_cursor(4)
+    cursor.fetch(2)
+    assert cursor.fetch(2) == ([{"i": 2}, {"i": 3}], False)
+    assert releases == [False]
+
+
+def test_failing_stream_releases_session_as_failed():
+    releases = []
+
+    def rows():
+        yield {"i": 0}
+        raise RuntimeError("job failed")
+
+    cursor = QueryCursor("SELECT 1", rows(), releases.append)
+    with pytest.raises(RuntimeError):
+        cursor.fetch(5)
+    assert cursor.closed
+    assert releases == [True]
+
+
+def test_close_is_idempotent():
+    cursor, releases = make_cursor(5)
+    cursor.close()
+    cursor.close()
+    assert releases == [False]
+
+
+def test_registry_evicts_least_recently_used_cursor():
+    registry = CursorRegistry(ttl_seconds=60, max_cursors=2)
+    releases = []
+    first, _ = make_cursor(releases=releases)
+    second, _ = make_cursor(releases=releases)
+    third, _ = make_cursor(releases=releases)
+    registry.add(first)
+    registry.add(second)
+    # Using the first cursor makes the second one the least recently used
+    registry.get(first.id)
+    registry.add(third)
+
+    assert second.closed and not first.closed and not third.closed
+    assert registry.stats()["evicted"] == 1
+    with pytest.raises(ValueError):
+        registry.get(second.id)
+
+
+def test_registry_expires_unused_cursors():
+    registry = CursorRegistry(ttl_seconds=60, max_cursors=4)
+    stale, releases = make_cursor()
+    fresh, _ = make_cursor()
+    registry.add(stale)
+    registry.add(fresh)
+    stale.last_used -= 120
+
+    assert registry.expire() == 1
+    assert stale.closed and releases == [False]
+    assert registry.stats()["expired"] == 1
+    with pytest.raises(ValueError):
+        registry.get(stale.id)
+    assert registry.get(fresh.id) is fresh
+
+
+def test_discard_without_closing_leaves_cursor_to_caller():
+    registry = CursorRegistry()
+    cursor, releases = make_cursor()
+    registry.add(cursor)
+    assert registry.discard(cursor.id, close=False) is cursor
+    assert not cursor.closed and releases == []
+    assert registry.stats()["open"] == 0
@@ -0,0 +1,43 @@
+from mcp_clickzetta_server.embeddings import EmbeddingModelRegistry
+from mcp_clickzetta_server.reranker import Reranker
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.scored = []
+
+    def predict(self, pairs):
+        self.scored.extend(passage for _, passage in pairs)
+        return [float(len(passage)) for _, passage in pairs]
+
+
+def make_reranker(cache_size=8):
+    model = FakeCrossEncoder()
+    registry = EmbeddingModelRegistry(loader=lambda name, backend: model)
+    return Reranker("fake-reranker", registry=registry, cache_size=cache_size), model
+
+
+def test_cached_pairs_are_not_scored_again():
+    reranker, model = make_reranker()
+    assert reranker.score("q", ["a", "bb"]) == [1.0, 2.0]
+    assert reranker.score("q", ["bb", "ccc"]) == [2.0, 3.0]
+    assert model.scored == ["a", "bb", "ccc"]
+    assert (reranker.score_hits, reranker.score_misses) == (1, 3)
+
+
+def test_full_cache_evicts_without_losing_scores_of_the_call():
+    reranker, model = make_reranker(cache_size=2)
+    reranker.score("q", ["a", "b"])
+    # "a" is a hit, "c" a miss; inserting "c" evicts the oldest entry, which must not break the hit
+    assert reranker.score("q", ["a", "c"]) == [1.0, 1.0]
+    assert len(reranker._scores) == 2
+    # "b" was evicted and is scored again
+    reranker.score("q", ["b"])
+    assert model.scored == ["a", "b", "c", "b"]
+
+
+def test_cache_is_keyed_by_question():
+    reranker, model = make_reranker()
+    reranker.score("first question", ["a"])
+    reranker.score("second question", ["a"])
+    assert model.scored == ["a", "a"]
@@ -0,0 +1,47 @@
+from mcp_clickzetta_server.result_cache import ResultCache
+
+
+def test_entries_expire_after_ttl():
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("k", {"rows": 1})
+    assert cache.get("k") == {"rows": 1}
+    key_expires_at, size, tags, value = cache._entries["k"]
+    cache._entries["k"] = (key_expires_at - 120, size, tags, value)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(ttl_seconds=60, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_byte_bound_evicts_and_skips_oversized_values():
+    cache = ResultCache(ttl_seconds=60, max_bytes=20)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    assert cache.get("a") is None and cache.get("b") == "y" * 10
+    cache.put("huge", "z" * 100)
+    assert cache.get("huge") is None
+    assert cache.stats()["bytes"] <= 20
+
+
+def test_invalidate_table_drops_tagged_entries():
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("orders", 1, tables=["Sales.Orders"])
+    cache.put("joined", 2, tables=["orders", "customers"])
+    cache.put("other", 3, tables=["customers"])
+    assert cache.invalidate_table("`orders`") == 2
+    assert cache.get("orders") is None and cache.get("joined") is None
+    assert cache.get("other") == 3
+
+
+def test_zero_ttl_disables_cache():
+    cache = ResultCache(ttl_seconds=0)
+    cache.put("k", 1)
+    assert cache.get("k") is None
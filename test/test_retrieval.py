@@ -0,0 +1,46 @@
+import pytest
+
+from mcp_clickzetta_server.retrieval import DEFAULT_RRF_K, reciprocal_rank_fusion
+
+
+def results(*ids):
+    return [{"id": id_} for id_ in ids]
+
+
+def fuse(ranked_lists, **kwargs):
+    return reciprocal_rank_fusion(ranked_lists, key=lambda result: result["id"], **kwargs)
+
+
+def test_item_found_by_both_retrievers_ranks_first():
+    fused = fuse({"vector": results("x", "y"), "keyword": results("y", "z")})
+    assert [result["id"] for result in fused] == ["y", "x", "z"]
+    assert fused[0]["ranks"] == {"vector": 2, "keyword": 1}
+    assert fused[0]["rrf_score"] == pytest.approx(1 / (DEFAULT_RRF_K + 2) + 1 / (DEFAULT_RRF_K + 1))
+
+
+def test_disjoint_lists_are_interleaved_by_rank():
+    fused = fuse({"vector": results("a", "b"), "keyword": results("c", "d")})
+    # Equal scores keep the order of the lists
+    assert [result["id"] for result in fused] == ["a", "c", "b", "d"]
+    assert all(len(result["ranks"]) == 1 for result in fused)
+
+
+def test_k_sets_how_much_the_top_rank_outweighs_agreement():
+    ranked_lists = {
+        "vector": results("top", "p", "q", "agreed"),
+        "keyword": results("r", "s", "t", "agreed"),
+    }
+    # A small k lets a single first place win over two fourth places; the default k favours agreement
+    assert fuse(ranked_lists, k=1)[0]["id"] == "top"
+    assert fuse(ranked_lists)[0]["id"] == "agreed"
+
+
+def test_duplicate_within_a_list_counts_once_at_its_best_rank():
+    fused = fuse({"vector": results("x", "x", "y")}, k=0)
+    assert [(result["id"], result["ranks"]) for result in fused] == [("x", {"vector": 1}), ("y", {"vector": 2})]
+
+
+def test_first_occurrence_fields_are_kept_and_limit_applies():
+    fused = fuse({"vector": [{"id": "x", "distance": 0.1}], "keyword": [{"id": "x", "distance": None}, {"id": "y"}]}, limit=1)
+    assert len(fused) == 1
+    assert fused[0]["distance"] == 0.1
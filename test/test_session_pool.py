@@ -0,0 +1,184 @@
+import threading
+import time
+
+import pytest
+
+from mcp_clickzetta_server.session_pool import SessionPool, retry_with_backoff
+
+
+class FakeResult:
+    def __init__(self, session):
+        self.session = session
+
+    def collect(self):
+        if self.session.broken:
+            raise RuntimeError("session expired")
+        return [{"1": 1}]
+
+
+class FakeSession:
+    def __init__(self, number):
+        self.number = number
+        self.broken = False
+        self.closed = False
+
+    def sql(self, query):
+        return FakeResult(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeWarehouse:
+    def __init__(self):
+        self.sessions = []
+
+    def connect(self):
+        session = FakeSession(len(self.sessions))
+        self.sessions.append(session)
+        return session
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.001)
+
+
+def test_prefill_opens_min_sessions():
+    warehouse = FakeWarehouse()
+    pool = SessionPool(warehouse.connect, min_size=2, max_size=4)
+    pool.prefill()
+    assert len(warehouse.sessions) == 2
+    assert pool.stats()["idle"] == 2
+
+
+def test_idle_session_is_reused():
+    warehouse = FakeWarehouse()
+    pool = SessionPool(warehouse.connect, min_size=0, max_size=2)
+    with pool.session() as first:
+        pass
+    with pool.session() as second:
+        pass
+    assert first is second
+    assert pool.stats()["created"] == 1
+
+
+def test_waiters_are_served_first_come_first_served():
+    warehouse = FakeWarehouse()
+    pool = SessionPool(warehouse.connect, min_size=0, max_size=1)
+    held = pool.acquire()
+    served = []
+
+    def wait(name):
+        item = pool.acquire(timeout=2)
+        served.append(name)
+        pool.release(item)
+
+    threads = []
+    for name in ("first", "second", "third"):
+        thread = threading.Thread(target=wait, args=(name,))
+        thread.start()
+        threads.append(thread)
+        # Queue the next waiter only once this one is waiting, so the arrival order is known
+        wait_until(lambda: pool.stats()["waiting"] == len(threads))
+    pool.release(held)
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert served == ["first", "second", "third"]
+    assert len(warehouse.sessions) == 1
+
+
+def test_acquire_times_out_when_pool_is_exhausted():
+    pool = SessionPool(FakeWarehouse().connect, min_size=0, max_size=1)
+    held = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["waiting"] == 0
+    pool.release(held)
+    assert pool.acquire(timeout=0.05) is held
+
+
+def test_session_failing_health_check_is_replaced():
+    warehouse = FakeWarehouse()
+    pool = SessionPool(warehouse.connect, min_size=0, max_size=1)
+    item = pool.acquire()
+    item.session.broken = True
+    pool.release(item, failed=True)
+
+    replacement = pool.acquire()
+    assert replacement.session is warehouse.sessions[1]
+    assert warehouse.sessions[0].closed
+    stats = pool.stats()
+    assert stats["failed_health_checks"] == 1
+    assert stats["discarded"] == 1
+    assert stats["size"] == 1
+
+
+def test_healthy_session_passes_check_after_failed_query():
+    warehouse = FakeWarehouse()
+    pool = SessionPool(warehouse.connect, min_size=0, max_size=1)
+    with pytest.raises(ValueError):
+        with pool.session():
+            raise ValueError("bad query")
+    with pool.session() as session:
+        assert session is warehouse.sessions[0]
+    assert pool.stats()["failed_health_checks"] == 0
+
+
+def test_expired_session_is_replaced_on_checkout():
+    warehouse = FakeWarehouse()
+    pool = SessionPool(warehouse.connect, min_size=0, max_size=1, max_age=60)
+    item = pool.acquire()
+    item.created_at -= 120
+    pool.release(item)
+    assert pool.acquire().session is warehouse.sessions[1]
+
+
+def test_failed_open_frees_the_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("warehouse unreachable")
+        return FakeSession(len(attempts))
+
+    pool = SessionPool(connect, min_size=0, max_size=1)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.stats()["size"] == 0
+    assert pool.acquire(timeout=0.05).session.number == 2
+
+
+def test_refresh_expiring_swaps_idle_sessions():
+    warehouse = FakeWarehouse()
+    pool = SessionPool(warehouse.connect, min_size=1, max_size=2, max_age=600)
+    pool.prefill()
+    old = warehouse.sessions[0]
+    with pool._lock:
+        pool._idle[0].created_at -= 400
+
+    assert pool.refresh_expiring(margin=300) == 1
+    assert old.closed
+    with pool.session() as session:
+        assert session is warehouse.sessions[1]
+    assert pool.stats()["refreshed"] == 1
+
+
+def test_retry_with_backoff_doubles_the_delay():
+    delays = []
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("retry me")
+        return "ok"
+
+    assert retry_with_backoff(flaky, attempts=4, base_delay=1, max_delay=30, sleep=delays.append) == "ok"
+    assert delays == [1, 2]
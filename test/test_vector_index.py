@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+
+from mcp_clickzetta_server.vector_index import MISSING_DATE_MODIFIED, LocalVectorIndex
+
+
+class FakeTable:
+    """Answers the mirror's fetch queries from a list of rows, recording every query"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute_query(self, query):
+        self.queries.append(query)
+        # The watermark condition decides which rows are new; emulate it on (date_modified, id)
+        after = None
+        if "CAST(id AS STRING) >" in query:
+            watermark = query.split("> CAST('")[1].split("'")[0]
+            watermark_id = query.split("CAST(id AS STRING) > '")[1].split("'")[0]
+            after = (watermark, watermark_id)
+        limit = int(query.split("LIMIT")[1])
+        ordered = sorted(self.rows, key=lambda row: (row["date_modified"] or MISSING_DATE_MODIFIED, row["id"]))
+        rows = []
+        for row in ordered:
+            key = (row["date_modified"] or MISSING_DATE_MODIFIED, row["id"])
+            if after is None or key > after:
+                rows.append({"ID": row["id"], "CONTENT": row["content"], "EMBEDDING": row["embedding"], "DATE_MODIFIED": key[0]})
+        return rows[:limit]
+
+
+def make_index(tmp_path):
+    return LocalVectorIndex("docs", "embedding", "content", 2, directory=str(tmp_path))
+
+
+def test_refresh_pages_by_watermark_and_only_pulls_new_rows(tmp_path):
+    table = FakeTable(
+        [
+            {"id": "1", "content": "a", "embedding": [1, 0], "date_modified": "2024-01-01 00:00:00"},
+            {"id": "2", "content": "b", "embedding": [0, 1], "date_modified": "2024-01-01 00:00:00"},
+            # Rows without date_modified are still pulled and move the watermark
+            {"id": "3", "content": "c", "embedding": [1, 1], "date_modified": None},
+        ]
+    )
+    index = make_index(tmp_path)
+    assert index.refresh(table.execute_query, page_size=2) == 3
+    assert "COALESCE(date_modified" in table.queries[0]
+    assert (index.watermark, index.watermark_id) == ("2024-01-01 00:00:00", "2")
+
+    table.rows.append({"id": "4", "content": "d", "embedding": [0, 1], "date_modified": "2024-02-01 00:00:00"})
+    table.queries.clear()
+    assert index.refresh(table.execute_query, page_size=2) == 1
+    assert "CAST(id AS STRING) > '2'" in table.queries[0]
+    assert index.stats()["rows"] == 4
+
+    # The watermark survives reopening, so a new process does not pull everything again
+    reopened = make_index(tmp_path)
+    assert (reopened.watermark, reopened.watermark_id) == ("2024-02-01 00:00:00", "4")
+    assert reopened.refresh(table.execute_query) == 0
+
+
+def test_changed_row_replaces_its_previous_version(tmp_path):
+    table = FakeTable([{"id": "1", "content": "old", "embedding": [1, 0], "date_modified": "2024-01-01 00:00:00"}])
+    index = make_index(tmp_path)
+    index.refresh(table.execute_query)
+    table.rows[0] = {"id": "1", "content": "new", "embedding": [1, 0], "date_modified": "2024-03-01 00:00:00"}
+    index.refresh(table.execute_query)
+    results = index.search(np.array([1, 0], dtype=np.float32), 5)
+    assert [row["content"] for row in results] == ["new"]
+
+
+def test_load_trims_rows_without_vectors(tmp_path):
+    table = FakeTable(
+        [
+            {"id": "1", "content": "a", "embedding": [1, 0], "date_modified": "2024-01-01 00:00:00"},
+            {"id": "2", "content": "b", "embedding": [0, 1], "date_modified": "2024-01-02 00:00:00"},
+        ]
+    )
+    index = make_index(tmp_path)
+    index.refresh(table.execute_query)
+    # An interrupted refresh wrote metadata whose vectors never reached the disk, then half a line
+    with open(index.rows_path, "a", encoding="utf-8") as f:
+        f.write('{"id": "3", "content": "c"}\n{"id": "4", "con')
+
+    reopened = make_index(tmp_path)
+    assert reopened.stats()["rows"] == 2
+    with open(reopened.rows_path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    assert os.path.getsize(reopened.vectors_path) == 2 * 4 * 2
+
+    # New rows line up with their vectors after the repair
+    table.rows.append({"id": "5", "content": "e", "embedding": [1, 1], "date_modified": "2024-01-03 00:00:00"})
+    reopened.refresh(table.execute_query)
+    top = reopened.search(np.array([1, 1], dtype=np.float32) / np.sqrt(2), 1)
+    assert top[0]["content"] == "e"
+
+
+def test_load_trims_vectors_without_rows(tmp_path):
+    table = FakeTable([{"id": "1", "content": "a", "embedding": [1, 0], "date_modified": "2024-01-01 00:00:00"}])
+    index = make_index(tmp_path)
+    index.refresh(table.execute_query)
+    with open(index.vectors_path, "ab") as f:
+        f.write(np.zeros(2, dtype=np.float32).tobytes() + b"\0\0")
+
+    reopened = make_index(tmp_path)
+    assert reopened.stats()["rows"] == 1
+    assert os.path.getsize(reopened.vectors_path) == 4 * 2
+
+
+def test_mark_stale_keeps_mirror_unready_until_refreshed(tmp_path):
+    table = FakeTable([{"id": "1", "content": "a", "embedding": [1, 0], "date_modified": "2024-01-01 00:00:00"}])
+    index = make_index(tmp_path)
+    index.refresh(table.execute_query)
+    assert index.ready
+    index.mark_stale()
+    assert not index.ready
+    index.refresh(table.execute_query)
+    assert index.ready
@@ -0,0 +1,32 @@
+import re
+
+from mcp_clickzetta_server.vector_query import build_batch_vector_search_sql
+
+
+def test_batch_sql_numbers_query_vectors_and_ranks_per_question():
+    query = build_batch_vector_search_sql(
+        "docs",
+        "embedding",
+        "content",
+        [[0.5, 1.0], [0.25, 0.0]],
+        2,
+        3,
+        partition_scope="lang = 'en'",
+        extra_columns={"doc_link": "CONCAT('https://', path)"},
+    )
+    # One inline VALUES row per question, numbered in input order
+    assert "(0, CAST('[0.5,1]' AS VECTOR(2)))" in query
+    assert "(1, CAST('[0.25,0]' AS VECTOR(2)))" in query
+    assert "AS t(question_id, query_vector)" in query
+    assert "FROM docs CROSS JOIN query_embeddings" in query
+    assert "WHERE lang = 'en'" in query
+    assert "CONCAT('https://', path) AS doc_link" in query
+    # The limit applies to each question, not to the whole result
+    assert "ROW_NUMBER() OVER (PARTITION BY question_id ORDER BY distance) AS question_rank" in query
+    assert re.search(r"WHERE question_rank <= 3\s", query)
+
+
+def test_batch_sql_without_partition_scope_has_no_filter():
+    query = build_batch_vector_search_sql("docs", "embedding", "content", [[1.0]], 1, 5)
+    scored = query.split("scored AS (")[1].split("ranked AS (")[0]
+    assert "WHERE" not in scored
@@ -0,0 +1,39 @@
+from mcp_clickzetta_server.write_detector import SQLWriteDetector
+
+detector = SQLWriteDetector()
+
+
+def test_normalize_ignores_comments_whitespace_case_and_semicolon():
+    assert detector.normalize_query("select a,  b\n from t -- latest\n;") == detector.normalize_query("SELECT a, b FROM t")
+
+
+def test_normalize_keeps_string_literals_verbatim():
+    assert detector.normalize_query("SELECT * FROM t WHERE s = 'a  b'") != detector.normalize_query("SELECT * FROM t WHERE s = 'a b'")
+    assert "'Mixed Case'" in detector.normalize_query("select * from t where s = 'Mixed Case'")
+
+
+def test_extract_tables_finds_joins_and_subqueries():
+    tables = detector.extract_tables("SELECT * FROM s.orders o JOIN customers c ON o.c = c.id WHERE o.id IN (SELECT id FROM refunds)")
+    assert tables == {"s.orders", "customers", "refunds"}
+
+
+def test_extract_tables_leaves_out_ctes():
+    assert detector.extract_tables("WITH recent AS (SELECT * FROM orders) SELECT * FROM recent") == {"orders"}
+
+
+def test_extract_tables_of_writes():
+    assert detector.extract_tables("INSERT INTO `Target`(a, b) SELECT a, b FROM staging") == {"target", "staging"}
+    assert detector.extract_tables("UPDATE items SET a = 1") == {"items"}
+
+
+def test_metadata_queries():
+    assert detector.is_metadata_query("show tables")
+    assert detector.is_metadata_query("DESC TABLE EXTENDED t")
+    assert detector.is_metadata_query("SELECT * FROM information_schema.tables")
+    assert not detector.is_metadata_query("SELECT * FROM tables")
+
+
+def test_extract_tables_named_like_keywords():
+    assert detector.extract_tables("SELECT * FROM source s JOIN returns r ON s.id = r.id") == {"source", "returns"}
+    merge = "MERGE INTO kb AS target USING (SELECT * FROM VALUES (1) AS t(id)) AS source ON target.id = source.id WHEN MATCHED THEN UPDATE SET a = 1"
+    assert detector.extract_tables(merge) == {"kb"}